@@ -0,0 +1,176 @@
+import time
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from kivy.logger import Logger
+from simulation import Simulation, UnitType
+
+# Планировщик ИИ компьютера: вместо таймеров и подсчёта типов перебирает варианты
+# (кого нанять и нападать ли) и для каждого проигрывает копию матча на несколько
+# секунд вперёд по тем же правилам. Расчёт идёт в отдельном процессе или потоке,
+# готовый план возвращается в игровой цикл через очередь и исполняется командами
+# ai_hire/ai_attack — они пишутся в повтор, так что повтор не зависит от планировщика.
+
+DECISION_INTERVAL = 5.0  # Секунд симуляции между решениями
+TIME_BUDGET = 0.5  # Секунд реального времени на одно решение
+ROLLOUT_STEP = 1 / 20.  # Шаг упрощённой симуляции внутри прогонов
+HORIZONS = (2.0, 4.0, 8.0, 16.0)  # Горизонты прогонов по возрастанию, секунд
+HIRE_BATCH = 5  # Сколько юнитов нанимать за решение, как у эвристики
+FAILURE_LOG_INTERVAL = 10.0  # Не чаще раза в столько секунд сообщать о сбоях планировщика
+
+HIRE_OPTIONS = (None, UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+# Веса оценки позиции для компьютера
+BASE_HP_WEIGHT = 1.0
+UNIT_HP_WEIGHT = 2.0
+COIN_WEIGHT = 0.05
+
+
+def candidate_plans(owner):
+    plans = []
+    for unit_type in HIRE_OPTIONS:
+        for attack in (False, True):
+            commands = []
+            if unit_type is not None:
+                commands.append(('ai_hire', owner, unit_type, HIRE_BATCH))
+            if attack:
+                commands.append(('ai_attack', owner))
+            plans.append(tuple(commands))
+    return plans
+
+
+def evaluate(sim, owner):
+    own_base = sim.base_of(owner)
+    enemy_base = sim.enemy_base_of(owner)
+    if sim.state == 'game_over':
+        return float('inf') if sim.winner == owner else float('-inf')
+    own_units = sum(unit.hp for unit in sim.units_of(owner))
+    enemy_owner = "player" if owner == "computer" else "computer"
+    enemy_units = sum(unit.hp for unit in sim.units_of(enemy_owner))
+    return (BASE_HP_WEIGHT * (own_base.hp - enemy_base.hp)
+            + UNIT_HP_WEIGHT * (own_units - enemy_units)
+            + COIN_WEIGHT * own_base.coins)
+
+
+def rollout(state, commands, owner, horizon, deadline):
+    # Копия матча без журнала, записи и эвристики; игрок считается бездействующим
+    width, height, panel_height = state['size']
+    sim = Simulation(width, height, panel_height)
+    sim.ai_mode = 'planner'
+    sim.set_state(state)
+    for command in commands:
+        sim.execute(command)
+    elapsed = 0
+    while elapsed < horizon and sim.state == 'playing':
+        if time.perf_counter() > deadline:
+            return None  # Бюджет исчерпан — прогон не засчитывается
+        sim.step(ROLLOUT_STEP)
+        elapsed += ROLLOUT_STEP
+    return evaluate(sim, owner)
+
+
+def plan_decision(state, owner="computer", budget=TIME_BUDGET):
+    # Итеративное углубление: сначала все варианты на коротком горизонте, затем на
+    # более длинных, пока хватает бюджета. Выбирается лучший вариант на самом
+    # длинном горизонте, где успели оценить все варианты.
+    deadline = time.perf_counter() + budget
+    plans = candidate_plans(owner)
+    best_plan = plans[0]
+    best_horizon = 0
+    for horizon in HORIZONS:
+        scores = []
+        for plan in plans:
+            score = rollout(state, plan, owner, horizon, deadline)
+            if score is None:
+                return best_plan, best_horizon
+            scores.append(score)
+        best_plan = plans[max(range(len(plans)), key=scores.__getitem__)]
+        best_horizon = horizon
+    return best_plan, best_horizon
+
+
+# Пул для расчётов. 'process' не делит GIL с игровым циклом; 'thread' — для
+# платформ, где дочерние процессы недоступны (Android) или запускаются только через spawn
+class AIPlanner:
+    def __init__(self, mode='process', budget=TIME_BUDGET):
+        self.mode = mode
+        self.budget = budget
+        if mode == 'process':
+            # Только fork: spawn и forkserver импортируют в дочернем процессе главный модуль игры
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork'))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-planner")
+        self.results = queue.Queue()
+
+    def submit(self, request_id, state, owner):
+        future = self.executor.submit(plan_decision, state, owner, self.budget)
+        future.add_done_callback(lambda done: self.results.put((request_id, done)))
+
+    def poll(self):
+        # Готовые планы без ожидания: (номер запроса, future)
+        ready = []
+        while True:
+            try:
+                ready.append(self.results.get_nowait())
+            except queue.Empty:
+                return ready
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Связывает планировщик с симуляцией: раз в DECISION_INTERVAL секунд отправляет
+# снимок состояния и исполняет пришедший план командами. update() вызывается
+# каждый кадр и никогда не ждёт планировщик.
+class AIController:
+    def __init__(self, sim, planner, owner="computer", interval=DECISION_INTERVAL):
+        self.sim = sim
+        self.planner = planner
+        self.owner = owner
+        self.interval = interval
+        self.request_id = 0
+        self.pending = None  # Номер запроса, ответ на который ещё не пришёл
+        self.next_decision = interval
+        self.last_horizon = 0  # Горизонт последнего плана, для отладки
+        self.failures = 0  # Сбоев с последнего сообщения в журнал
+        self.failure_logged = None  # Когда (time.monotonic) было последнее сообщение
+        sim.ai_mode = 'planner'
+
+    def reset(self):
+        # Новый матч: ответы на запросы старого матча отбрасываются
+        self.request_id += 1
+        self.pending = None
+        self.next_decision = self.interval
+
+    def update(self):
+        sim = self.sim
+        for request_id, future in self.planner.poll():
+            if request_id != self.pending:
+                continue
+            self.pending = None
+            if future.cancelled() or future.exception() is not None:
+                self.log_failure('отменён' if future.cancelled() else future.exception())
+                continue
+            plan, self.last_horizon = future.result()
+            if sim.state == 'playing':
+                for command in plan:
+                    sim.execute(tuple(command))
+        if sim.state == 'playing' and self.pending is None and sim.time >= self.next_decision:
+            self.next_decision = sim.time + self.interval
+            self.request_id += 1
+            self.pending = self.request_id
+            self.planner.submit(self.request_id, sim.get_state(), self.owner)
+
+    def log_failure(self, reason):
+        # Сломанный пул падает на каждом решении: в журнал идёт первый сбой и затем
+        # не чаще раза в FAILURE_LOG_INTERVAL со счётчиком пропущенных
+        self.failures += 1
+        now = time.monotonic()
+        if self.failure_logged is not None and now - self.failure_logged < FAILURE_LOG_INTERVAL:
+            return
+        Logger.warning(f"AIPlanner: планировщик не вернул план (сбоев: {self.failures}): {reason}")
+        self.failures = 0
+        self.failure_logged = now
+
+    def close(self):
+        self.planner.close()
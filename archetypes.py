@@ -0,0 +1,74 @@
+import os
+import json
+
+# Архетипы юнитов: характеристики типов и множители урона «тип против типа»
+# загружаются из archetypes.json один раз и общие для всех юнитов типа.
+# Юнит хранит только ссылку на свой архетип; урон по каждому типу цели
+# посчитан заранее (damage_vs), поэтому в бою нет ни поиска, ни ветвлений.
+
+ARCHETYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archetypes.json')
+STATS = ('hp', 'damage', 'speed', 'size')
+SHAPES = ('square', 'triangle', 'circle')
+
+
+class Archetype:
+    __slots__ = ('name', 'index', 'shape', 'hp', 'damage', 'speed', 'size', 'half_size', 'damage_vs')
+
+    def __init__(self, name, index, shape, hp, damage, speed, size):
+        self.name = name
+        self.index = index  # Номер строки и столбца в матрице множителей
+        self.shape = shape
+        self.hp = hp
+        self.damage = damage  # Урон в секунду по цели с множителем 1
+        self.speed = speed  # пикселей в секунду
+        self.size = size  # Диаметр
+        self.half_size = size / 2
+        self.damage_vs = []  # Номер архетипа цели -> урон с учётом множителя
+
+
+class ArchetypeTable:
+    def __init__(self, data):
+        self.data = data
+        units = data['units']
+        self.names = list(units)
+        self.archetypes = {}
+        self.by_index = []
+        for index, name in enumerate(self.names):
+            stats = units[name]
+            if stats['shape'] not in SHAPES:
+                raise ValueError(f"Неизвестная форма юнита {name}: {stats['shape']}")
+            archetype = Archetype(name, index, stats['shape'], *(float(stats[stat]) for stat in STATS))
+            self.archetypes[name] = archetype
+            self.by_index.append(archetype)
+        # Матрица множителей урона: строка — атакующий, столбец — цель; пропуски равны 1
+        multipliers = data.get('damage_multipliers', {})
+        self.multipliers = [[float(multipliers.get(attacker, {}).get(target, 1.0)) for target in self.names]
+                            for attacker in self.names]
+        for archetype in self.by_index:
+            archetype.damage_vs = [archetype.damage * multiplier for multiplier in self.multipliers[archetype.index]]
+        self.max_speed = max(archetype.speed for archetype in self.by_index)
+        self.max_size = max(archetype.size for archetype in self.by_index)
+
+    def __getitem__(self, name):
+        return self.archetypes[name]
+
+    def __iter__(self):
+        return iter(self.by_index)
+
+    def with_overrides(self, overrides):
+        # Копия таблицы с изменёнными характеристиками: {тип: {поле: значение}}
+        data = json.loads(json.dumps(self.data))
+        for name, stats in overrides.items():
+            if name not in data['units']:
+                raise KeyError(f"Неизвестный тип юнита: {name}")
+            data['units'][name].update(stats)
+        return ArchetypeTable(data)
+
+
+def load(path=ARCHETYPES_PATH):
+    with open(path, encoding='utf-8') as archetypes_file:
+        return ArchetypeTable(json.load(archetypes_file))
+
+
+# Таблица по умолчанию, общая для всех симуляций без правок баланса
+DEFAULT = load()
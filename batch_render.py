@@ -0,0 +1,343 @@
+import math
+from array import array
+from kivy.graphics import Color, Mesh, Point, Rectangle, InstructionGroup
+from kivy.graphics.texture import Texture
+
+# Пакетная отрисовка юнитов: все видимые юниты одной формы и одного владельца рисуются
+# одним Mesh, вершины которого переписываются на месте каждый кадр.
+# Количество инструкций на холсте не зависит от размера армии.
+
+FLOATS_PER_VERTEX = 4  # x, y, u, v — формат вершин Mesh по умолчанию
+MAX_VERTICES = 65536  # Индексы Mesh — unsigned short
+CIRCLE_SEGMENTS = 12
+RING_SEGMENTS = 16
+LOD_POINT_SIZE = 8  # Полуразмер точки юнита на дальнем масштабе, мировых пикселей
+POINTS_PER_INSTRUCTION = 8000  # Point строит по 4 вершины на точку, индексы — unsigned short
+
+
+# Смещения вершин относительно центра юнита и индексы треугольников одного юнита
+def square_offsets(size):
+    h = size / 2
+    return (-h, -h, h, -h, h, h, -h, h)
+
+SQUARE_INDICES = (0, 1, 2, 0, 2, 3)
+
+
+def triangle_offsets(size):
+    h = size / 2
+    return (0, h, -h, -h, h, -h)
+
+TRIANGLE_INDICES = (0, 1, 2)
+
+
+def circle_offsets(size):
+    r = size / 2
+    offsets = [0, 0]
+    for k in range(CIRCLE_SEGMENTS):
+        angle = 2 * math.pi * k / CIRCLE_SEGMENTS
+        offsets += [math.cos(angle) * r, math.sin(angle) * r]
+    return tuple(offsets)
+
+CIRCLE_INDICES = tuple(index for k in range(CIRCLE_SEGMENTS)
+                       for index in (0, 1 + k, 1 + (k + 1) % CIRCLE_SEGMENTS))
+
+
+# Обводка выделения: кольцо шириной 2 пикселя по окружности радиуса size, как Line(circle=..., width=2)
+def ring_offsets(size):
+    offsets = []
+    for radius in (size - 1, size + 1):
+        for k in range(RING_SEGMENTS):
+            angle = 2 * math.pi * k / RING_SEGMENTS
+            offsets += [math.cos(angle) * radius, math.sin(angle) * radius]
+    return tuple(offsets)
+
+RING_INDICES = tuple(index for k in range(RING_SEGMENTS)
+                     for index in (k, RING_SEGMENTS + k, RING_SEGMENTS + (k + 1) % RING_SEGMENTS,
+                                   k, RING_SEGMENTS + (k + 1) % RING_SEGMENTS, (k + 1) % RING_SEGMENTS))
+
+SHAPES = {
+    'square': (square_offsets, SQUARE_INDICES),
+    'triangle': (triangle_offsets, TRIANGLE_INDICES),
+    'circle': (circle_offsets, CIRCLE_INDICES),
+}
+
+
+# Один Mesh на ограниченное число юнитов (не больше MAX_VERTICES вершин).
+# Буфер растёт удвоением; незанятые слоты остаются вырожденными треугольниками в нуле.
+# drawn помнит, что нарисовано в каждом слоте: вершины пересчитываются только для сдвинувшихся
+# юнитов, а буфер уходит на видеокарту, только если в куске что-то изменилось.
+class _Chunk:
+    def __init__(self, unit_indices, vertices_per_unit, max_units):
+        self.unit_indices = unit_indices
+        self.vertices_per_unit = vertices_per_unit
+        self.max_units = max_units
+        self.capacity = 0
+        self.vertices = array('f')
+        self.indices = array('H')
+        self.drawn = []  # Слот -> (x, y, размер) последней записи или None для пустого слота
+        self.mesh = Mesh(mode='triangles')
+
+    def reserve(self, count):
+        if count <= self.capacity:
+            return
+        capacity = max(16, self.capacity)
+        while capacity < count:
+            capacity *= 2
+        capacity = min(capacity, self.max_units)
+        floats_per_unit = self.vertices_per_unit * FLOATS_PER_VERTEX
+        self.vertices.extend(array('f', [0.0]) * ((capacity - self.capacity) * floats_per_unit))
+        for slot in range(self.capacity, capacity):
+            base = slot * self.vertices_per_unit
+            self.indices.extend(base + index for index in self.unit_indices)
+        self.drawn.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+        self.mesh.indices = self.indices
+
+    def clear_slot(self, slot):
+        if self.drawn[slot] is None:
+            return False
+        self.drawn[slot] = None
+        floats_per_unit = self.vertices_per_unit * FLOATS_PER_VERTEX
+        start = slot * floats_per_unit
+        for k in range(start, start + floats_per_unit):
+            self.vertices[k] = 0.0
+        return True
+
+
+class MeshBatch:
+    def __init__(self, canvas, color, offsets_fn, unit_indices):
+        self.canvas = canvas
+        self.offsets_fn = offsets_fn
+        self.offsets_cache = {}  # size -> смещения вершин
+        self.unit_indices = unit_indices
+        self.vertices_per_unit = max(unit_indices) + 1
+        self.units_per_chunk = MAX_VERTICES // self.vertices_per_unit
+        self.count = 0  # Сколько слотов заполнено в прошлом кадре
+        self.chunks = []
+        self.color = color
+        self.add_chunk()
+
+    def add_chunk(self):
+        # Новые куски добавляются в конец холста, поэтому каждый несёт свой Color
+        with self.canvas:
+            Color(*self.color)
+            chunk = _Chunk(self.unit_indices, self.vertices_per_unit, self.units_per_chunk)
+        self.chunks.append(chunk)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.sync([])
+
+    def offsets_for(self, size):
+        offsets = self.offsets_cache.get(size)
+        if offsets is None:
+            offsets = self.offsets_cache[size] = self.offsets_fn(size)
+        return offsets
+
+    def sync(self, units, alpha=1.0):
+        # Слоты заполняются видимыми юнитами подряд; слоты, занятые в прошлом кадре
+        # и свободные теперь, обнуляются. Невидимые юниты вершин не получают.
+        count = len(units)
+        per_chunk = self.units_per_chunk
+        while len(self.chunks) * per_chunk < count:
+            self.add_chunk()
+        stride = FLOATS_PER_VERTEX
+        floats_per_unit = self.vertices_per_unit * stride
+        touched = max(count, self.count)
+        for chunk_index, chunk in enumerate(self.chunks):
+            first = chunk_index * per_chunk
+            if first >= touched:
+                break
+            last = min(first + per_chunk, count)
+            chunk.reserve(last - first)
+            vertices = chunk.vertices
+            drawn = chunk.drawn
+            changed = False
+            for slot in range(first, last):
+                unit = units[slot]
+                # Интерполяция между позицией на начало и на конец шага симуляции
+                prev_x = unit.prev_x
+                prev_y = unit.prev_y
+                x = prev_x + (unit.x - prev_x) * alpha
+                y = prev_y + (unit.y - prev_y) * alpha
+                size = unit.archetype.size
+                local = slot - first
+                previous = drawn[local]
+                if previous is not None and previous[0] == x and previous[1] == y and previous[2] == size:
+                    continue  # Стоящий юнит в том же слоте: вершины уже верные
+                drawn[local] = (x, y, size)
+                changed = True
+                offsets = self.offsets_for(size)
+                k = local * floats_per_unit
+                for n in range(0, len(offsets), 2):
+                    vertices[k] = x + offsets[n]
+                    vertices[k + 1] = y + offsets[n + 1]
+                    k += stride
+            for slot in range(max(first, count), min(first + per_chunk, self.count)):
+                if chunk.clear_slot(slot - first):
+                    changed = True
+            if changed:
+                chunk.mesh.vertices = vertices
+        self.count = count
+        return count
+
+
+# Юниты точками для дальнего масштаба: по одной инструкции Point на владельца
+# (и на каждые POINTS_PER_INSTRUCTION юнитов), без фигур и обводок
+class PointCloud:
+    def __init__(self, canvas, colors, pointsize=LOD_POINT_SIZE):
+        self.canvas = canvas
+        self.colors = colors
+        self.pointsize = pointsize
+        self.instructions = {owner: [] for owner in colors}
+        self.drawn = {}  # (владелец, номер инструкции) -> координаты последней записи
+        self.count = 0
+
+    def add_instruction(self, owner):
+        with self.canvas:
+            Color(*self.colors[owner])
+            point = Point(points=[], pointsize=self.pointsize)
+        self.instructions[owner].append(point)
+        return point
+
+    def sync(self, units, alpha=1.0):
+        coords = {owner: [] for owner in self.colors}
+        for unit in units:
+            prev_x = unit.prev_x
+            prev_y = unit.prev_y
+            coords[unit.owner] += (prev_x + (unit.x - prev_x) * alpha, prev_y + (unit.y - prev_y) * alpha)
+        for owner, points in coords.items():
+            instructions = self.instructions[owner]
+            limit = 2 * POINTS_PER_INSTRUCTION
+            needed = (len(points) + limit - 1) // limit
+            while len(instructions) < needed:
+                self.add_instruction(owner)
+            for k, point in enumerate(instructions):
+                part = points[k * limit:(k + 1) * limit]
+                # Неподвижная картинка не перезаписывается
+                if part != self.drawn.get((owner, k), []):
+                    self.drawn[(owner, k)] = part
+                    point.points = part
+        self.count = len(units)
+
+    def clear(self):
+        if self.count:
+            self.sync([])
+
+
+# Текстура плотности армий (density.DensityGrid): одна маленькая текстура на весь мир,
+# пиксели заливаются через blit_buffer, только когда сетка изменилась.
+# Её используют и слой плотности на холсте мира, и мини-карта.
+class DensityTexture:
+    def __init__(self, grid):
+        self.grid = grid
+        self.version = None
+        self.texture = None
+        self.users = []  # Rectangle, которые рисуют эту текстуру
+        self.create()
+
+    def create(self):
+        self.texture = Texture.create(size=(self.grid.cols, self.grid.rows), colorfmt='rgba')
+        # После потери контекста OpenGL (Android сворачивает приложение) текстуру надо залить заново
+        self.texture.add_reload_observer(self.reload)
+        for rectangle in self.users:
+            rectangle.texture = self.texture
+        self.version = None
+
+    def reload(self, texture):
+        self.version = None
+        self.upload()
+
+    def attach(self, rectangle):
+        rectangle.texture = self.texture
+        self.users.append(rectangle)
+
+    def upload(self):
+        grid = self.grid
+        if self.version == grid.version:
+            return
+        if self.texture.size != (grid.cols, grid.rows):
+            self.create()
+        self.version = grid.version
+        self.texture.blit_buffer(bytes(grid.pixels), colorfmt='rgba', bufferfmt='ubyte')
+
+
+# Слой плотности на холсте мира: вместо фигур и точек — один прямоугольник с текстурой
+# на весь мир. Пока слой скрыт, его инструкций на холсте нет.
+class DensityLayer:
+    def __init__(self, canvas, density_texture):
+        self.canvas = canvas
+        self.density_texture = density_texture
+        self.group = InstructionGroup()
+        self.group.add(Color(1, 1, 1, 1))
+        self.rectangle = Rectangle(pos=(0, 0))
+        self.group.add(self.rectangle)
+        density_texture.attach(self.rectangle)
+        self.visible = False
+
+    def show(self):
+        grid = self.density_texture.grid
+        self.rectangle.size = (grid.world_width, grid.world_height)
+        if not self.visible:
+            self.visible = True
+            self.canvas.add(self.group)
+
+    def hide(self):
+        if self.visible:
+            self.visible = False
+            self.canvas.remove(self.group)
+
+
+# Отрисовка всех юнитов через Mesh: по одному набору на (владелец, форма) плюс один для выделения.
+# Каждый кадр наборы заполняются только видимыми юнитами; на дальнем масштабе — точками.
+class BatchRenderer:
+    def __init__(self, canvas, colors):
+        self.canvas = canvas
+        self.batches = {}
+        for owner, color in colors.items():
+            for shape, (offsets_fn, indices) in SHAPES.items():
+                self.batches[(owner, shape)] = MeshBatch(canvas, color, offsets_fn, indices)
+        # Жёлтый цвет для выделения
+        self.selection = MeshBatch(canvas, (1, 1, 0), ring_offsets, RING_INDICES)
+        self.points = PointCloud(canvas, colors)
+        self.selected = set()
+
+    def add(self, unit):
+        pass  # Юнит получит вершины, когда окажется в видимой области
+
+    def remove(self, unit):
+        self.selected.discard(unit)
+
+    def select(self, unit):
+        self.selected.add(unit)
+
+    def deselect(self, unit):
+        self.selected.discard(unit)
+
+    def clear(self):
+        for batch in self.batches.values():
+            batch.clear()
+        self.selection.clear()
+        self.points.clear()
+        self.selected.clear()
+
+    def sync(self, alpha=1.0, visible=(), lod=False):
+        groups = {key: [] for key in self.batches}
+        selected = []
+        if lod:
+            self.points.sync(visible, alpha)
+        else:
+            self.points.clear()
+            for unit in visible:
+                groups[(unit.owner, unit.archetype.shape)].append(unit)
+                if unit in self.selected:
+                    selected.append(unit)
+        for key, batch in self.batches.items():
+            batch.sync(groups[key], alpha)
+        self.selection.sync(selected, alpha)
+
+    def draw_call_count(self):
+        return (sum(len(batch.chunks) for batch in self.batches.values()) + len(self.selection.chunks)
+                + sum(len(points) for points in self.points.instructions.values()))
@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from simulation import Simulation, UnitType, SIM_STEP
+from events import CombatLog, DAMAGE, KILL, HIRE
+from replay import REPLAY_VERSION
+import archetypes
+
+# Пакетный прогон матчей ИИ против ИИ для подбора баланса. Обе стороны играют одной
+# и той же эвристикой из Simulation.update_ai (MirrorAI): встроенный ИИ выключен, оба
+# контроллера ходят перед шагом симуляции, у каждого свой генератор случайных чисел.
+# Кто из них ходит первым, чередуется от матча к матчу, поэтому доля побед игрока
+# показывает только перекос самих правил в пользу стороны.
+# Матчи идут без отрисовки и без ограничения скорости в пуле процессов; каждый
+# результат сразу дописывается строкой JSON, поэтому прерванный прогон
+# продолжается с того же места. Прогон останавливается, когда доверительный
+# интервал доли побед игрока становится уже заданного.
+
+UNIT_TYPES = [UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN]
+UNIT_STATS = ('hp', 'damage', 'speed', 'size')
+SIM_SETTINGS = ('hire_cost', 'initial_attack_delay', 'computer_hire_interval', 'computer_attack_interval')
+
+# Квантили нормального распределения для двустороннего интервала
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600, 0.98: 2.3263, 0.99: 2.5758, 0.999: 3.2905}
+
+
+# Эвристика компьютера для любой стороны: те же таймеры, выбор найма — общий
+# Simulation.computer_hire_units. Монетка нападения — из своего генератора, а не из
+# sim.rng, чтобы решения одной стороны не сдвигали случайность другой
+class MirrorAI:
+    def __init__(self, sim, owner, seed):
+        self.sim = sim
+        self.owner = owner
+        self.rng = random.Random(seed)
+        self.hire_timer = 0
+        self.attack_timer = 0
+        self.initial_attack_sent = False
+
+    def start(self):
+        # Стартовое войско компьютера Simulation.start() уже наняла
+        if not self.sim.units_of(self.owner):
+            for unit_type in UNIT_TYPES:
+                self.sim.ai_hire(self.owner, unit_type, 2)
+
+    def update(self, dt):
+        sim = self.sim
+        if not self.initial_attack_sent and sim.time >= sim.initial_attack_delay:
+            self.initial_attack_sent = True
+            sim.ai_attack(self.owner)
+        self.hire_timer += dt
+        self.attack_timer += dt
+        if self.hire_timer >= sim.computer_hire_interval:
+            self.hire_timer = 0
+            sim.computer_hire_units(self.owner)
+        if self.attack_timer >= sim.computer_attack_interval:
+            self.attack_timer = 0
+            if self.rng.random() > 0.5:
+                sim.ai_attack(self.owner)
+
+
+# Приёмник журнала боя, считающий эффективность типов юнитов
+class StatsSink:
+    enabled = True
+
+    def __init__(self):
+        self.per_type = {unit_type: {'hired': 0, 'kills': 0, 'lost': 0, 'damage': 0.0} for unit_type in UNIT_TYPES}
+
+    def write(self, events, sim_time):
+        per_type = self.per_type
+        for kind, _, owner, unit_type, target, amount in events:
+            if kind == DAMAGE:
+                per_type[unit_type]['damage'] += amount
+            elif kind == KILL:
+                per_type[unit_type]['kills'] += 1
+                per_type[target]['lost'] += 1
+            elif kind == HIRE:
+                per_type[unit_type]['hired'] += 1
+
+    def close(self):
+        pass
+
+
+def parse_settings(pairs):
+    config = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        name = key.split('.')[-1]
+        if not value or (key not in SIM_SETTINGS and not (key.count('.') == 1 and key.split('.')[0] in UNIT_TYPES
+                                                          and name in UNIT_STATS)):
+            raise ValueError(f"Неизвестная настройка: {pair}")
+        config[key] = float(value)
+    return config
+
+
+def run_match(seed, config, max_time):
+    stats = StatsSink()
+    sim = Simulation(events=CombatLog(stats))
+    overrides = {}
+    for key, value in config.items():
+        if key in SIM_SETTINGS:
+            setattr(sim, key, value)
+        else:
+            unit_type, stat = key.split('.')
+            overrides.setdefault(unit_type, {})[stat] = value
+    if overrides:
+        sim.archetypes = sim.archetypes.with_overrides(overrides)
+    # Как в сетевой игре: встроенной эвристики и её стартовой атаки нет, обе стороны
+    # ведут внешние контроллеры
+    sim.ai_mode = 'remote'
+    sim.start(seed)
+    ais = [MirrorAI(sim, owner, seed * 2 + k) for k, owner in enumerate(("player", "computer"))]
+    if seed % 2:
+        ais.reverse()
+    for ai in ais:
+        ai.start()
+    max_ticks = int(max_time / SIM_STEP)
+    while sim.state == 'playing' and sim.tick < max_ticks:
+        for ai in ais:
+            ai.update(SIM_STEP)
+        sim.step(SIM_STEP)
+    sim.events.flush(sim.time)
+    return {'seed': seed, 'winner': sim.winner, 'length': sim.time, 'types': stats.per_type}
+
+
+def rules_hash():
+    # Отпечаток правил по умолчанию: архетипы, настройки симуляции и версия повторов.
+    # После правки баланса в коде старые результаты не подмешиваются к новым
+    sim = Simulation()
+    rules = {
+        'archetypes': archetypes.DEFAULT.data,
+        'settings': {name: getattr(sim, name) for name in SIM_SETTINGS},
+        'version': REPLAY_VERSION,
+        'ai': 2,  # Версия правил прогона: 2 — обе стороны ведёт MirrorAI
+    }
+    return hashlib.sha1(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def config_key(config, max_time):
+    return json.dumps({'config': config, 'max_time': max_time, 'rules': rules_hash()}, sort_keys=True)
+
+
+def load_results(path, key):
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding='utf-8') as results_file:
+        for line in results_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Недописанная строка прерванного прогона
+            if record.get('key') == key:
+                results[record['result']['seed']] = record['result']
+    return results
+
+
+def wilson_interval(wins, total, z):
+    if total == 0:
+        return 0.0, 1.0
+    p = wins / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    spread = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return centre - spread, centre + spread
+
+
+def aggregate(results, z):
+    total = len(results)
+    wins = {"player": 0, "computer": 0, None: 0}
+    lengths = []
+    types = {unit_type: {'hired': 0, 'kills': 0, 'lost': 0, 'damage': 0.0} for unit_type in UNIT_TYPES}
+    for result in results.values():
+        wins[result['winner']] += 1
+        lengths.append(result['length'])
+        for unit_type, counters in result['types'].items():
+            for name, value in counters.items():
+                types[unit_type][name] += value
+    low, high = wilson_interval(wins["player"], total, z)
+    lengths.sort()
+    summary = {
+        'matches': total,
+        'player_wins': wins["player"],
+        'computer_wins': wins["computer"],
+        'draws': wins[None],
+        'player_win_rate': wins["player"] / total if total else 0.0,
+        'interval': (low, high),
+        'length_mean': sum(lengths) / total if total else 0.0,
+        'length_median': lengths[total // 2] if total else 0.0,
+        'types': {},
+    }
+    for unit_type, counters in types.items():
+        hired = max(1, counters['hired'])
+        summary['types'][unit_type] = dict(counters,
+                                           kills_per_hire=counters['kills'] / hired,
+                                           damage_per_hire=counters['damage'] / hired,
+                                           kill_death=counters['kills'] / max(1, counters['lost']))
+    return summary
+
+
+def print_progress(summary, played, elapsed, out=sys.stderr):
+    low, high = summary['interval']
+    print(f"\r матчей {summary['matches']:>6}  победы игрока {summary['player_win_rate'] * 100:5.1f}% "
+          f"[{low * 100:5.1f}; {high * 100:5.1f}]  ничьих {summary['draws']:>4}  "
+          f"длина {summary['length_mean']:6.1f} с  {played / max(elapsed, 1e-9):5.1f} матч/с",
+          end='', file=out, flush=True)
+
+
+def print_summary(summary, out=sys.stdout):
+    low, high = summary['interval']
+    print(f"Матчей: {summary['matches']}; победы игрока {summary['player_wins']}, компьютера "
+          f"{summary['computer_wins']}, ничьих {summary['draws']}", file=out)
+    print(f"Доля побед игрока: {summary['player_win_rate'] * 100:.1f}% [{low * 100:.1f}; {high * 100:.1f}]", file=out)
+    print(f"Длина матча: средняя {summary['length_mean']:.1f} с, медиана {summary['length_median']:.1f} с", file=out)
+    print(f"{'тип':<10} {'нанято':>8} {'убийств':>8} {'потерь':>8} {'убийств/найм':>13} {'урон/найм':>10} {'K/D':>6}",
+          file=out)
+    for unit_type, counters in summary['types'].items():
+        print(f"{unit_type:<10} {counters['hired']:>8} {counters['kills']:>8} {counters['lost']:>8} "
+              f"{counters['kills_per_hire']:>13.2f} {counters['damage_per_hire']:>10.2f} {counters['kill_death']:>6.2f}",
+              file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный прогон матчей ИИ против ИИ для статистики баланса")
+    parser.add_argument('--set', action='append', default=[], metavar='КЛЮЧ=ЗНАЧЕНИЕ',
+                        help="настройка баланса: " + ", ".join(SIM_SETTINGS) + " или <тип>.<hp|damage|speed|size>")
+    parser.add_argument('--results', default=os.path.join('results', 'batch_results.jsonl'),
+                        help="файл результатов (для продолжения)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--confidence', type=float, default=0.95, choices=sorted(Z_SCORES))
+    parser.add_argument('--margin', type=float, default=0.02, help="полуширина интервала доли побед для остановки")
+    parser.add_argument('--min-matches', type=int, default=100)
+    parser.add_argument('--max-matches', type=int, default=10000)
+    parser.add_argument('--max-time', type=float, default=600, help="предел длины матча, секунд симуляции")
+    parser.add_argument('--summary', help="записать итог в JSON")
+    args = parser.parse_args(argv)
+
+    config = parse_settings(args.set)
+    os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+    key = config_key(config, args.max_time)
+    z = Z_SCORES[args.confidence]
+    results = load_results(args.results, key)
+    if results:
+        print(f"Продолжение: уже сыграно {len(results)} матчей с этими настройками", file=sys.stderr)
+
+    def converged():
+        if len(results) < args.min_matches:
+            return False
+        low, high = aggregate(results, z)['interval']
+        return (high - low) / 2 <= args.margin
+
+    start = time.perf_counter()
+    resumed = len(results)
+    next_seed = 0
+    pending = set()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor, \
+                open(args.results, 'a', encoding='utf-8') as results_file:
+            while True:
+                # Окно задач чуть больше числа процессов: остановка не ждёт тысяч лишних матчей
+                while (len(pending) < args.workers * 2 and len(results) + len(pending) < args.max_matches
+                       and not converged()):
+                    while next_seed in results:
+                        next_seed += 1
+                    pending.add(executor.submit(run_match, next_seed, config, args.max_time))
+                    next_seed += 1
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results[result['seed']] = result
+                    results_file.write(json.dumps({'key': key, 'result': result}) + "\n")
+                results_file.flush()
+                print_progress(aggregate(results, z), len(results) - resumed, time.perf_counter() - start)
+                if converged():
+                    for future in pending:
+                        future.cancel()
+                    pending = set()
+    except KeyboardInterrupt:
+        print(f"\nПрервано; результаты сохранены в {args.results}", file=sys.stderr)
+    print(file=sys.stderr)
+
+    summary = aggregate(results, z)
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as summary_file:
+            json.dump(dict(summary, settings=config, confidence=args.confidence), summary_file, indent=2,
+                      ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
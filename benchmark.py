@@ -0,0 +1,240 @@
+import gc
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from simulation import Simulation, UnitType, SIM_STEP
+
+# Бенчмарк шага симуляции на заготовленных сценариях, без окна и без Kivy.
+# Для каждого сценария: время шага (среднее и перцентили), время по фазам
+# Simulation.PHASES, выделения памяти и сборки мусора. Результат — JSON,
+# который можно сравнить с прогоном на другом коммите через --compare.
+
+UNIT_TYPES = [UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN]
+AREA_PER_UNIT = 2000  # Площадь поля на юнит в равномерных сценариях, пикселей²
+
+
+def place_unit(sim, owner, unit_type, x, y, target_x, target_y):
+    unit = sim.engine.create_unit(sim.archetypes[unit_type], x, y, owner, sim.next_uid)
+    sim.next_uid += 1
+    # Через set_target, как приказ: иначе юнит создан дошедшим и стоит весь замер
+    unit.set_target(target_x, target_y)
+    sim.add_unit(unit)
+    return unit
+
+
+def make_simulation(engine_name, width=1000, height=600, seed=1):
+    engine = None
+    if engine_name == 'numpy':
+        from vector_engine import NumpyEngine
+        engine = NumpyEngine()
+    sim = Simulation(width, height, engine=engine)
+    sim.start(seed)
+    # Базы не должны пасть посреди замера, а ИИ должен успеть нанять и атаковать
+    sim.player_base.hp = sim.computer_base.hp = 1e12
+    sim.computer_base.coins = 1e6
+    sim.computer_hire_timer = 14
+    sim.computer_attack_timer = 29
+    return sim
+
+
+# Сценарии: функция (engine_name, rng) -> подготовленная симуляция
+def uniform(count):
+    def build(engine_name, rng):
+        # Поле растёт вместе с армией, плотность постоянна
+        scale = max(1.0, math.sqrt(count * AREA_PER_UNIT / (1000 * 600)))
+        width, height = 1000 * scale, 600 * scale
+        sim = make_simulation(engine_name, width, height)
+        min_x, max_x, min_y, max_y = sim.get_boundaries()
+        for k in range(count):
+            owner = "player" if k % 2 == 0 else "computer"
+            place_unit(sim, owner, rng.choice(UNIT_TYPES),
+                       rng.uniform(min_x, max_x), rng.uniform(min_y, max_y),
+                       rng.uniform(min_x, max_x), rng.uniform(min_y, max_y))
+        return sim
+    return build
+
+
+def clumped_melee(engine_name, rng, count=500):
+    # Обе армии в одном круге и все идут в его центр
+    sim = make_simulation(engine_name)
+    cx, cy = 500, 330
+    for k in range(count):
+        angle = rng.uniform(0, 2 * math.pi)
+        distance = 150 * math.sqrt(rng.random())
+        owner = "player" if k % 2 == 0 else "computer"
+        place_unit(sim, owner, rng.choice(UNIT_TYPES),
+                   cx + math.cos(angle) * distance, cy + math.sin(angle) * distance, cx, cy)
+    return sim
+
+
+def armies_crossing(engine_name, rng, per_side=250):
+    # Две колонны идут к чужим базам и проходят сквозь друг друга
+    sim = make_simulation(engine_name)
+    for owner, x, target_base in (("player", 180, sim.computer_base), ("computer", 820, sim.player_base)):
+        for k in range(per_side):
+            place_unit(sim, owner, rng.choice(UNIT_TYPES),
+                       x + (k // 20) * 22 * (1 if owner == "player" else -1), 90 + (k % 20) * 24,
+                       target_base.x, target_base.y)
+    return sim
+
+
+def parked_on_base(engine_name, rng, count=300):
+    # Юниты игрока стоят вплотную к базе компьютера и атакуют её каждый шаг
+    sim = make_simulation(engine_name)
+    base = sim.computer_base
+    for k in range(count):
+        angle = rng.uniform(0, 2 * math.pi)
+        distance = base.radius + rng.uniform(0, 60)
+        place_unit(sim, "player", rng.choice(UNIT_TYPES),
+                   base.x + math.cos(angle) * distance, base.y + math.sin(angle) * distance, base.x, base.y)
+    return sim
+
+
+SCENARIOS = {
+    'uniform_50': uniform(50),
+    'uniform_500': uniform(500),
+    'uniform_5000': uniform(5000),
+    'clumped_melee': clumped_melee,
+    'armies_crossing': armies_crossing,
+    'parked_on_base': parked_on_base,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name, engine_name, ticks, alloc_ticks, seed):
+    build = SCENARIOS[name]
+    sim = build(engine_name, random.Random(seed))
+    units = len(sim.player_units) + len(sim.computer_units)
+
+    # Замер времени
+    sim.phase_timings = {}
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    tick_times = []
+    clock = time.perf_counter
+    for _ in range(ticks):
+        start = clock()
+        sim.step(SIM_STEP)
+        tick_times.append(clock() - start)
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections_before
+    steps = len(tick_times)
+    phases = {phase: sim.phase_timings.get(phase, 0) * 1000 / steps for phase in Simulation.PHASES}
+    ordered = sorted(tick_times)
+
+    # Замер памяти отдельным прогоном: tracemalloc сильно замедляет шаг
+    sim = build(engine_name, random.Random(seed))
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for _ in range(alloc_ticks):
+        sim.step(SIM_STEP)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+
+    return {
+        'units': units,
+        'ticks': steps,
+        'tick_ms': {
+            'mean': sum(tick_times) * 1000 / steps,
+            'p50': percentile(ordered, 0.50) * 1000,
+            'p90': percentile(ordered, 0.90) * 1000,
+            'p99': percentile(ordered, 0.99) * 1000,
+            'max': ordered[-1] * 1000,
+        },
+        'phase_ms_per_tick': phases,
+        'alloc': {
+            'ticks': alloc_ticks,
+            'peak_kb': peak / 1024,
+            'net_kb': current / 1024,
+            'net_blocks': blocks_after - blocks_before,
+        },
+        'gc_collections': collections,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, out=sys.stderr):
+    print(f"{'сценарий':<16} {'юнитов':>6} {'сред':>7} {'p50':>7} {'p99':>7} {'макс':>7}  "
+          + " ".join(f"{phase[:10]:>10}" for phase in Simulation.PHASES) + f" {'пик КБ':>8}", file=out)
+    for name, result in results['scenarios'].items():
+        tick = result['tick_ms']
+        phases = " ".join(f"{result['phase_ms_per_tick'][phase]:>10.3f}" for phase in Simulation.PHASES)
+        print(f"{name:<16} {result['units']:>6} {tick['mean']:>7.2f} {tick['p50']:>7.2f} {tick['p99']:>7.2f} "
+              f"{tick['max']:>7.2f}  {phases} {result['alloc']['peak_kb']:>8.0f}", file=out)
+
+
+def print_comparison(results, baseline, out=sys.stderr):
+    print(f"Сравнение с {baseline['meta'].get('commit')} (изменение среднего и p99):", file=out)
+    for name, result in results['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        changes = []
+        for key in ('mean', 'p99'):
+            before = old['tick_ms'][key]
+            after = result['tick_ms'][key]
+            changes.append(f"{key} {before:.2f} -> {after:.2f} мс ({(after - before) / before * 100:+.1f}%)")
+        print(f"  {name:<16} " + ", ".join(changes), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк шага симуляции по сценариям")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="список сценариев через запятую: " + ", ".join(SCENARIOS))
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--alloc-ticks', type=int, default=60)
+    parser.add_argument('--engine', choices=('grid', 'numpy'), default='grid')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="записать JSON в файл вместо stdout")
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'engine': args.engine,
+            'ticks': args.ticks,
+            'seed': args.seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'scenarios': {},
+    }
+    for name in args.scenarios.split(','):
+        results['scenarios'][name] = run_scenario(name, args.engine, args.ticks, args.alloc_ticks, args.seed)
+        print(f"{name}: готово", file=sys.stderr)
+
+    print_table(results)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            print_comparison(results, json.load(baseline_file))
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
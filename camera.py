@@ -0,0 +1,104 @@
+# Камера над миром, который больше экрана: позиция (мировые координаты левого
+# нижнего угла экрана) и масштаб. Без Kivy — только пересчёт координат;
+# RTSGame применяет её к холсту мира через Translate/Scale.
+
+MIN_ZOOM = 0.2
+MAX_ZOOM = 2.0
+LOD_ZOOM = 0.5  # При меньшем масштабе юниты рисуются точками
+
+
+class Camera:
+    def __init__(self, world_width, world_height, view_width, view_height, zoom=1.0):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.view_width = view_width
+        self.view_height = view_height
+        self.zoom = zoom
+        # Полосы экрана под панелями интерфейса (слева, снизу, справа, сверху), пикселей экрана.
+        # Панели перехватывают касания, поэтому край мира можно вывести из-под них
+        self.insets = (0, 0, 0, 0)
+        self.x = 0
+        self.y = 0
+        self.version = 0  # Растёт при каждом изменении, чтобы не пересчитывать видимое без нужды
+        self.clamp()
+
+    def set_world(self, world_width, world_height):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.clamp()
+
+    def resize_view(self, view_width, view_height):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.clamp()
+
+    def set_insets(self, left=0, bottom=0, right=0, top=0):
+        self.insets = (left, bottom, right, top)
+        self.clamp()
+
+    def open_size(self):
+        # Часть экрана, не закрытая панелями
+        left, bottom, right, top = self.insets
+        return max(1, self.view_width - left - right), max(1, self.view_height - bottom - top)
+
+    def min_zoom(self):
+        # Сильнее отдалять, чем чтобы мир целиком поместился в открытую часть экрана, незачем
+        open_width, open_height = self.open_size()
+        fit = min(open_width / self.world_width, open_height / self.world_height)
+        return max(MIN_ZOOM, min(fit, 1.0))
+
+    def clamp(self):
+        self.zoom = max(self.min_zoom(), min(MAX_ZOOM, self.zoom))
+        left, bottom, _, _ = self.insets
+        open_width, open_height = self.open_size()
+        visible_width = open_width / self.zoom
+        visible_height = open_height / self.zoom
+        # Пределы считаются для открытой части: любой край мира можно вывести из-под панели.
+        # Если мир уже открытой части, он в ней центрируется
+        if visible_width >= self.world_width:
+            x = (self.world_width - visible_width) / 2
+        else:
+            x = max(0, min(self.x + left / self.zoom, self.world_width - visible_width))
+        if visible_height >= self.world_height:
+            y = (self.world_height - visible_height) / 2
+        else:
+            y = max(0, min(self.y + bottom / self.zoom, self.world_height - visible_height))
+        self.x = x - left / self.zoom
+        self.y = y - bottom / self.zoom
+        self.version += 1
+
+    def screen_to_world(self, sx, sy):
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def world_to_screen(self, wx, wy):
+        return (wx - self.x) * self.zoom, (wy - self.y) * self.zoom
+
+    def pan(self, screen_dx, screen_dy):
+        # Сдвиг пальцем: мир едет вместе с пальцем
+        self.x -= screen_dx / self.zoom
+        self.y -= screen_dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, factor, sx, sy):
+        # Масштаб относительно точки экрана: точка мира под пальцем остаётся на месте
+        wx, wy = self.screen_to_world(sx, sy)
+        self.zoom = max(self.min_zoom(), min(MAX_ZOOM, self.zoom * factor))
+        self.x = wx - sx / self.zoom
+        self.y = wy - sy / self.zoom
+        self.clamp()
+
+    def center_on(self, wx, wy):
+        # Точка встаёт в центр открытой части экрана
+        left, bottom, _, _ = self.insets
+        open_width, open_height = self.open_size()
+        self.x = wx - (left + open_width / 2) / self.zoom
+        self.y = wy - (bottom + open_height / 2) / self.zoom
+        self.clamp()
+
+    def visible_rect(self, margin=0):
+        # Видимая часть мира (min_x, min_y, max_x, max_y) с запасом margin мировых пикселей
+        return (self.x - margin, self.y - margin,
+                self.x + self.view_width / self.zoom + margin, self.y + self.view_height / self.zoom + margin)
+
+    def lod(self):
+        return self.zoom < LOD_ZOOM
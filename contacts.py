@@ -0,0 +1,102 @@
+from bisect import insort
+from operator import attrgetter
+
+_by_uid = attrgetter('uid')
+
+# Запас расстояния пар-кандидатов, пикселей: пара попадает в кэш, когда враги сходятся
+# ближе суммы полуразмеров плюс CONTACT_SKIN, и выпадает, когда расходятся дальше
+CONTACT_SKIN = 8
+
+
+# Постоянный кэш пар «юнит игрока — юнит компьютера», которые могут касаться.
+# Пары не ищутся заново каждый тик: сетку врагов опрашивает только юнит, сместившийся
+# больше чем на skin / 4 от места своего прошлого опроса (новый юнит — сразу).
+# Пока все остальные сдвинулись меньше, ни одна пара не могла сблизиться на skin,
+# так что каждая касающаяся пара гарантированно лежит в кэше.
+class ContactCache:
+    def __init__(self, skin=CONTACT_SKIN):
+        self.skin = skin
+        self.rescan_distance = skin / 4
+        self.near = {}  # Юнит -> враги-кандидаты; у юнитов игрока список упорядочен по uid
+        self.anchors = {}  # Юнит -> (x, y) на момент прошлого опроса сетки, None — опросить
+
+    def add(self, unit):
+        self.near[unit] = []
+        self.anchors[unit] = None
+
+    def remove(self, unit):
+        for other in self.near.pop(unit, ()):
+            self.near[other].remove(unit)
+        self.anchors.pop(unit, None)
+
+    def clear(self):
+        self.near = {}
+        self.anchors = {}
+
+    def refresh(self, sim, grids):
+        limit = self.rescan_distance * self.rescan_distance
+        anchors = self.anchors
+        for owner, enemy in (("player", "computer"), ("computer", "player")):
+            enemy_grid = grids[enemy]
+            for unit in sim.units_of(owner):
+                anchor = anchors[unit]
+                if anchor is not None:
+                    if unit.asleep:
+                        continue
+                    dx = unit.x - anchor[0]
+                    dy = unit.y - anchor[1]
+                    if dx * dx + dy * dy <= limit:
+                        continue
+                self.scan(unit, enemy_grid)
+
+    def scan(self, unit, enemy_grid):
+        self.anchors[unit] = (unit.x, unit.y)
+        near = self.near
+        mine = near[unit]
+        reach = unit.archetype.half_size + self.skin
+        for other in enemy_grid.query(unit.x, unit.y, reach + enemy_grid.max_size / 2):
+            if other in mine:
+                continue
+            limit = reach + other.archetype.half_size
+            dx = unit.x - other.x
+            dy = unit.y - other.y
+            if dx * dx + dy * dy <= limit * limit:
+                self.link(unit, other)
+
+    def link(self, unit, other):
+        if unit.owner == "player":
+            insort(self.near[unit], other, key=_by_uid)
+            self.near[other].append(unit)
+        else:
+            self.near[unit].append(other)
+            insort(self.near[other], unit, key=_by_uid)
+
+    def unlink(self, p_unit, c_unit):
+        self.near[p_unit].remove(c_unit)
+        self.near[c_unit].remove(p_unit)
+
+    def engaged(self, sim):
+        # Касающиеся сейчас пары в порядке юнитов игрока и uid врагов — порядок не зависит
+        # от истории кэша, поэтому повтор и продолжение со снимка дают тот же бой.
+        # Разошедшиеся дальше запаса пары покидают кэш.
+        near = self.near
+        skin = self.skin
+        engaged = []
+        leaving = []
+        for p_unit in sim.player_units:
+            enemies = near[p_unit]
+            if not enemies:
+                continue
+            p_half = p_unit.archetype.half_size
+            for c_unit in enemies:
+                min_dist = p_half + c_unit.archetype.half_size
+                dx = p_unit.x - c_unit.x
+                dy = p_unit.y - c_unit.y
+                dist_sq = dx * dx + dy * dy
+                if dist_sq <= min_dist * min_dist:
+                    engaged.append((p_unit, c_unit))
+                elif dist_sq > (min_dist + skin) * (min_dist + skin):
+                    leaving.append((p_unit, c_unit))
+        for p_unit, c_unit in leaving:
+            self.unlink(p_unit, c_unit)
+        return engaged
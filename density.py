@@ -0,0 +1,95 @@
+from array import array
+
+# Сетка плотности армий для дальнего масштаба и мини-карты: мир делится на клетки
+# примерно по CELL_SIZE пикселей, в каждой считаются юниты игрока и компьютера.
+# Без Kivy — только счётчики и RGBA-пиксели (красный — игрок, синий — компьютер);
+# текстуру из них заливает batch_render.DensityTexture.
+# Обновление инкрементальное: каждый юнит помнит свою клетку, пересчитываются
+# только клетки, которые юниты покинули или заняли, и только их пиксели.
+# Юниты проверяются по частям: за один вызов update — каждый parts-й юнит.
+
+CELL_SIZE = 25
+SATURATION = 3  # Сколько юнитов в клетке дают полную яркость
+
+
+class DensityGrid:
+    def __init__(self, world_width, world_height, cell_size=CELL_SIZE):
+        self.version = 0  # Растёт при каждом изменении пикселей
+        self.resize(world_width, world_height, cell_size)
+
+    def resize(self, world_width, world_height, cell_size=CELL_SIZE):
+        # Новый размер мира (повтор с другого поля): юниты надо добавить заново
+        self.world_width = world_width
+        self.world_height = world_height
+        self.cols = max(1, -(-int(world_width) // cell_size))
+        self.rows = max(1, -(-int(world_height) // cell_size))
+        # Клетки подгоняются так, чтобы сетка покрывала мир ровно
+        self.cell_width = world_width / self.cols
+        self.cell_height = world_height / self.rows
+        cells = self.cols * self.rows
+        self.counts = {"player": array('H', [0]) * cells, "computer": array('H', [0]) * cells}
+        self.pixels = bytearray(cells * 4)
+        self.cell_of = {}  # Юнит -> номер его клетки
+        self.dirty = set()  # Клетки, пиксели которых устарели
+        self.version += 1
+
+    def index(self, x, y):
+        col = min(self.cols - 1, max(0, int(x / self.cell_width)))
+        row = min(self.rows - 1, max(0, int(y / self.cell_height)))
+        return row * self.cols + col
+
+    def add(self, unit):
+        cell = self.index(unit.x, unit.y)
+        self.cell_of[unit] = cell
+        self.counts[unit.owner][cell] += 1
+        self.dirty.add(cell)
+
+    def remove(self, unit):
+        cell = self.cell_of.pop(unit, None)
+        if cell is not None:
+            self.counts[unit.owner][cell] -= 1
+            self.dirty.add(cell)
+
+    def update(self, units_lists, part=0, parts=1):
+        # Спящие юниты не двигались; остальные переносятся, только если сменили клетку
+        cell_of = self.cell_of
+        cols = self.cols
+        cell_width = self.cell_width
+        cell_height = self.cell_height
+        max_col = cols - 1
+        max_row = self.rows - 1
+        dirty = self.dirty
+        for units in units_lists:
+            for unit in units[part::parts]:
+                if unit.asleep:
+                    continue
+                col = int(unit.x / cell_width)
+                row = int(unit.y / cell_height)
+                cell = min(max_row, max(0, row)) * cols + min(max_col, max(0, col))
+                old = cell_of[unit]
+                if cell != old:
+                    counts = self.counts[unit.owner]
+                    counts[old] -= 1
+                    counts[cell] += 1
+                    cell_of[unit] = cell
+                    dirty.add(old)
+                    dirty.add(cell)
+
+    def flush(self):
+        # Перекрашивает устаревшие клетки; True, если пиксели изменились
+        if not self.dirty:
+            return False
+        player = self.counts["player"]
+        computer = self.counts["computer"]
+        pixels = self.pixels
+        level = 255 // SATURATION
+        for cell in self.dirty:
+            red = min(255, player[cell] * level)
+            blue = min(255, computer[cell] * level)
+            k = cell * 4
+            pixels[k] = red
+            pixels[k + 2] = blue
+            pixels[k + 3] = max(red, blue)
+        self.dirty.clear()
+        self.version += 1
+        return True
@@ -0,0 +1,173 @@
+import time
+import queue
+import threading
+
+# Журнал боевых событий: вместо print() в горячем цикле события складываются
+# кортежами в кольцевой буфер фиксированного размера, а раз в тик буфер
+# отдаётся приёмнику (sink). Форматирование строк и ввод-вывод делает только приёмник.
+
+# Типы событий
+DAMAGE = 0  # Юнит нанёс урон юниту
+KILL = 1  # Юнит уничтожен
+HIRE = 2  # Юнит нанят
+BASE_HIT = 3  # Юнит нанёс урон базе
+ATTACK_ORDER = 4  # ИИ отправил войска в атаку
+HIRE_FAILED = 5  # Не хватило монет на найм
+
+EVENT_NAMES = {
+    DAMAGE: 'damage',
+    KILL: 'kill',
+    HIRE: 'hire',
+    BASE_HIT: 'base_hit',
+    ATTACK_ORDER: 'attack_order',
+    HIRE_FAILED: 'hire_failed',
+}
+
+# Событие: (тип, время симуляции, владелец, тип юнита, цель, величина)
+# Цель — тип юнита-цели, имя базы или None; величина — урон или 1.
+
+
+def format_event(event):
+    kind, sim_time, owner, unit_type, target, amount = event
+    return f"{sim_time:9.3f} {EVENT_NAMES[kind]:<12} {owner} {unit_type} {target} {amount:.2f}"
+
+
+class CombatLog:
+    def __init__(self, sink=None, capacity=4096):
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.head = 0  # Индекс следующей записи
+        self.count = 0  # Сколько событий ждёт выгрузки
+        self.dropped = 0  # Сколько событий вытеснено до выгрузки
+        self.set_sink(sink)
+
+    def set_sink(self, sink):
+        self.sink = sink if sink is not None else NullSink()
+        self.enabled = self.sink.enabled
+
+    def emit(self, kind, sim_time, owner, unit_type, target, amount):
+        if not self.enabled:
+            return
+        self.buffer[self.head] = (kind, sim_time, owner, unit_type, target, amount)
+        self.head = (self.head + 1) % self.capacity
+        if self.count == self.capacity:
+            self.dropped += 1  # Перезаписали самое старое событие
+        else:
+            self.count += 1
+
+    def drain(self):
+        # События в порядке поступления; буфер очищается
+        count = self.count
+        if count == 0:
+            return []
+        start = (self.head - count) % self.capacity
+        if start + count <= self.capacity:
+            events = self.buffer[start:start + count]
+        else:
+            events = self.buffer[start:] + self.buffer[:self.head]
+        self.count = 0
+        return events
+
+    def flush(self, sim_time):
+        if not self.enabled:
+            return
+        self.sink.write(self.drain(), sim_time)
+
+    def close(self):
+        self.flush(0)
+        self.sink.close()
+
+
+# Журнал выключен: emit ничего не делает
+class NullSink:
+    enabled = False
+
+    def write(self, events, sim_time):
+        pass
+
+    def close(self):
+        pass
+
+
+# Сводка раз в interval секунд симуляции: количество событий и суммарный урон по типам
+class SummarySink:
+    enabled = True
+
+    def __init__(self, interval=1.0, output=print):
+        self.interval = interval
+        self.output = output
+        self.reset(0)
+
+    def reset(self, sim_time):
+        self.window_start = sim_time
+        self.counts = {}
+        self.amounts = {}
+
+    def write(self, events, sim_time):
+        counts = self.counts
+        amounts = self.amounts
+        for kind, _, owner, _, _, amount in events:
+            key = (kind, owner)
+            counts[key] = counts.get(key, 0) + 1
+            amounts[key] = amounts.get(key, 0) + amount
+        if sim_time < self.window_start:
+            self.reset(sim_time)  # Новый матч
+        elif sim_time - self.window_start >= self.interval:
+            if counts:
+                self.output(self.summary(sim_time))
+            self.reset(sim_time)
+
+    def summary(self, sim_time):
+        parts = []
+        for (kind, owner), count in sorted(self.counts.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            part = f"{EVENT_NAMES[kind]}[{owner}]={count}"
+            if kind in (DAMAGE, BASE_HIT):
+                part += f" ({self.amounts[(kind, owner)]:.2f})"
+            parts.append(part)
+        return f"[{self.window_start:.0f}-{sim_time:.0f} с] " + ", ".join(parts)
+
+    def close(self):
+        pass
+
+
+# Запись событий в файл фоновым потоком: в игровом цикле только кладём пачку в очередь
+class AsyncFileSink:
+    enabled = True
+
+    def __init__(self, path, max_pending=256):
+        self.path = path
+        self.pending = queue.Queue(max_pending)
+        self.dropped_batches = 0
+        self.thread = threading.Thread(target=self.run, name="combat-log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, events, sim_time):
+        if not events:
+            return
+        try:
+            self.pending.put_nowait(events)
+        except queue.Full:
+            self.dropped_batches += 1  # Диск не успевает — лучше потерять лог, чем кадр
+
+    def run(self):
+        with open(self.path, 'a', encoding='utf-8') as log_file:
+            while True:
+                events = self.pending.get()
+                if events is None:
+                    break
+                log_file.write("\n".join(format_event(event) for event in events))
+                log_file.write("\n")
+                if self.pending.empty():
+                    log_file.flush()
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join(timeout=2)
+
+
+def make_sink(mode, path=None, output=print):
+    if mode == 'summary':
+        return SummarySink(output=output)
+    if mode == 'file':
+        return AsyncFileSink(path or f"combat_{int(time.time())}.log")
+    return NullSink()
@@ -0,0 +1,117 @@
+import math
+from collections import OrderedDict
+
+# Строи для приказов на перемещение: вместо одной точки на всех каждый юнит получает
+# своё место (слот) вокруг точки приказа, и толпа не сбивается в кучу, которую потом
+# каждый шаг расталкивают separate() и бой. Раскладка слотов зависит только от строя
+# и числа юнитов, поэтому считается один раз и берётся из кэша; при приказе её остаётся
+# повернуть лицом по движению, растянуть на размер юнитов и раздать слоты юнитам.
+
+FORMATIONS = ('box', 'line', 'wedge')  # Каре, линия, клин
+FORMATION_GAP = 6  # Зазор между соседями в строю, пикселей
+LINE_RANK = 20  # Наибольшая длина шеренги линии; больше — линия становится глубже
+CACHE_SIZE = 64  # Сколько раскладок держать в кэше
+
+
+def build_layout(formation, count):
+    # Ряды от первого (ближе к цели) к последнему: (глубина, смещения вбок) в шагах строя.
+    # Строй центрирован на точке приказа, неполный последний ряд — по центру
+    if formation == 'wedge':
+        # Клин: остриё из одного юнита, каждый следующий ряд на два шире
+        sizes = []
+        width = 1
+        while count > 0:
+            sizes.append(min(width, count))
+            count -= width
+            width += 2
+    else:
+        if formation == 'line':
+            cols = min(count, LINE_RANK)
+        else:
+            cols = int(math.ceil(math.sqrt(count)))
+        sizes = [cols] * (count // cols)
+        if count % cols:
+            sizes.append(count % cols)
+    front = (len(sizes) - 1) / 2
+    return tuple((front - row, tuple(k - (size - 1) / 2 for k in range(size)))
+                 for row, size in enumerate(sizes))
+
+
+# Кэш раскладок с вытеснением давно не использованных
+class FormationCache:
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self.layouts = OrderedDict()
+        self.builds = 0  # Сколько раскладок построено, для профилирования
+
+    def get(self, formation, count):
+        key = (formation, count)
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.layouts.move_to_end(key)
+            return layout
+        layout = build_layout(formation, count)
+        self.builds += 1
+        self.layouts[key] = layout
+        if len(self.layouts) > self.capacity:
+            self.layouts.popitem(last=False)
+        return layout
+
+    def clear(self):
+        self.layouts.clear()
+
+
+def assign_slots(units, layout, target_x, target_y, boundaries):
+    # Возвращает [(юнит, x, y)]. Строй смотрит от центра группы к точке приказа.
+    # Раздача слотов — развёртка по рядам: самые продвинутые вперёд юниты встают в первый
+    # ряд, внутри ряда юниты и слоты упорядочены поперёк движения. Пути почти не
+    # пересекаются, а сумма путей близка к оптимальной при O(n log n) вместо венгерского O(n³)
+    count = len(units)
+    center_x = sum(unit.x for unit in units) / count
+    center_y = sum(unit.y for unit in units) / count
+    forward_x = target_x - center_x
+    forward_y = target_y - center_y
+    length = math.hypot(forward_x, forward_y)
+    if length > 1e-6:
+        forward_x /= length
+        forward_y /= length
+    else:
+        forward_x, forward_y = 1.0, 0.0
+    side_x, side_y = -forward_y, forward_x
+    spacing = max(unit.size for unit in units) + FORMATION_GAP
+
+    slots = []
+    for depth, laterals in layout:
+        for lateral in laterals:
+            slots.append((target_x + (depth * forward_x + lateral * side_x) * spacing,
+                          target_y + (depth * forward_y + lateral * side_y) * spacing))
+    # Строй у края поля сдвигается целиком; не поместившийся в поле прижимается к краю
+    min_x, max_x, min_y, max_y = boundaries
+    pad = spacing / 2
+    shift_x = _fit_shift(min(x for x, _ in slots) - pad, max(x for x, _ in slots) + pad, min_x, max_x)
+    shift_y = _fit_shift(min(y for _, y in slots) - pad, max(y for _, y in slots) + pad, min_y, max_y)
+
+    # Порядок при равных проекциях — по uid, чтобы раздача не зависела от порядка выделения
+    ordered = sorted(units, key=lambda unit: (-(unit.x * forward_x + unit.y * forward_y), unit.uid))
+    assigned = []
+    start = 0
+    for _, laterals in layout:
+        rank = sorted(ordered[start:start + len(laterals)],
+                      key=lambda unit: (unit.x * side_x + unit.y * side_y, unit.uid))
+        for unit, (x, y) in zip(rank, slots[start:start + len(laterals)]):
+            half_size = unit.size / 2
+            assigned.append((unit,
+                             max(min_x + half_size, min(x + shift_x, max_x - half_size)),
+                             max(min_y + half_size, min(y + shift_y, max_y - half_size))))
+        start += len(laterals)
+    return assigned
+
+
+def _fit_shift(low, high, min_value, max_value):
+    if high - low > max_value - min_value:
+        return 0
+    if low < min_value:
+        return min_value - low
+    if high > max_value:
+        return max_value - high
+    return 0
@@ -0,0 +1,135 @@
+from kivy.uix.widget import Widget
+from kivy.uix.label import Label
+from kivy.graphics import Color, Rectangle, Line
+from kivy.logger import Logger
+from profiler import FrameProfiler, format_record
+
+# Оверлей профилировщика: текст с цифрами и график длительности кадров за последние
+# FrameProfiler.history кадров. Пока оверлей скрыт, профилировщик отключён от
+# симуляции и сборщика мусора и ничего не стоит.
+
+GRAPH_WIDTH = 240
+GRAPH_HEIGHT = 60
+GRAPH_MAX = 1 / 20.  # Верх графика — 50 мс
+TEXT_INTERVAL = 0.25  # Как часто обновлять текст, секунд (перерисовка текстуры Label не бесплатна)
+
+
+# Число инструкций холста с вложенными: отрисовка юнита — одна группа из нескольких инструкций
+def count_instructions(group):
+    count = 0
+    for child in group.children:
+        count += 1
+        if getattr(child, 'children', None):
+            count += count_instructions(child)
+    return count
+
+
+class ProfilerHUD(Widget):
+    def __init__(self, game, **kwargs):
+        super(ProfilerHUD, self).__init__(size_hint=(None, None), size=(GRAPH_WIDTH, GRAPH_HEIGHT + 150), **kwargs)
+        self.game = game
+        self.profiler = FrameProfiler()
+        self.visible = False
+        self.text_timer = 0
+        with self.canvas:
+            Color(0, 0, 0, 0.6)
+            self.background = Rectangle()
+            # Линия бюджета кадра 60 FPS
+            Color(0, 1, 0, 0.5)
+            self.budget_line = Line(width=1)
+            Color(1, 1, 0)
+            self.graph = Line(width=1)
+        self.label = Label(font_size=11, halign='left', valign='top', color=(1, 1, 1, 1))
+        self.add_widget(self.label)
+        self.bind(pos=self.layout, size=self.layout)
+        self.layout()
+
+    def layout(self, *args):
+        x, y = self.pos
+        self.background.pos = (x, y)
+        self.background.size = self.size
+        budget = y + GRAPH_HEIGHT * (1 / 60.) / GRAPH_MAX
+        self.budget_line.points = [x, budget, x + GRAPH_WIDTH, budget]
+        self.label.pos = (x + 4, y + GRAPH_HEIGHT)
+        self.label.size = (self.width - 8, self.height - GRAPH_HEIGHT)
+        self.label.text_size = self.label.size
+
+    def toggle(self):
+        if self.visible:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        if self.visible:
+            return
+        self.visible = True
+        self.profiler.attach(self.game.sim)
+        self.game.add_widget(self)
+
+    def hide(self):
+        if not self.visible:
+            return
+        self.visible = False
+        self.profiler.detach()
+        self.profiler.history.clear()
+        self.game.remove_widget(self)
+
+    def begin_frame(self):
+        if self.visible:
+            self.profiler.begin_frame()
+
+    def end_frame(self, dt):
+        if not self.visible:
+            return
+        profiler = self.profiler
+        record = profiler.end_frame(dt)
+        if profiler.is_spike(record):
+            Logger.debug("HUD: всплеск: %s", format_record(record))
+        self.update_graph()
+        self.text_timer += dt
+        if self.text_timer >= TEXT_INTERVAL:
+            self.text_timer = 0
+            self.update_text(record)
+
+    def update_graph(self):
+        x, y = self.pos
+        history = self.profiler.history
+        step = GRAPH_WIDTH / max(1, history.maxlen - 1)
+        points = []
+        for k, record in enumerate(history):
+            points += [x + k * step, y + GRAPH_HEIGHT * min(record.frame_time, GRAPH_MAX) / GRAPH_MAX]
+        self.graph.points = points
+
+    def pool_text(self):
+        renderer = self.game.renderer
+        if hasattr(renderer, 'free_count'):
+            return f", в пуле {renderer.free_count()}"
+        return f", Mesh {renderer.draw_call_count()}"
+
+    def update_text(self, record):
+        game = self.game
+        sim = game.sim
+        profiler = self.profiler
+        mean = profiler.mean_frame_time()
+        lines = [
+            f"кадр {record.frame_time * 1000:.1f} мс (сред {mean * 1000:.1f}, "
+            f"{1 / mean if mean else 0:.0f} FPS), update {record.update_time * 1000:.1f} мс",
+            f"юниты: игрок {len(sim.player_units)}, компьютер {len(sim.computer_units)}",
+            f"инструкций холста: {count_instructions(game.world.canvas)}" + self.pool_text(),
+            f"GC: {profiler.gc_total} сборок, {record.gc_time * 1000:.1f} мс в кадре",
+        ]
+        phase_means = profiler.phase_means()
+        for phase in sim.PHASES:
+            lines.append(f"  {phase}: {phase_means.get(phase, 0) * 1000:.2f} мс")
+        session = game.session
+        if session is not None:
+            # Состояние сетевой игры: сторона, задержка команд, расхождения и восстановления
+            lines.append(f"сеть: {session.side}, задержка {session.delay} шагов, ожиданий {session.stalls}, "
+                         f"расхождений {len(session.desyncs)}, восстановлений {session.resyncs}, "
+                         f"отброшено команд {session.rejected}")
+        worst = profiler.worst()
+        if worst is not None:
+            name, elapsed = worst.culprit()
+            lines.append(f"худший: {worst.frame_time * 1000:.1f} мс, {name} {elapsed * 1000:.1f} мс")
+        self.label.text = "\n".join(lines)
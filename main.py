@@ -1,196 +1,466 @@
+from startup import profiler as startup  # Первым: отсчёт времени старта
 import kivy
 from kivy.app import App
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.button import Button
-from kivy.graphics import Ellipse, Rectangle, Color, Triangle, Line
+from kivy.graphics import Ellipse, Rectangle, Color, Triangle, Line, InstructionGroup
+from kivy.graphics import PushMatrix, PopMatrix, Scale, Translate
+from kivy.uix.widget import Widget
 from kivy.clock import Clock
+from kivy.utils import platform
+from kivy.logger import Logger
+startup.mark("импорт Kivy")
 from kivy.core.window import Window
-from kivy.uix.label import Label
-from kivy.uix.boxlayout import BoxLayout
-import random
+startup.mark("создание окна")
+import os
 import math
 import time  # Для отслеживания времени между кликами
+from batch_render import BatchRenderer, PointCloud, DensityTexture, DensityLayer
+from camera import Camera
+startup.mark("импорт модулей отрисовки")
+# Симуляция, ИИ, повторы, снимки, оверлей и мини-карта не нужны меню и импортируются в init_world()
 
 # Установка размера окна для тестирования
 Window.size = (1000, 600)
 
-# Определение типов юнитов
-class UnitType:
-    CAVALRY = 'cavalry'
-    PIKEMAN = 'pikeman'
-    SWORDSMAN = 'swordsman'
-
-# Класс базы
-class Base:
-    def __init__(self, x, y, color, canvas, name):
-        self.x = x
-        self.y = y
-        self.hp = 250
-        self.coins = 100
-        self.income = 1
-        self.color = color
-        self.radius = 50  # Радиус базы
-        self.inner_radius = 30  # Внутренний радиус
-        self.name = name  # "player" или "computer"
+# Режим отрисовки юнитов: 'objects' — свои инструкции на каждый юнит,
+# 'batch' — один Mesh на форму и владельца (по умолчанию на Android)
+RENDER_MODE = 'batch' if platform == 'android' else 'objects'
+
+# Журнал боя: 'off', 'summary' — сводка раз в секунду в журнал Kivy, 'file' — запись в файл фоновым потоком
+COMBAT_LOG = 'off'
+
+# Воспроизведение записанного матча: RTS_REPLAY=путь к файлу, RTS_REPLAY_SPEED=множитель скорости
+REPLAY_PATH = os.environ.get('RTS_REPLAY')
+REPLAY_SPEED = float(os.environ.get('RTS_REPLAY_SPEED', '1'))
+
+# Сетевая игра вдвоём: RTS_NET=хост:порт ретранслятора (python netplay.py serve).
+# Первый подключившийся играет красными, второй — синими; задержку команд задаёт ретранслятор
+NET_ADDRESS = os.environ.get('RTS_NET')
+
+# ИИ компьютера: 'process' или 'thread' — планировщик с прогонами в фоне, 'off' — прежние таймеры.
+# Процесс порождается только через fork: при spawn (Windows, macOS) дочерний процесс заново
+# импортирует main.py и создаёт окно Kivy. Поэтому процесс — только на Linux, на Android
+# дочерние процессы недоступны вовсе
+AI_PLANNER = 'process' if platform == 'linux' else 'thread'
+
+# Оверлей профилировщика включается кнопкой в углу экрана; RTS_PROFILER=1 — показать сразу
+PROFILER_VISIBLE = os.environ.get('RTS_PROFILER') == '1'
+
+# Выделение протяжкой: короче DRAG_THRESHOLD пикселей — это касание (приказ на перемещение);
+# путь, вернувшийся к началу, — лассо, иначе — рамка от начала до конца протяжки
+DRAG_THRESHOLD = 15
+DRAG_STEP = 8
+
+# Строй выбранных юнитов при приказе на перемещение (formations.py): каждый идёт в свой слот
+# вокруг точки касания. Кнопка на панели найма переключает строи по кругу; None — без строя,
+# все идут в саму точку касания
+FORMATION_NAMES = {None: "нет", 'box': "Каре", 'line': "Линия", 'wedge': "Клин"}
+
+# Мир больше экрана; камера двигается протяжкой двумя пальцами или правой кнопкой мыши,
+# масштаб — щипком или колесом мыши
+WORLD_WIDTH = 3000
+WORLD_HEIGHT = 1800
+ZOOM_STEP = 1.1  # Множитель масштаба за щелчок колеса
+HIRE_PANEL_HEIGHT = 0.1  # Доля высоты экрана под панелью найма
+VIEW_MARGIN = 30  # Запас видимой области, мировых пикселей: полразмера юнита и интерполяция
+
+# Частота кадров игры: полная, пока на поле что-то движется; если поле замерло дольше
+# IDLE_DELAY секунд (юниты стоят, копятся монеты) — IDLE_FPS. Касание или движение
+# возвращают полную частоту. Симуляция всё равно идёт шагами SIM_STEP, за кадр их просто больше
+FULL_FPS = 60
+IDLE_FPS = 10
+IDLE_DELAY = 1.0
+
+# Огромные армии рисуются не фигурами, а текстурой плотности на весь мир (та же текстура
+# на мини-карте): на дальнем масштабе — если в кадре больше DENSITY_LOD_UNITS юнитов,
+# вблизи — больше DENSITY_UNITS. Сетка плотности обновляется по частям: за кадр
+# проверяется каждый DENSITY_PARTS-й юнит, текстура заливается раз за полный проход
+DENSITY_UNITS = 2000
+DENSITY_LOD_UNITS = 300
+DENSITY_PARTS = 8
+
+
+def is_lasso(points):
+    if len(points) < 8:
+        return False
+    xs = points[0::2]
+    ys = points[1::2]
+    extent = math.hypot(max(xs) - min(xs), max(ys) - min(ys))
+    closing = math.hypot(points[-2] - points[0], points[-1] - points[1])
+    return extent >= DRAG_THRESHOLD and closing < 0.3 * extent
+
+# Отрисовка базы
+class BaseView:
+    def __init__(self, base, canvas):
+        self.base = base
         self.canvas = canvas
         self.draw()
 
     def draw(self):
+        base = self.base
         with self.canvas:
             # Внешний круг
-            Color(*self.color)
-            self.outer_circle = Ellipse(pos=(self.x - self.radius, self.y - self.radius),
-                                        size=(self.radius*2, self.radius*2))
+            Color(*base.color)
+            self.outer_circle = Ellipse(pos=(base.x - base.radius, base.y - base.radius),
+                                        size=(base.radius*2, base.radius*2))
             # Внутренний круг более тёмного оттенка
-            Color(*self.get_inner_color())
-            self.inner_circle = Ellipse(pos=(self.x - self.inner_radius, self.y - self.inner_radius),
-                                        size=(self.inner_radius*2, self.inner_radius*2))
-
-    def get_inner_color(self):
-        return tuple(max(c - 0.3, 0) for c in self.color)
-
-    def update(self, dt):
-        self.coins += self.income * dt
-
-    def take_damage(self, damage):
-        self.hp -= damage
-        print(f"{self.name.capitalize()} Base получил {damage:.2f} урона! HP: {self.hp:.2f}")
-
-# Класс юнита
-class Unit:
-    def __init__(self, unit_type, x, y, owner, canvas):
-        self.type = unit_type
-        self.x = x
-        self.y = y
-        self.target_x = x
-        self.target_y = y
-        self.owner = owner  # "player" или "computer"
-        self.hp = 5
-        self.damage = 0.1  # Урон за секунду (уменьшен в 10 раз)
-        self.speed = 100  # пикселей в секунду
-        self.size = 20  # Размер юнита (диаметр)
-        self.color = (1, 0, 0) if self.owner == "player" else (0, 0, 1)
+            Color(*base.get_inner_color())
+            self.inner_circle = Ellipse(pos=(base.x - base.inner_radius, base.y - base.inner_radius),
+                                        size=(base.inner_radius*2, base.inner_radius*2))
+
+# Отрисовка юнита. Все инструкции (цвет, фигура, обводка выделения с её цветом)
+# лежат в одной группе, которая живёт на холсте, пока жив рендерер: после гибели
+# юнита отрисовка прячется и достаётся следующему юниту той же формы.
+# Инструкции меняются только в проходе синхронизации и только если позиция на экране
+# изменилась; выбор юнита лишь помечает отрисовку устаревшей.
+class UnitView:
+    def __init__(self, shape, canvas):
+        self.shape = shape
         self.canvas = canvas
-        self.shape = self.get_shape()
+        self.unit = None
         self.selected = False  # Флаг выбора юнита
-        self.selection_border = None  # Ссылка на обводку выделения
+        self.drawn_x = None  # Последняя записанная позиция; None — отрисовка устарела
+        self.drawn_y = None
         self.draw()
 
-    def get_shape(self):
-        if self.type == UnitType.CAVALRY:
-            return 'square'
-        elif self.type == UnitType.PIKEMAN:
-            return 'triangle'
-        elif self.type == UnitType.SWORDSMAN:
-            return 'circle'
-
     def draw(self):
-        with self.canvas:
-            Color(*self.color)
-            if self.shape == 'square':
-                self.graphic = Rectangle(pos=(self.x - self.size/2, self.y - self.size/2),
-                                         size=(self.size, self.size))
-            elif self.shape == 'triangle':
-                self.graphic = Triangle(points=[
-                    self.x, self.y + self.size/2,
-                    self.x - self.size/2, self.y - self.size/2,
-                    self.x + self.size/2, self.y - self.size/2
-                ])
-            elif self.shape == 'circle':
-                self.graphic = Ellipse(pos=(self.x - self.size/2, self.y - self.size/2),
-                                       size=(self.size, self.size))
-
-    def update_graphic_position(self):
+        self.group = InstructionGroup()
+        self.color = Color(1, 1, 1, 0)
+        self.group.add(self.color)
         if self.shape == 'square':
-            self.graphic.pos = (self.x - self.size/2, self.y - self.size/2)
+            self.graphic = Rectangle(pos=(0, 0), size=(0, 0))
         elif self.shape == 'triangle':
-            self.graphic.points = [
-                self.x, self.y + self.size/2,
-                self.x - self.size/2, self.y - self.size/2,
-                self.x + self.size/2, self.y - self.size/2
-            ]
+            self.graphic = Triangle(points=[0, 0, 0, 0, 0, 0])
         elif self.shape == 'circle':
-            self.graphic.pos = (self.x - self.size/2, self.y - self.size/2)
-        if self.selected and self.selection_border:
-            self.selection_border.circle = (self.x, self.y, self.size)
-
-    def update_position(self, dt, all_units, enemy_units, boundaries):
-        old_x, old_y = self.x, self.y
-        dx = self.target_x - self.x
-        dy = self.target_y - self.y
-        distance_to_target = math.hypot(dx, dy)
-
-        if distance_to_target > 5:
-            # Нормализуем направление
-            dx /= distance_to_target
-            dy /= distance_to_target
-            # Вычисляем потенциальное новое положение
-            new_x = self.x + dx * self.speed * dt
-            new_y = self.y + dy * self.speed * dt
-
-            # Проверяем столкновение с границами экрана
-            min_x, max_x, min_y, max_y = boundaries
-            half_size = self.size / 2
-
-            # Ограничиваем координаты новыми границами
-            new_x = max(min_x + half_size, min(new_x, max_x - half_size))
-            new_y = max(min_y + half_size, min(new_y, max_y - half_size))
-
-            self.x = new_x
-            self.y = new_y
-            self.update_graphic_position()
-
-        # Избежание наложения с союзными юнитами
-        for other in all_units:
-            if other is not self and other.owner == self.owner:
-                dist = math.hypot(self.x - other.x, self.y - other.y)
-                min_dist = (self.size + other.size) / 2
-                if dist < min_dist and dist != 0:
-                    overlap = min_dist - dist
-                    # Вычисление направления от другого юнита
-                    ox = (self.x - other.x) / dist
-                    oy = (self.y - other.y) / dist
-                    # Сдвиг текущего юнита
-                    self.x += ox * overlap / 2
-                    self.y += oy * overlap / 2
-                    self.update_graphic_position()
-
-    def distance_to_base(self, base):
-        return math.hypot(self.x - base.x, self.y - base.y)
+            self.graphic = Ellipse(pos=(0, 0), size=(0, 0))
+        self.group.add(self.graphic)
+        # Обводка выделения создаётся сразу и прячется, а не добавляется на холст при каждом выборе
+        self.selection_color = Color(1, 1, 0, 0)  # Жёлтый цвет для выделения
+        self.selection_border = Line(points=[], width=2)
+        self.group.add(self.selection_color)
+        self.group.add(self.selection_border)
+        self.canvas.add(self.group)
+
+    def bind(self, unit):
+        self.unit = unit
+        archetype = unit.archetype
+        self.color.rgba = (*unit.color, 1)
+        # Размер и способ расстановки берутся из архетипа один раз, а не в каждом кадре
+        self.half_size = archetype.half_size
+        self.ring_radius = archetype.size
+        if self.shape == 'triangle':
+            self.place = self.place_triangle
+        else:
+            self.graphic.size = (archetype.size, archetype.size)
+            self.place = self.place_box
+        self.drawn_x = None
+
+    def release(self):
+        # Юнит погиб: прячем отрисовку до следующего юнита
+        self.deselect()
+        self.unit = None
+        self.color.a = 0
+        if self.shape == 'triangle':
+            self.graphic.points = [0, 0, 0, 0, 0, 0]
+        else:
+            self.graphic.size = (0, 0)
+
+    def place_box(self, x, y):
+        half = self.half_size
+        self.graphic.pos = (x - half, y - half)
+
+    def place_triangle(self, x, y):
+        half = self.half_size
+        self.graphic.points = [
+            x, y + half,
+            x - half, y - half,
+            x + half, y - half
+        ]
+
+    def update_graphic_position(self, alpha=1.0):
+        unit = self.unit
+        # Интерполяция между позицией на начало и на конец шага симуляции
+        prev_x = unit.prev_x
+        prev_y = unit.prev_y
+        x = prev_x + (unit.x - prev_x) * alpha
+        y = prev_y + (unit.y - prev_y) * alpha
+        if x == self.drawn_x and y == self.drawn_y:
+            return
+        self.drawn_x = x
+        self.drawn_y = y
+        self.place(x, y)
+        if self.selected:
+            self.selection_border.circle = (x, y, self.ring_radius)
 
     def select(self):
         if not self.selected:
             self.selected = True
-            with self.canvas:
-                Color(1, 1, 0)  # Жёлтый цвет для выделения
-                self.selection_border = Line(circle=(self.x, self.y, self.size), width=2)
+            self.selection_color.a = 1
+            self.drawn_x = None  # Обводка встанет на место в ближайшем проходе синхронизации
 
     def deselect(self):
         if self.selected:
             self.selected = False
-            if self.selection_border:
-                self.canvas.remove(self.selection_border)
-                self.selection_border = None
-
-# Класс игры
-class RTSGame(FloatLayout):
+            self.selection_color.a = 0
+            self.selection_border.points = []
+
+# Отрисовка юнитов отдельными инструкциями холста (по UnitView на видимый юнит).
+# Отрисовки хранятся в пуле по форме: юнит, ушедший за край экрана или погибший,
+# отдаёт свою следующему, поэтому холст растёт только до числа одновременно видимых юнитов.
+# На дальнем масштабе вместо фигур рисуются точки.
+class ObjectRenderer:
+    def __init__(self, canvas, colors):
+        self.canvas = canvas
+        self.views = {}  # Видимый юнит симуляции -> его отрисовка
+        self.pool = {}  # Форма -> свободные отрисовки
+        self.selected = set()  # Выбор помнится и для юнитов без отрисовки
+        self.points = PointCloud(canvas, colors)
+
+    def add(self, unit):
+        pass  # Отрисовка выдаётся, когда юнит окажется в видимой области
+
+    def show(self, unit):
+        free = self.pool.get(unit.shape)
+        view = free.pop() if free else UnitView(unit.shape, self.canvas)
+        view.bind(unit)
+        if unit in self.selected:
+            view.select()
+        self.views[unit] = view
+        return view
+
+    def hide(self, unit):
+        view = self.views.pop(unit, None)
+        if view is not None:
+            view.release()
+            self.pool.setdefault(view.shape, []).append(view)
+
+    def remove(self, unit):
+        self.hide(unit)
+        self.selected.discard(unit)
+
+    def select(self, unit):
+        self.selected.add(unit)
+        view = self.views.get(unit)
+        if view is not None:
+            view.select()
+
+    def deselect(self, unit):
+        self.selected.discard(unit)
+        view = self.views.get(unit)
+        if view is not None:
+            view.deselect()
+
+    def clear(self):
+        for unit in list(self.views):
+            self.hide(unit)
+        self.selected.clear()
+        self.points.clear()
+
+    def free_count(self):
+        return sum(len(free) for free in self.pool.values())
+
+    def sync(self, alpha=1.0, visible=(), lod=False):
+        if lod:
+            for unit in list(self.views):
+                self.hide(unit)
+            self.points.sync(visible, alpha)
+            return
+        self.points.clear()
+        visible = set(visible)
+        for unit in [unit for unit in self.views if unit not in visible]:
+            self.hide(unit)
+        views = self.views
+        for unit in visible:
+            view = views.get(unit)
+            if view is None:
+                view = self.show(unit)
+            view.update_graphic_position(alpha)
+
+# Холст мира: всё, что на нём, рисуется в мировых координатах, а сдвиг и масштаб
+# камеры применяются одной матрицей на видеокарте
+class WorldView(Widget):
     def __init__(self, **kwargs):
+        super(WorldView, self).__init__(**kwargs)
+        with self.canvas.before:
+            PushMatrix()
+            self.scale = Scale(1)
+            self.translate = Translate(0, 0)
+            Color(0.5, 0.5, 0.5)
+            self.border = Line(points=[], width=1)
+        with self.canvas.after:
+            PopMatrix()
+
+    def apply_camera(self, camera):
+        self.scale.xyz = (camera.zoom, camera.zoom, 1)
+        self.translate.xy = (-camera.x, -camera.y)
+
+    def draw_border(self, width, height):
+        self.border.rectangle = (0, 0, width, height)
+
+# Класс игры: отображает симуляцию и передаёт ей ввод игрока
+class RTSGame(FloatLayout):
+    def __init__(self, render_mode=RENDER_MODE, replay=None, replay_speed=1, **kwargs):
         super(RTSGame, self).__init__(**kwargs)
         self.state = 'menu'
-        self.selected_units = []  # Список выбранных юнитов
-        self.player_base = Base(100, Window.height/2, (1, 0, 0), self.canvas, "player")  # Красный
-        self.computer_base = Base(Window.width - 100, Window.height/2, (0, 0, 1), self.canvas, "computer")  # Синий
-        self.player_units = []
-        self.computer_units = []
-        self.computer_hire_timer = 0
-        self.computer_attack_timer = 0
-        self.hire_cost = 10
+        self.selected_units = set()  # Выбранные юниты
+        self.render_mode = render_mode
+        self.replay = replay
+        self.side = "player"  # За кого играет этот экран; в сетевой игре гость — за компьютер
+        self.net = None  # Подключение к ретранслятору (netplay.NetClient)
+        self.session = None  # Lockstep сетевой игры (netplay.LockstepSession)
+        self.status_label = None
+        self.replay_speed = replay_speed
+        self.tick_rate = None  # Текущая частота update_game
+        self.idle_time = 0  # Сколько секунд поле стоит без движения
+        # Мир матча (симуляция, камера, холст, ИИ, оверлей) создаётся в init_world()
+        self.sim = None
+        self.recorder = None
+        self.ai = None
+        self.camera = None
+        self.camera_version = None
+        self.camera_touches = []  # Касания, двигающие камеру
+        self.hud = None
+        self.profiler_button = None
+        self.hire_panel = None  # Строится один раз и переиспользуется между матчами
+        self.formation = 'box'  # Строй для приказов на перемещение, None — без строя
+        self.density = None
+        self.minimap = None
         self.init_menu()
-        
+
         # Добавление переменных для отслеживания двойного клика
         self.last_touch_time = 0
         self.double_click_time = 0.3  # Максимальное время между кликами для двойного клика
         self.last_touched_unit = None
+        # Протяжка по пустому месту для выделения рамкой или лассо
+        self.drag_points = None
+        self.drag_touch = None
+        self.drag_line = None
+
+    @property
+    def player_base(self):
+        return self.sim.player_base
+
+    @property
+    def computer_base(self):
+        return self.sim.computer_base
+
+    @property
+    def player_units(self):
+        return self.sim.player_units
+
+    @property
+    def computer_units(self):
+        return self.sim.computer_units
+
+    def on_size(self, *args):
+        # Размер окна меняет только видимую часть мира, сам мир остаётся прежним
+        if self.camera is not None:
+            self.camera.resize_view(self.width, self.height)
+            self.update_camera_insets()
+
+    def update_camera_insets(self):
+        # Панель найма внизу и мини-карта справа перехватывают касания: камера даёт вывести
+        # из-под них любой край мира, иначе юнитов там нельзя ни выделить, ни послать
+        from minimap import MINIMAP_WIDTH
+        self.camera.set_insets(bottom=self.height * HIRE_PANEL_HEIGHT, right=MINIMAP_WIDTH)
+
+    def init_world(self):
+        # Всё, что не нужно меню, строится при первом нажатии «Играть» или «Продолжить»
+        if self.sim is not None:
+            return
+        from simulation import Simulation, FixedStepLoop
+        from events import CombatLog, make_sink
+        from replay import ReplayRecorder
+        from density import DensityGrid
+        from minimap import Minimap
+        startup.mark("импорт симуляции")
+        sink = make_sink(COMBAT_LOG, output=lambda text: Logger.info(f"Combat: {text}"))
+        # Панель найма лежит поверх мира, а не отрезает его низ: место под ней даёт камера
+        self.sim = Simulation(WORLD_WIDTH, WORLD_HEIGHT, panel_height=0, events=CombatLog(sink))
+        self.sim.add_listener(self)
+        self.loop = FixedStepLoop(self.sim)
+        # Каждый матч записывается, чтобы его можно было приложить к отчёту об ошибке
+        self.recorder = ReplayRecorder()
+        self.recorder.attach(self.sim)
+        if AI_PLANNER != 'off' and self.replay is None and NET_ADDRESS is None:
+            from ai_planner import AIPlanner, AIController
+            self.ai = AIController(self.sim, AIPlanner(AI_PLANNER))
+        startup.mark("симуляция и ИИ")
+        # Камера и холст мира; кнопки, оверлей и рамка выделения остаются в координатах экрана
+        self.camera = Camera(self.sim.width, self.sim.height, self.width, self.height)
+        self.update_camera_insets()
+        self.world = WorldView()
+        self.add_widget(self.world, index=len(self.children))  # Под кнопками
+        self.world.draw_border(self.sim.width, self.sim.height)
+        self.player_base_view = BaseView(self.sim.player_base, self.world.canvas)  # Красный
+        self.computer_base_view = BaseView(self.sim.computer_base, self.world.canvas)  # Синий
+        colors = {"player": (1, 0, 0), "computer": (0, 0, 1)}
+        if self.render_mode == 'batch':
+            self.renderer = BatchRenderer(self.world.canvas, colors)
+        else:
+            self.renderer = ObjectRenderer(self.world.canvas, colors)
+        # Плотность армий: слой для дальнего масштаба и мини-карта над панелью найма
+        self.density = DensityGrid(self.sim.width, self.sim.height)
+        self.density_texture = DensityTexture(self.density)
+        self.density_layer = DensityLayer(self.world.canvas, self.density_texture)
+        self.density_part = 0  # Какую часть юнитов сетка проверит в следующем кадре
+        self.minimap = Minimap(self, self.density_texture, pos_hint={'right': 1, 'y': HIRE_PANEL_HEIGHT})
+        self.add_widget(self.minimap)
+        startup.mark("холст мира")
+        self.init_profiler()
+        startup.mark("оверлей профилировщика")
+
+    def sync_view(self, alpha):
+        camera = self.camera
+        if (camera.world_width, camera.world_height) != (self.sim.width, self.sim.height):
+            # Повтор мог быть записан на поле другого размера
+            camera.set_world(self.sim.width, self.sim.height)
+            self.world.draw_border(self.sim.width, self.sim.height)
+            self.density.resize(self.sim.width, self.sim.height)
+            for unit in self.player_units + self.computer_units:
+                self.density.add(unit)
+            self.minimap.layout()
+        if camera.version != self.camera_version:
+            self.camera_version = camera.version
+            self.world.apply_camera(camera)
+        # На холст попадают только юниты в видимой части мира (запрос к пространственному индексу)
+        min_x, min_y, max_x, max_y = camera.visible_rect(VIEW_MARGIN)
+        visible = (self.sim.units_in_rect("player", min_x, min_y, max_x, max_y)
+                   + self.sim.units_in_rect("computer", min_x, min_y, max_x, max_y))
+        self.update_density()
+        lod = camera.lod()
+        if len(visible) > (DENSITY_LOD_UNITS if lod else DENSITY_UNITS):
+            # Фигур или точек слишком много: все армии — одна текстура плотности
+            self.renderer.sync(alpha, (), False)
+            self.density_layer.show()
+        else:
+            self.density_layer.hide()
+            self.renderer.sync(alpha, visible, lod)
+        self.minimap.update_view_frame()
+
+    def update_density(self, force=False):
+        units = (self.player_units, self.computer_units)
+        if force:
+            self.density.update(units)
+            self.density_part = 0
+        else:
+            self.density.update(units, self.density_part, DENSITY_PARTS)
+            self.density_part = (self.density_part + 1) % DENSITY_PARTS
+            if self.density_part:
+                return
+        self.density.flush()
+        self.density_texture.upload()
+
+    # События симуляции
+    def on_unit_added(self, unit):
+        self.renderer.add(unit)
+        self.density.add(unit)
+
+    def on_unit_removed(self, unit):
+        self.renderer.remove(unit)
+        self.density.remove(unit)
+        self.selected_units.discard(unit)
 
     def init_menu(self):
         # Создание кнопки "Играть"
@@ -200,23 +470,185 @@ class RTSGame(FloatLayout):
                                   pos_hint={'center_x':0.5, 'center_y':0.5})
         self.play_button.bind(on_release=self.start_game)
         self.add_widget(self.play_button)
+        # Кнопка "Продолжить", если прошлый матч был прерван (приложение свернули и система его закрыла)
+        self.resume_button = None
+        if self.replay is None and os.path.exists(self.snapshot_path()):
+            self.resume_button = Button(text="Продолжить",
+                                        size_hint=(None, None),
+                                        size=(200, 60),
+                                        pos_hint={'center_x':0.5, 'center_y':0.35})
+            self.resume_button.bind(on_release=self.resume_game)
+            self.add_widget(self.resume_button)
+
+    def init_profiler(self):
+        from hud import ProfilerHUD
+        self.hud = ProfilerHUD(self, pos_hint={'x': 0, 'top': 1})
+        self.profiler_button = Button(text="FPS",
+                                      size_hint=(None, None),
+                                      size=(60, 40),
+                                      pos_hint={'right': 1, 'top': 1})
+        self.profiler_button.bind(on_release=lambda x: self.hud.toggle())
+        self.add_widget(self.profiler_button)
+        if PROFILER_VISIBLE:
+            self.hud.show()
 
     def start_game(self, instance):
         print("Кнопка 'Играть' нажата")  # Отладочное сообщение
+        startup.begin()
+        self.init_world()
+        self.state = 'playing'
+        self.remove_widget(self.play_button)
+        if self.resume_button is not None:
+            self.remove_widget(self.resume_button)
+        if self.replay is not None:
+            self.start_replay()
+            startup.report_on_first_frame("от «Играть» до первого кадра повтора")
+            return
+        if NET_ADDRESS:
+            self.start_net_game()
+            return
+        # Новый матч вместо прерванного
+        self.remove_snapshot()
+        # Создание начальных юнитов компьютера и запуск таймеров
+        self.sim.start()
+        self.loop.reset()
+        if self.ai is not None:
+            self.ai.reset()
+        self.camera.center_on(self.player_base.x, self.player_base.y)
+        self.schedule_updates(FULL_FPS)
+        self.show_hire_panel()
+        startup.mark("старт матча")
+        startup.report_on_first_frame("от «Играть» до первого кадра матча")
+
+    def start_net_game(self):
+        from netplay import NetClient
+        # Матч начнётся, когда ретранслятор сведёт нас со вторым игроком
+        self.state = 'connecting'
+        host, _, port = NET_ADDRESS.rpartition(':')
+        self.net = NetClient(host or '127.0.0.1', int(port)).start()
+        self.show_status("Ожидание второго игрока...")
+        Clock.schedule_interval(self.wait_for_peer, 0.1)
+
+    def wait_for_peer(self, dt):
+        from netplay import LockstepSession
+        from simulation import FixedStepLoop
+        for message in self.net.poll():
+            if message[0] == 'closed':
+                # Ретранслятор недоступен: экран итога с кнопкой новой попытки
+                Logger.warning(f"Netplay: нет соединения: {message[1]}")
+                self.hide_status()
+                self.end_game()
+                return False
+            if message[0] != 'start':
+                continue
+            _, side, seed, delay = message
+            self.hide_status()
+            self.side = side
+            self.session = LockstepSession(self.sim, side, self.net.send, delay)
+            self.loop = FixedStepLoop(self.session)
+            self.session.start(seed)
+            self.state = 'playing'
+            own_base = self.sim.base_of(side)
+            self.camera.center_on(own_base.x, own_base.y)
+            self.schedule_updates(FULL_FPS)
+            self.show_hire_panel()
+            return False
+
+    def show_status(self, text):
+        from kivy.uix.label import Label
+        if self.status_label is None:
+            self.status_label = Label(font_size=24,
+                                      color=(1, 1, 1, 1),
+                                      size_hint=(None, None),
+                                      size=(600, 60),
+                                      pos_hint={'center_x': 0.5, 'center_y': 0.5})
+        self.status_label.text = text
+        if self.status_label.parent is None:
+            self.add_widget(self.status_label)
+
+    def hide_status(self):
+        if self.status_label is not None and self.status_label.parent is self:
+            self.remove_widget(self.status_label)
+
+    def close_net(self):
+        if self.net is not None:
+            self.net.close()
+        self.net = None
+        self.session = None
+
+    def issue(self, command):
+        # Команды игрока: в сетевой игре исполняются через delay шагов на обоих узлах сразу
+        if self.session is not None:
+            self.session.queue(command)
+        else:
+            self.sim.execute(command)
+
+    def resume_game(self, instance):
+        import snapshot
+        self.init_world()
+        try:
+            snapshot.load(self.sim, self.snapshot_path())
+        except (OSError, ValueError) as error:
+            print(f"Не удалось восстановить матч: {error}")
+            self.remove_snapshot()
+            self.remove_widget(self.resume_button)
+            self.resume_button = None
+            return
         self.state = 'playing'
         self.remove_widget(self.play_button)
-        # Запуск таймеров
-        Clock.schedule_interval(self.update_game, 1/60.)
-        # Создание начальных юнитов компьютера
-        self.create_computer_initial_units()
-        Clock.schedule_once(self.send_computer_initial_units, 5)
-        # Инициализация кнопок найма
-        self.init_hire_buttons()
+        self.remove_widget(self.resume_button)
+        self.recorder.resume(self.sim)
+        self.loop.reset()
+        self.camera.center_on(self.player_base.x, self.player_base.y)
+        if self.ai is not None:
+            self.ai.reset()
+        self.schedule_updates(FULL_FPS)
+        self.show_hire_panel()
+
+    def snapshot_path(self):
+        return os.path.join(App.get_running_app().user_data_dir, 'suspended.snap')
+
+    def save_snapshot(self):
+        # Только для идущего матча; повторы, сетевые и законченные матчи не сохраняются
+        if self.state == 'playing' and self.sim.state == 'playing' and self.session is None:
+            import snapshot
+            snapshot.save(self.sim, self.snapshot_path())
+
+    def remove_snapshot(self):
+        if os.path.exists(self.snapshot_path()):
+            os.remove(self.snapshot_path())
+
+    def start_replay(self):
+        from replay import ReplayPlayer, make_loop
+        # Повтор исполняет записанные команды; ввод игрока и панель найма отключены
+        self.state = 'replay'
+        self.sim.recorder = None
+        self.replay_player = ReplayPlayer(self.replay, self.sim)
+        self.loop = make_loop(self.replay_player, self.replay_speed)
+        Clock.schedule_interval(self.update_replay, 1/60.)
+
+    def update_replay(self, dt):
+        self.hud.begin_frame()
+        alpha = self.loop.advance(dt * self.replay_speed)
+        self.sync_view(alpha)
+        self.hud.end_frame(dt)
+        if self.replay_player.done():
+            Clock.unschedule(self.update_replay)
+            for tick, message in self.replay_player.desyncs:
+                print(f"Рассинхронизация на шаге {tick}: {message}")
+
+    def save_replay(self):
+        if self.recorder is None or self.recorder.replay is None:
+            return
+        path = os.path.join(App.get_running_app().user_data_dir, 'last_match.rpl')
+        self.recorder.replay.save(path)
 
     def init_hire_buttons(self):
+        from kivy.uix.boxlayout import BoxLayout
+        from simulation import UnitType
         # Создание панели найма юнитов
         hire_panel = BoxLayout(orientation='horizontal',
-                               size_hint=(1, 0.1),
+                               size_hint=(1, HIRE_PANEL_HEIGHT),
                                pos=(0, 0))
         # Коница
         hire_cavalry = Button(text="Коница",
@@ -245,253 +677,105 @@ class RTSGame(FloatLayout):
             self.swordsman_icon = Ellipse(pos=(hire_swordsman.x + 35, hire_swordsman.y + 10),
                                          size=(30, 30))
         hire_swordsman.bind(on_release=lambda x: self.hire_unit(UnitType.SWORDSMAN))
+        # Переключатель строя
+        self.formation_button = Button(text=self.formation_text(), size_hint=(0.2, 1))
+        self.formation_button.bind(on_release=lambda x: self.next_formation())
         # Добавление кнопок в панель
         hire_panel.add_widget(hire_cavalry)
         hire_panel.add_widget(hire_pikeman)
         hire_panel.add_widget(hire_swordsman)
-        self.add_widget(hire_panel)
+        hire_panel.add_widget(self.formation_button)
+        self.hire_panel = hire_panel
+
+    def show_hire_panel(self):
+        # Панель строится при первом матче, дальше тот же виджет снимается и возвращается
+        if self.hire_panel is None:
+            self.init_hire_buttons()
+        if self.hire_panel.parent is None:
+            self.add_widget(self.hire_panel)
+
+    def hide_hire_panel(self):
+        if self.hire_panel is not None and self.hire_panel.parent is self:
+            self.remove_widget(self.hire_panel)
 
     def hire_unit(self, unit_type):
-        if self.player_base.coins >= self.hire_cost:
-            self.player_base.coins -= self.hire_cost
-            # Определение случайного смещения вокруг базы для распределения юнитов
-            spread_radius = 30  # Радиус распределения
-            angle = random.uniform(0, 2 * math.pi)
-            distance = random.uniform(0, spread_radius)
-            offset_x = math.cos(angle) * distance
-            offset_y = math.sin(angle) * distance
-            spawn_x = self.player_base.x + offset_x
-            spawn_y = self.player_base.y + offset_y
-            # Создание юнита на базе игрока с распределённой позицией
-            unit = Unit(unit_type, spawn_x, spawn_y, "player", self.canvas)
-            self.player_units.append(unit)
-            print(f"Нанимается юнит: {unit_type} на позиции ({spawn_x:.2f}, {spawn_y:.2f})")  # Отладочное сообщение
-        else:
-            print("Недостаточно монет для найма юнита.")  # Отладочное сообщение
-
-    def create_computer_initial_units(self):
-        for unit_type in [UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN]:
-            for _ in range(2):
-                if self.computer_base.coins >= self.hire_cost:
-                    self.computer_base.coins -= self.hire_cost
-                    # Определение случайного смещения вокруг базы компьютера
-                    spread_radius = 30
-                    angle = random.uniform(0, 2 * math.pi)
-                    distance = random.uniform(0, spread_radius)
-                    offset_x = math.cos(angle) * distance
-                    offset_y = math.sin(angle) * distance
-                    spawn_x = self.computer_base.x + offset_x
-                    spawn_y = self.computer_base.y + offset_y
-                    unit = Unit(unit_type, spawn_x, spawn_y,
-                                "computer", self.canvas)
-                    self.computer_units.append(unit)
-                    print(f"ИИ нанимает {unit_type} на позиции ({spawn_x:.2f}, {spawn_y:.2f})")  # Отладочное сообщение
-
-    def send_computer_initial_units(self, dt):
-        for unit in self.computer_units:
-            unit.target_x = self.player_base.x
-            unit.target_y = self.player_base.y
+        self.issue(('hire', self.side, unit_type))
+
+    def next_formation(self):
+        names = list(FORMATION_NAMES)
+        self.formation = names[(names.index(self.formation) + 1) % len(names)]
+        self.formation_button.text = self.formation_text()
+
+    def formation_text(self):
+        # Текущий строй виден на самой кнопке переключателя
+        return f"Строй: {FORMATION_NAMES[self.formation]}"
+
+    def schedule_updates(self, fps):
+        from simulation import FixedStepLoop, SIM_STEP
+        Clock.unschedule(self.update_game)
+        Clock.schedule_interval(self.update_game, 1. / fps)
+        self.tick_rate = fps
+        # На редких кадрах шагов за кадр больше; без запаса ограничение цикла замедлило бы игру
+        self.loop.max_steps = max(FixedStepLoop.MAX_STEPS, int(math.ceil(1. / fps / SIM_STEP)) + 1)
+
+    def wake_up(self):
+        self.idle_time = 0
+        if self.state == 'playing' and self.tick_rate != FULL_FPS:
+            self.schedule_updates(FULL_FPS)
+
+    def update_tick_rate(self, dt):
+        # В сетевой игре редкие кадры задержали бы чтение команд второго игрока
+        if self.session is not None or not self.sim.is_quiescent():
+            self.wake_up()
+            return
+        self.idle_time += dt
+        if self.idle_time >= IDLE_DELAY and self.tick_rate != IDLE_FPS:
+            self.schedule_updates(IDLE_FPS)
 
     def update_game(self, dt):
         if self.state != 'playing':
             return
-        # Обновление баз
-        self.player_base.update(dt)
-        self.computer_base.update(dt)
-
-        # Определение границ экрана (без панели найма)
-        button_panel_height = Window.height * 0.1
-        boundaries = (
-            0,  # min_x
-            Window.width,  # max_x
-            button_panel_height,  # min_y
-            Window.height  # max_y
-        )
-
-        # Обновление юнитов
-        all_units = self.player_units + self.computer_units
-        for unit in self.player_units:
-            unit.update_position(dt, all_units, self.computer_units, boundaries)
-        for unit in self.computer_units:
-            unit.update_position(dt, all_units, self.player_units, boundaries)
-
-        # Проверка столкновений и нанесение урона
-        self.handle_collisions(dt)
-
-        # Обновление таймеров компьютера
-        self.computer_hire_timer += dt
-        self.computer_attack_timer += dt
-
-        # Нанимать юниты компьютера каждые 15 секунд
-        if self.computer_hire_timer >= 15:
-            self.computer_hire_timer = 0
-            self.computer_hire_units()
-
-        # Решать нападать каждые 30 секунд
-        if self.computer_attack_timer >= 30:
-            self.computer_attack_timer = 0
-            if random.random() > 0.5:
-                self.computer_send_attack()
-
+        self.hud.begin_frame()
+        # Готовые планы ИИ исполняются командами; ожидания планировщика нет
+        if self.ai is not None:
+            self.ai.update()
+        # Команды и контрольные суммы второго игрока
+        if self.session is not None:
+            for message in self.net.poll():
+                self.session.receive(message)
+            if self.session.closed is not None:
+                Logger.warning(f"Netplay: сетевая игра прервана: {self.session.closed}")
+                self.end_game()
+                return
+        # Симуляция идёт фиксированными шагами независимо от длительности кадра
+        alpha = self.loop.advance(dt)
+        # Перенос позиций видимых юнитов из симуляции на холст
+        self.sync_view(alpha)
+        self.update_tick_rate(dt)
+        self.hud.end_frame(dt)
         # Проверка победы/поражения
-        if self.player_base.hp <= 0 or self.computer_base.hp <= 0:
+        if self.sim.state == 'game_over':
             self.end_game()
 
-    def handle_collisions(self, dt):
-        # Столкновения между вражескими юнитами (игрок vs компьютер)
-        for p_unit in self.player_units.copy():
-            for c_unit in self.computer_units.copy():
-                distance = math.hypot(p_unit.x - c_unit.x, p_unit.y - c_unit.y)
-                min_dist = (p_unit.size + c_unit.size) / 2
-                if distance <= min_dist:
-                    # Наносим урон друг другу (уменьшенный в 10 раз)
-                    damage_to_computer = p_unit.damage
-                    damage_to_player = c_unit.damage
-                    c_unit.hp -= damage_to_computer
-                    p_unit.hp -= damage_to_player
-                    print(f"Урон: {p_unit.type} наносит {damage_to_computer:.2f} урона {c_unit.type}")
-                    print(f"Урон: {c_unit.type} наносит {damage_to_player:.2f} урона {p_unit.type}")
-
-                    # Отталкивание юнитов друг от друга
-                    if distance != 0:
-                        ox = (p_unit.x - c_unit.x) / distance
-                        oy = (p_unit.y - c_unit.y) / distance
-                    else:
-                        ox, oy = 1, 0  # Если совпадают позиции, отталкиваем вправо
-
-                    overlap = min_dist - distance + 1
-                    p_unit.x += ox * (overlap / 2)
-                    p_unit.y += oy * (overlap / 2)
-                    c_unit.x -= ox * (overlap / 2)
-                    c_unit.y -= oy * (overlap / 2)
-                    p_unit.update_graphic_position()
-                    c_unit.update_graphic_position()
-
-                    # Проверка уничтожения
-                    if p_unit.hp <= 0:
-                        if p_unit in self.player_units:
-                            self.player_units.remove(p_unit)
-                            try:
-                                self.canvas.remove(p_unit.graphic)
-                                if p_unit.selected:
-                                    self.selected_units.remove(p_unit)
-                                    p_unit.deselect()
-                                print(f"{p_unit.type} игрока уничтожен.")
-                            except:
-                                pass
-                    if c_unit.hp <= 0:
-                        if c_unit in self.computer_units:
-                            self.computer_units.remove(c_unit)
-                            try:
-                                self.canvas.remove(c_unit.graphic)
-                                print(f"{c_unit.type} компьютера уничтожен.")
-                            except:
-                                pass
-
-        # Столкновения с базами
-        # Юниты игрока атакуют базу компьютера
-        for unit in self.player_units.copy():
-            distance = math.hypot(unit.x - self.computer_base.x, unit.y - self.computer_base.y)
-            min_dist = (unit.size / 2) + self.computer_base.radius
-            if distance <= min_dist:
-                # Нанесение урона базе (уменьшенный в 10 раз)
-                damage = unit.damage
-                self.computer_base.take_damage(damage)
-                print(f"{unit.type} игрока атакует базу компьютера и наносит {damage:.2f} урона.")
-
-                # Отталкивание юнита от базы
-                if distance != 0:
-                    ox = (unit.x - self.computer_base.x) / distance
-                    oy = (unit.y - self.computer_base.y) / distance
-                else:
-                    ox, oy = 1, 0  # Если совпадают позиции, отталкиваем вправо
-
-                overlap = min_dist - distance + 1
-                unit.x += ox * overlap
-                unit.y += oy * overlap
-                unit.update_graphic_position()
-
-        # Юниты компьютера атакуют базу игрока
-        for unit in self.computer_units.copy():
-            distance = math.hypot(unit.x - self.player_base.x, unit.y - self.player_base.y)
-            min_dist = (unit.size / 2) + self.player_base.radius
-            if distance <= min_dist:
-                # Нанесение урона базе (уменьшенный в 10 раз)
-                damage = unit.damage
-                self.player_base.take_damage(damage)
-                print(f"{unit.type} компьютера атакует базу игрока и наносит {damage:.2f} урона.")
-
-                # Отталкивание юнита от базы
-                if distance != 0:
-                    ox = (unit.x - self.player_base.x) / distance
-                    oy = (unit.y - self.player_base.y) / distance
-                else:
-                    ox, oy = 1, 0  # Если совпадают позиции, отталкиваем вправо
-
-                overlap = min_dist - distance + 1
-                unit.x += ox * overlap
-                unit.y += oy * overlap
-                unit.update_graphic_position()
-
-    def computer_hire_units(self):
-        # Подсчёт типов юнитов игрока
-        counts = {UnitType.CAVALRY:0, UnitType.PIKEMAN:0, UnitType.SWORDSMAN:0}
-        for unit in self.player_units:
-            counts[unit.type] +=1
-        # Определяем наиболее многочисленный тип у игрока
-        if counts[UnitType.CAVALRY] >= counts[UnitType.PIKEMAN] and counts[UnitType.CAVALRY] >= counts[UnitType.SWORDSMAN]:
-            counter_type = UnitType.PIKEMAN
-        elif counts[UnitType.PIKEMAN] >= counts[UnitType.CAVALRY] and counts[UnitType.PIKEMAN] >= counts[UnitType.SWORDSMAN]:
-            counter_type = UnitType.SWORDSMAN
-        else:
-            counter_type = UnitType.CAVALRY
-
-        # Нанимать 5 юнитов типа counter_type
-        for _ in range(5):
-            if self.computer_base.coins >= self.hire_cost:
-                self.computer_base.coins -= self.hire_cost
-                spread_radius = 30
-                angle = random.uniform(0, 2 * math.pi)
-                distance = random.uniform(0, spread_radius)
-                offset_x = math.cos(angle) * distance
-                offset_y = math.sin(angle) * distance
-                spawn_x = self.computer_base.x + offset_x
-                spawn_y = self.computer_base.y + offset_y
-                unit = Unit(counter_type, spawn_x, spawn_y, "computer", self.canvas)
-                self.computer_units.append(unit)
-                print(f"ИИ нанимает {counter_type} на позиции ({spawn_x:.2f}, {spawn_y:.2f})")  # Отладочное сообщение
-
-    def computer_send_attack(self):
-        # Приказ всем компьютерам атаковать базу игрока
-        for unit in self.computer_units:
-            unit.target_x = self.player_base.x
-            unit.target_y = self.player_base.y
-        print("ИИ отправляет войска на атаку!")
-
     def end_game(self):
         self.state = 'game_over'
         Clock.unschedule(self.update_game)
+        self.save_replay()
+        self.remove_snapshot()
+        self.hide_hire_panel()
         # Удаление всех юнитов
-        for unit in self.player_units.copy():
-            try:
-                self.canvas.remove(unit.graphic)
-                if unit.selected:
-                    self.selected_units.remove(unit)
-                    unit.deselect()
-                self.player_units.remove(unit)
-            except:
-                pass
-        for unit in self.computer_units.copy():
-            try:
-                self.canvas.remove(unit.graphic)
-                self.computer_units.remove(unit)
-            except:
-                pass
+        self.sim.clear_units()
+        self.selected_units = set()
+        self.update_density(force=True)
         # Показать результат
-        if self.player_base.hp > 0:
+        if self.sim.winner is None:
+            result_text = "Соединение потеряно"
+        elif self.sim.winner == self.side:
             result_text = "Победа!"
         else:
             result_text = "Поражение!"
+        self.close_net()
+        from kivy.uix.label import Label
         self.result_label = Label(text=result_text,
                                   font_size=50,
                                   color=(1,1,1,1),
@@ -514,98 +798,223 @@ class RTSGame(FloatLayout):
         if hasattr(self, 'restart_button') and self.restart_button in self.children:
             self.remove_widget(self.restart_button)
         # Сброс состояния
-        self.player_base.hp = 250
-        self.player_base.coins = 100
-        self.computer_base.hp = 250
-        self.computer_base.coins = 100
-        self.computer_hire_timer = 0
-        self.computer_attack_timer = 0
+        self.sim.reset()
+        if NET_ADDRESS:
+            # Новый сетевой матч — новая пара через ретранслятор
+            self.selected_units = set()
+            self.start_net_game()
+            return
         self.state = 'playing'
-        self.selected_units = []
-        # Создание начальных юнитов компьютера
-        self.create_computer_initial_units()
-        Clock.schedule_once(self.send_computer_initial_units, 5)
-        # Запуск таймеров
-        Clock.schedule_interval(self.update_game, 1/60.)
-        # Инициализация кнопок найма
-        self.init_hire_buttons()
+        self.selected_units = set()
+        # Создание начальных юнитов компьютера и запуск таймеров
+        self.sim.start()
+        self.loop.reset()
+        if self.ai is not None:
+            self.ai.reset()
+        self.camera.center_on(self.player_base.x, self.player_base.y)
+        self.schedule_updates(FULL_FPS)
+        self.show_hire_panel()
 
     def on_touch_down(self, touch):
+        # Любое касание возвращает полную частоту кадров
+        self.wake_up()
+        if self.profiler_button is not None and self.profiler_button.collide_point(*touch.pos):
+            return super(RTSGame, self).on_touch_down(touch)
+        if self.minimap is not None and self.minimap.collide_point(*touch.pos):
+            return super(RTSGame, self).on_touch_down(touch)
+        if self.state in ('playing', 'replay') and self.camera_touch_down(touch):
+            return True
         if self.state == 'playing':
             # Проверяем, нажата ли кнопка найма
-            for child in self.children:
-                if isinstance(child, BoxLayout):
-                    for button in child.children:
-                        if button.collide_point(*touch.pos):
-                            return super(RTSGame, self).on_touch_down(touch)
-
-            # Проверяем, нажата ли свой юнит
-            for unit in self.player_units:
-                if (unit.x - unit.size/2 <= touch.x <= unit.x + unit.size/2 and
-                        unit.y - unit.size/2 <= touch.y <= unit.y + unit.size/2):
-                    current_time = time.time()
-                    # Проверяем, был ли предыдущий клик на том же юните и в пределах двойного клика
-                    if (self.last_touched_unit == unit and
-                        (current_time - self.last_touch_time) <= self.double_click_time):
-                        # Это двойной клик - выбираем все юниты того же типа
-                        self.select_all_units_of_type(unit.type)
-                        self.last_touched_unit = None
-                        self.last_touch_time = 0
+            for button in self.hire_panel.children:
+                if button.collide_point(*touch.pos):
+                    return super(RTSGame, self).on_touch_down(touch)
+
+            # Проверяем, нажата ли свой юнит (поиск через пространственный индекс симуляции)
+            world_x, world_y = self.camera.screen_to_world(touch.x, touch.y)
+            unit = self.sim.unit_at(self.side, world_x, world_y)
+            if unit is not None:
+                current_time = time.time()
+                # Проверяем, был ли предыдущий клик на том же юните и в пределах двойного клика
+                if (self.last_touched_unit == unit and
+                    (current_time - self.last_touch_time) <= self.double_click_time):
+                    # Это двойной клик - выбираем все юниты того же типа
+                    self.select_all_units_of_type(unit.type)
+                    self.last_touched_unit = None
+                    self.last_touch_time = 0
+                else:
+                    # Это первый клик - сохраняем информацию для возможного двойного клика
+                    self.last_touched_unit = unit
+                    self.last_touch_time = current_time
+                    # Запускаем таймер для сброса двойного клика
+                    Clock.schedule_once(lambda dt: self.reset_last_touch(), self.double_click_time)
+                    # Обрабатываем одиночный клик как обычно
+                    if unit in self.selected_units:
+                        self.renderer.deselect(unit)
+                        self.selected_units.discard(unit)
                     else:
-                        # Это первый клик - сохраняем информацию для возможного двойного клика
-                        self.last_touched_unit = unit
-                        self.last_touch_time = current_time
-                        # Запускаем таймер для сброса двойного клика
-                        Clock.schedule_once(lambda dt: self.reset_last_touch(), self.double_click_time)
-                        # Обрабатываем одиночный клик как обычно
-                        if unit in self.selected_units:
-                            unit.deselect()
-                            self.selected_units.remove(unit)
-                        else:
-                            unit.select()
-                            self.selected_units.append(unit)
-                    return True
+                        self.renderer.select(unit)
+                        self.selected_units.add(unit)
+                return True
             # Проверяем, нажата ли вражеская юнита (можно добавить аналогичную логику для вражеских юнитов, если необходимо)
-            for unit in self.computer_units:
-                if (unit.x - unit.size/2 <= touch.x <= unit.x + unit.size/2 and
-                        unit.y - unit.size/2 <= touch.y <= unit.y + unit.size/2):
-                    # Можно добавить действия при клике на вражеский юнит, если требуется
-                    return super(RTSGame, self).on_touch_down(touch)
+            if self.sim.unit_at(self.session.other if self.session is not None else "computer", world_x, world_y) is not None:
+                # Можно добавить действия при клике на вражеский юнит, если требуется
+                return super(RTSGame, self).on_touch_down(touch)
+
+            # Касание пустого места: короткое — приказ на перемещение, протяжка — выделение рамкой или лассо
+            touch.grab(self)
+            self.drag_touch = touch
+            self.drag_points = [touch.x, touch.y]
+            return True
+        return super(RTSGame, self).on_touch_down(touch)
 
+    def camera_touch_down(self, touch):
+        # Колесо мыши — масштаб относительно курсора
+        if touch.is_mouse_scrolling:
+            factor = ZOOM_STEP if touch.button == 'scrolldown' else 1 / ZOOM_STEP
+            self.camera.zoom_at(factor, touch.x, touch.y)
+            return True
+        # Правая кнопка мыши — сдвиг камеры
+        if getattr(touch, 'button', None) == 'right' and not self.camera_touches:
+            touch.grab(self)
+            self.camera_touches = [touch]
+            return True
+        # В повторе выделять нечего: протяжка одним пальцем двигает камеру, двумя — ещё и масштабирует
+        if self.state == 'replay' and len(self.camera_touches) < 2:
+            touch.grab(self)
+            self.camera_touches.append(touch)
+            return True
+        # Второй палец во время протяжки — жест камеры вместо выделения
+        if self.drag_points is not None and len(self.camera_touches) == 0:
+            self.drag_points = None
+            self.clear_drag()
+            touch.grab(self)
+            self.camera_touches = [self.drag_touch, touch]
+            return True
+        return False
+
+    def camera_touch_move(self, touch):
+        camera = self.camera
+        if len(self.camera_touches) == 1:
+            camera.pan(touch.dx, touch.dy)
+            return
+        # Два пальца: сдвиг по середине между ними и масштаб по изменению расстояния
+        other = self.camera_touches[0] if self.camera_touches[1] is touch else self.camera_touches[1]
+        old_x, old_y = (touch.px + other.x) / 2, (touch.py + other.y) / 2
+        new_x, new_y = (touch.x + other.x) / 2, (touch.y + other.y) / 2
+        old_distance = math.hypot(touch.px - other.x, touch.py - other.y)
+        new_distance = math.hypot(touch.x - other.x, touch.y - other.y)
+        camera.pan(new_x - old_x, new_y - old_y)
+        if old_distance > 0 and new_distance > 0:
+            camera.zoom_at(new_distance / old_distance, new_x, new_y)
+
+    def on_touch_move(self, touch):
+        self.wake_up()
+        if touch.grab_current is self and touch in self.camera_touches:
+            self.camera_touch_move(touch)
+            return True
+        if touch.grab_current is not self or self.drag_points is None:
+            return super(RTSGame, self).on_touch_move(touch)
+        points = self.drag_points
+        # Точки пути реже DRAG_STEP пикселей не нужны ни для лассо, ни для рамки
+        if math.hypot(touch.x - points[-2], touch.y - points[-1]) >= DRAG_STEP:
+            points += [touch.x, touch.y]
+        self.draw_drag(points + [touch.x, touch.y])
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is self and touch in self.camera_touches:
+            # Жест камеры заканчивается с первым поднятым пальцем; оставшийся палец ничего не делает
+            for other in self.camera_touches:
+                other.ungrab(self)
+            self.camera_touches = []
+            return True
+        if touch.grab_current is not self or self.drag_points is None:
+            return super(RTSGame, self).on_touch_up(touch)
+        touch.ungrab(self)
+        points = self.drag_points + [touch.x, touch.y]
+        self.drag_points = None
+        self.clear_drag()
+        start_x, start_y = points[0], points[1]
+        # Путь протяжки рисуется в координатах экрана, запросы к симуляции — в мировых
+        to_world = self.camera.screen_to_world
+        world_points = []
+        for k in range(0, len(points), 2):
+            world_points += to_world(points[k], points[k + 1])
+        if math.hypot(touch.x - start_x, touch.y - start_y) < DRAG_THRESHOLD and not is_lasso(points):
             # Если клик вне юнитов и кнопок, приказать переместиться выбранным юнитам
-            if self.selected_units:
-                target_x, target_y = touch.x, touch.y
-                # Ограничиваем целевые позиции границами экрана
-                button_panel_height = Window.height * 0.1
-                target_x = max(unit.size/2, min(target_x, Window.width - unit.size/2))
-                target_y = max(button_panel_height + unit.size/2, min(target_y, Window.height - unit.size/2))
-                for unit in self.selected_units:
-                    unit.target_x = target_x
-                    unit.target_y = target_y
+            if self.selected_units and self.state == 'playing':
+                uids = sorted(unit.uid for unit in self.selected_units)
+                command = ('move', self.side, uids, world_points[0], world_points[1])
+                if self.formation is not None:
+                    command += (self.formation,)
+                self.issue(command)
             return True
-        return super(RTSGame, self).on_touch_down(touch)
+        if is_lasso(points):
+            units = self.sim.units_in_polygon(self.side, world_points)
+        else:
+            units = self.sim.units_in_rect(self.side, *world_points[:2], *world_points[-2:])
+        self.set_selection(units)
+        return True
+
+    def draw_drag(self, points):
+        if self.drag_line is None:
+            with self.canvas.after:
+                self.drag_color = Color(1, 1, 0, 0.8)
+                self.drag_line = Line(points=[], width=1)
+        if is_lasso(points):
+            self.drag_line.points = points + points[:2]
+        else:
+            x1, y1, x2, y2 = points[0], points[1], points[-2], points[-1]
+            self.drag_line.points = [x1, y1, x2, y1, x2, y2, x1, y2, x1, y1]
+
+    def clear_drag(self):
+        if self.drag_line is not None:
+            self.drag_line.points = []
+
+    def set_selection(self, units):
+        units = set(units)
+        for unit in self.selected_units - units:
+            self.renderer.deselect(unit)
+        for unit in units - self.selected_units:
+            self.renderer.select(unit)
+        self.selected_units = units
 
     def reset_last_touch(self):
         self.last_touched_unit = None
         self.last_touch_time = 0
 
     def select_all_units_of_type(self, unit_type):
-        # Сначала снимаем выделение со всех юнитов
-        for unit in self.selected_units.copy():
-            unit.deselect()
-            self.selected_units.remove(unit)
-        # Затем выделяем все юниты определённого типа
-        for unit in self.player_units:
-            if unit.type == unit_type:
-                unit.select()
-                self.selected_units.append(unit)
+        # Выделение меняет только интерфейс: в повтор и другому узлу сетевой игры оно не уходит
+        self.set_selection(unit for unit in self.sim.units_of(self.side) if unit.type == unit_type)
         print(f"Выбраны все союзные юниты типа: {unit_type}")  # Отладочное сообщение
 
 # Основной класс приложения
 class RTSApp(App):
     def build(self):
-        game = RTSGame()
-        return game
+        replay = None
+        if REPLAY_PATH:
+            from replay import Replay
+            replay = Replay.load(REPLAY_PATH)
+        self.game = RTSGame(replay=replay, replay_speed=REPLAY_SPEED)
+        startup.mark("RTSGame и меню")
+        startup.report_on_first_frame("до первого кадра меню")
+        return self.game
+
+    def on_pause(self):
+        # Android может убить приложение в фоне — сохраняем запись и снимок матча
+        self.game.save_replay()
+        self.game.save_snapshot()
+        return True
+
+    def on_stop(self):
+        self.game.save_replay()
+        self.game.save_snapshot()
+        if self.game.sim is not None:
+            self.game.sim.events.close()
+        if self.game.ai is not None:
+            self.game.ai.close()
+        self.game.close_net()
 
 # Запуск приложения
 if __name__ == '__main__':
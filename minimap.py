@@ -0,0 +1,93 @@
+from kivy.uix.widget import Widget
+from kivy.graphics import Color, Rectangle, Line
+
+# Мини-карта всего мира в правом нижнем углу, над панелью найма: плотность армий
+# из той же текстуры, что и слой плотности на дальнем масштабе, рамка видимой части
+# экрана и базы. Касание или протяжка по карте переносят туда камеру.
+
+MINIMAP_WIDTH = 200
+MINIMAP_HEIGHT = 120
+
+
+class Minimap(Widget):
+    def __init__(self, game, density_texture, **kwargs):
+        super(Minimap, self).__init__(size_hint=(None, None), size=(MINIMAP_WIDTH, MINIMAP_HEIGHT), **kwargs)
+        self.game = game
+        self.camera_version = None
+        self.map_pos = (0, 0)
+        self.map_scale = 1
+        with self.canvas:
+            Color(0, 0, 0, 0.6)
+            self.background = Rectangle()
+            Color(1, 1, 1, 1)
+            self.map = Rectangle()
+            density_texture.attach(self.map)
+            Color(1, 0.3, 0.3)
+            self.player_base = Rectangle(size=(6, 6))
+            Color(0.3, 0.3, 1)
+            self.computer_base = Rectangle(size=(6, 6))
+            Color(1, 1, 0)
+            self.view_frame = Line(width=1)
+            Color(0.5, 0.5, 0.5)
+            self.border = Line(width=1)
+        self.bind(pos=self.layout, size=self.layout)
+        self.layout()
+
+    def layout(self, *args):
+        sim = self.game.sim
+        x, y = self.pos
+        self.background.pos = self.pos
+        self.background.size = self.size
+        # Мир вписывается в карту с сохранением пропорций
+        scale = min(self.width / sim.width, self.height / sim.height)
+        width = sim.width * scale
+        height = sim.height * scale
+        self.map_pos = (x + (self.width - width) / 2, y + (self.height - height) / 2)
+        self.map_scale = scale
+        self.map.pos = self.map_pos
+        self.map.size = (width, height)
+        self.border.rectangle = (self.map_pos[0], self.map_pos[1], width, height)
+        for mark, base in ((self.player_base, sim.player_base), (self.computer_base, sim.computer_base)):
+            mx, my = self.world_to_map(base.x, base.y)
+            mark.pos = (mx - 3, my - 3)
+        self.camera_version = None
+
+    def world_to_map(self, wx, wy):
+        return self.map_pos[0] + wx * self.map_scale, self.map_pos[1] + wy * self.map_scale
+
+    def map_to_world(self, mx, my):
+        return (mx - self.map_pos[0]) / self.map_scale, (my - self.map_pos[1]) / self.map_scale
+
+    def update_view_frame(self):
+        camera = self.game.camera
+        if camera.version == self.camera_version:
+            return
+        self.camera_version = camera.version
+        min_x, min_y, max_x, max_y = camera.visible_rect()
+        sim = self.game.sim
+        left, bottom = self.world_to_map(max(0, min_x), max(0, min_y))
+        right, top = self.world_to_map(min(sim.width, max_x), min(sim.height, max_y))
+        self.view_frame.rectangle = (left, bottom, right - left, top - bottom)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return False
+        touch.grab(self)
+        self.move_camera(touch)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return False
+        self.move_camera(touch)
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return False
+        touch.ungrab(self)
+        return True
+
+    def move_camera(self, touch):
+        self.game.wake_up()
+        self.game.camera.center_on(*self.map_to_world(*touch.pos))
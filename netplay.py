@@ -0,0 +1,477 @@
+import sys
+import json
+import time
+import zlib
+import queue
+import base64
+import random
+import struct
+import asyncio
+import argparse
+import threading
+import snapshot
+from simulation import Simulation, SIM_STEP, UnitType
+from formations import FORMATIONS
+
+# Сетевая игра двух человек в детерминированном lockstep: по сети идут только команды
+# (найм, приказы), а симуляцию оба узла считают сами. Своя команда исполняется не сразу,
+# а через delay шагов — за это время она доходит до другого узла, и оба исполняют её
+# на одном и том же шаге. Без команд другого узла на очередной шаг узел ждёт.
+# Каждый шаг узлы обмениваются контрольными суммами; при расхождении хост (сторона
+# игрока) присылает своё состояние разницей с последним состоянием, совпавшим у обоих.
+# Трафик — команды и суммы, от числа юнитов он не зависит.
+# Узлы соединяются через ретранслятор (RelayServer): он сводит подключившихся попарно
+# и пересылает кадры без разбора. python netplay.py serve — ретранслятор,
+# python netplay.py loopback — ретранслятор и два узла без окна на одной машине.
+
+INPUT_DELAY = 6  # Шагов между командой и её исполнением (100 мс при 60 шагах в секунду)
+BASELINE_INTERVAL = 60  # Каждые столько шагов состояние запоминается как база для разницы
+BASELINES_KEPT = 3  # Сколько подтверждённых баз хранить
+HISTORY_TICKS = 600  # Сколько шагов помнить команды и суммы (пересчёт после восстановления)
+RESYNC_COOLDOWN = 30  # Не чаще одного восстановления за столько шагов
+DEFAULT_PORT = 7777
+SIDES = ("player", "computer")  # Порядок исполнения команд одного шага на обоих узлах
+
+# Кадр: длина и флаги, затем JSON-список [вид, ...]; большие кадры сжимаются
+FRAME = struct.Struct('<IB')
+FRAME_COMPRESSED = 1
+COMPRESS_FROM = 256  # Байт JSON, начиная с которых кадр сжимается
+
+
+def encode_frame(message):
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    flags = 0
+    if len(payload) >= COMPRESS_FROM:
+        payload = zlib.compress(payload)
+        flags |= FRAME_COMPRESSED
+    return FRAME.pack(len(payload), flags) + payload
+
+
+def decode_frame(flags, payload):
+    if flags & FRAME_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return json.loads(payload.decode('utf-8'))
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(FRAME.size)
+    length, flags = FRAME.unpack(header)
+    payload = await reader.readexactly(length)
+    return header, flags, payload
+
+
+# Разница состояний (оба — Simulation.get_state()): заголовок и генератор целиком,
+# из юнитов — только изменившиеся и uid исчезнувших; без базы — полное состояние.
+# Упаковывается двоичным снимком (snapshot.encode_state) и сжимается.
+def encode_delta(base, state):
+    base_units = {unit[0]: unit for unit in base['units']} if base is not None else {}
+    changed = [unit for unit in state['units'] if base_units.get(unit[0]) != tuple(unit)]
+    alive = {unit[0] for unit in state['units']}
+    removed = [uid for uid in base_units if uid not in alive]
+    body = struct.pack(f'<I{len(removed)}I', len(removed), *removed)
+    return zlib.compress(body + snapshot.encode_state(dict(state, units=changed)))
+
+
+def decode_delta(base, payload):
+    raw = zlib.decompress(payload)
+    (count,) = struct.unpack_from('<I', raw)
+    removed = struct.unpack_from(f'<{count}I', raw, 4)
+    state = snapshot.decode_state(raw, 4 + 4 * count)
+    units = {unit[0]: unit for unit in base['units']} if base is not None else {}
+    for uid in removed:
+        units.pop(uid, None)
+    for unit in state['units']:
+        units[unit[0]] = unit
+    # Порядок как в списках симуляции: сначала юниты игрока, внутри стороны — по uid (порядку найма)
+    state['units'] = sorted(units.values(), key=lambda unit: (unit[2] != "player", unit[0]))
+    return state
+
+
+# Ретранслятор: первый подключившийся играет за игрока (хост), второй — за компьютер.
+# Обоим отправляется ['start', сторона, зерно, задержка], дальше кадры пересылаются как есть.
+# latency — искусственная задержка пересылки, секунд, чтобы подбирать delay на одной машине
+class RelayServer:
+    def __init__(self, delay=INPUT_DELAY, latency=0):
+        self.delay = delay
+        self.latency = latency
+        self.waiting = None  # (writer, future) первого из пары
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        if self.waiting is None or self.waiting[0].is_closing():
+            paired = loop.create_future()
+            self.waiting = (writer, paired)
+            other = await paired
+        else:
+            other, paired = self.waiting
+            self.waiting = None
+            seed = random.randrange(1 << 32)
+            other.write(encode_frame(['start', "player", seed, self.delay]))
+            writer.write(encode_frame(['start', "computer", seed, self.delay]))
+            paired.set_result(writer)
+            print(f"Ретранслятор: пара сведена, зерно {seed}")
+        await self.pump(reader, other)
+
+    async def pump(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                header, _, payload = await read_frame(reader)
+                if self.latency:
+                    # Одинаковая задержка для всех кадров сохраняет их порядок
+                    loop.call_later(self.latency, writer.write, header + payload)
+                else:
+                    writer.write(header + payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Один узел отключился — матч окончен и для другого
+            if self.latency:
+                loop.call_later(self.latency, writer.close)
+            else:
+                writer.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+
+# Подключение к ретранслятору: asyncio крутится в своём потоке, пришедшие сообщения
+# складываются в очередь inbox, игровой цикл забирает их без ожидания
+class NetClient:
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.inbox = queue.Queue()
+        self.loop = asyncio.new_event_loop()
+        self.writer = None
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.thread = threading.Thread(target=self.run, name="netplay", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.receive())
+
+    async def receive(self):
+        try:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            while True:
+                header, flags, payload = await read_frame(reader)
+                self.received_bytes += len(header) + len(payload)
+                self.inbox.put(decode_frame(flags, payload))
+        except (OSError, asyncio.IncompleteReadError) as error:
+            self.inbox.put(['closed', str(error) or "соединение закрыто"])
+
+    def send(self, message):
+        frame = encode_frame(message)
+        self.sent_bytes += len(frame)
+        self.loop.call_soon_threadsafe(self.write, frame)
+
+    def write(self, frame):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(frame)
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        if self.writer is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+
+# Lockstep поверх симуляции. Для FixedStepLoop выглядит как симуляция: step() делает
+# шаг, только если команды другого узла на этот шаг уже пришли.
+# Состояние «на шаге t» — после t шагов и до команд шага t; к нему относятся
+# контрольная сумма и база для разницы.
+class LockstepSession:
+    def __init__(self, sim, side, send, delay=INPUT_DELAY):
+        self.sim = sim
+        self.side = side
+        self.other = SIDES[1 - SIDES.index(side)]
+        self.host = side == "player"  # При расхождении верным считается состояние хоста
+        self.send = send
+        self.delay = delay
+        self.pending = []  # Свои команды, ещё не назначенные на шаг
+        self.inputs = {owner: {} for owner in SIDES}  # Сторона -> {шаг: команды}
+        self.local_checksums = {}
+        self.remote_checksums = {}
+        self.baselines = {}  # Шаг -> состояние на этом шаге
+        self.confirmed = []  # Шаги баз, суммы которых совпали у обоих узлов
+        self.epoch = 0  # Номер восстановления: суммы, посчитанные до него, не сравниваются
+        self.requested_epoch = None
+        self.last_resync = None
+        self.desyncs = []  # (шаг, описание)
+        self.resyncs = 0
+        self.rejected = 0  # Отброшенные команды другого узла от имени не его стороны
+        self.stalls = 0  # Вызовы step(), ждавшие команд другого узла
+        self.closed = None  # Причина разрыва соединения
+
+    def start(self, seed):
+        sim = self.sim
+        # Обе стороны — люди: ни эвристики, ни планировщика, ни стартовой атаки компьютера
+        sim.ai_mode = 'remote'
+        sim.start(seed)
+        for tick in range(self.delay):
+            for owner in SIDES:
+                self.inputs[owner][tick] = []
+        self.local_checksums[sim.tick] = sim.checksum()
+
+    def queue(self, command):
+        self.pending.append(command)
+
+    def waiting(self):
+        return self.sim.tick not in self.inputs[self.other]
+
+    def step(self, dt=None):
+        sim = self.sim
+        if sim.state != 'playing' or self.closed is not None:
+            return
+        tick = sim.tick
+        if tick not in self.inputs[self.other]:
+            self.stalls += 1
+            return
+        # Свои команды уходят на шаг tick + delay вместе с суммой текущего состояния
+        target = tick + self.delay
+        commands, self.pending = self.pending, []
+        self.inputs[self.side][target] = commands
+        self.send(['input', self.epoch, target, commands, tick, self.local_checksums.get(tick)])
+        self.advance()
+
+    def advance(self):
+        sim = self.sim
+        tick = sim.tick
+        if tick % BASELINE_INTERVAL == 0:
+            self.baselines[tick] = sim.get_state()
+        for owner in SIDES:
+            for command in self.inputs[owner].get(tick, ()):
+                sim.execute(command)
+        sim.step(SIM_STEP)
+        self.local_checksums[sim.tick] = sim.checksum()
+        self.compare(sim.tick)
+        old = sim.tick - HISTORY_TICKS
+        for history in (self.inputs[self.side], self.inputs[self.other], self.local_checksums, self.remote_checksums):
+            history.pop(old, None)
+
+    def compare(self, tick):
+        local = self.local_checksums.get(tick)
+        remote = self.remote_checksums.get(tick)
+        if local is None or remote is None:
+            return
+        del self.remote_checksums[tick]
+        if local != remote:
+            self.desyncs.append((tick, f"контрольная сумма {local} против {remote}"))
+            if self.host:
+                self.send_resync()
+            elif self.requested_epoch != self.epoch:
+                self.requested_epoch = self.epoch
+                self.send(['resync_request', self.epoch, tick, False])
+        elif tick in self.baselines:
+            self.confirmed.append(tick)
+            # Старые базы не нужны: разница считается от новейшей подтверждённой
+            keep = set(self.confirmed[-BASELINES_KEPT:])
+            self.confirmed = self.confirmed[-BASELINES_KEPT:]
+            for old in [t for t in self.baselines if t < tick and t not in keep]:
+                del self.baselines[old]
+
+    def receive(self, message):
+        kind = message[0]
+        if kind == 'input':
+            _, epoch, target, commands, checksum_tick, checksum = message
+            # Другой узел распоряжается только своей стороной: чужие команды отбрасываются
+            accepted = [tuple(command) for command in commands if len(command) > 1 and command[1] == self.other]
+            self.rejected += len(commands) - len(accepted)
+            self.inputs[self.other][target] = accepted
+            # Хост не сравнивает суммы, которые гость посчитал до последнего восстановления
+            if checksum is not None and epoch >= self.epoch:
+                self.remote_checksums[checksum_tick] = checksum
+                self.compare(checksum_tick)
+        elif kind == 'resync_request':
+            _, epoch, tick, full = message
+            if self.host and (epoch == self.epoch or full):
+                self.send_resync(full=full)
+        elif kind == 'resync':
+            _, epoch, tick, base_tick, payload = message
+            if not self.host:
+                self.apply_resync(epoch, tick, base_tick, base64.b64decode(payload))
+        elif kind == 'closed':
+            self.closed = message[1]
+
+    def send_resync(self, full=False):
+        sim = self.sim
+        if not full and self.last_resync is not None and sim.tick - self.last_resync < RESYNC_COOLDOWN:
+            return
+        self.last_resync = sim.tick
+        self.epoch += 1
+        base_tick = None if full or not self.confirmed else self.confirmed[-1]
+        base = self.baselines.get(base_tick)
+        payload = encode_delta(base, sim.get_state())
+        self.send(['resync', self.epoch, sim.tick, base_tick, base64.b64encode(payload).decode('ascii')])
+        self.resyncs += 1
+
+    def apply_resync(self, epoch, tick, base_tick, payload):
+        sim = self.sim
+        base = None
+        if base_tick is not None:
+            base = self.baselines.get(base_tick)
+            if base is None:
+                # Такой базы у гостя уже нет: просим полное состояние
+                self.send(['resync_request', self.epoch, tick, True])
+                return
+        state = decode_delta(base, payload)
+        self.epoch = epoch
+        current = sim.tick
+        # Гость отстал и перепрыгивает шаги: свои команды на них уже не придут, хосту нужны пустые
+        for skipped in range(current, tick):
+            self.inputs[self.side][skipped + self.delay] = []
+            self.send(['input', self.epoch, skipped + self.delay, [], skipped, None])
+        # Команды после tick уже записаны в повтор при первом проходе
+        recorder = sim.recorder
+        sim.recorder = None
+        sim.set_state(state)
+        for history in (self.local_checksums, self.remote_checksums):
+            for old in [t for t in history if t <= tick]:
+                del history[old]
+        self.local_checksums[tick] = sim.checksum()
+        self.baselines = {t: s for t, s in self.baselines.items() if t in self.confirmed and t <= tick}
+        # Гость мог уйти вперёд хоста: те же шаги пересчитываются от верного состояния
+        while sim.tick < current and sim.state == 'playing' and not self.waiting():
+            self.advance()
+        sim.recorder = recorder
+        self.resyncs += 1
+
+
+# Узел без окна для проверки на одной машине: подключение, lockstep и случайные команды
+class HeadlessPeer:
+    def __init__(self, port, seed, command_rate, coins=0):
+        self.client = NetClient(port=port).start()
+        self.session = None
+        self.rng = random.Random(seed)
+        self.command_rate = command_rate
+        self.coins = coins
+
+    def update(self):
+        for message in self.client.poll():
+            if message[0] == 'start':
+                _, side, seed, delay = message
+                self.session = LockstepSession(Simulation(), side, self.client.send, delay)
+                self.session.start(seed)
+                if self.coins:
+                    # Одинаково на обоих узлах до первого шага — на детерминизм не влияет
+                    for base in (self.session.sim.player_base, self.session.sim.computer_base):
+                        base.coins = self.coins
+            elif self.session is not None:
+                self.session.receive(message)
+        if self.session is None:
+            return False
+        session = self.session
+        sim = session.sim
+        if not session.waiting() and self.rng.random() < self.command_rate:
+            side = session.side
+            if self.rng.random() < 0.6:
+                session.queue(('hire', side, self.rng.choice([UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN])))
+            elif sim.units_of(side):
+                uids = sorted(unit.uid for unit in sim.units_of(side) if self.rng.random() < 0.7)
+                session.queue(('move', side, uids, self.rng.uniform(0, sim.width), self.rng.uniform(0, sim.height),
+                               self.rng.choice(FORMATIONS)))
+        stalls = session.stalls
+        session.step()
+        return session.stalls == stalls
+
+
+def run_loopback(ticks, delay, latency, desync_at, coins, rate):
+    # Ретранслятор в своём потоке, два узла в этом; узлы шагают так быстро, как позволяет lockstep
+    loop = asyncio.new_event_loop()
+    relay = RelayServer(delay, latency)
+    port = loop.run_until_complete(relay.start('127.0.0.1', 0))
+    threading.Thread(target=loop.run_forever, name="relay", daemon=True).start()
+    peers = [HeadlessPeer(port, 1, rate, coins), HeadlessPeer(port, 2, rate, coins)]
+    start = time.perf_counter()
+    perturbed = False
+    while True:
+        progressed = False
+        for peer in peers:
+            progressed = peer.update() or progressed
+        sessions = [peer.session for peer in peers]
+        if None in sessions:
+            time.sleep(0.001)
+            continue
+        if desync_at is not None and not perturbed and sessions[1].sim.tick >= desync_at:
+            # Искусственное расхождение у гостя: хост должен заметить его и прислать состояние
+            perturbed = True
+            units = sessions[1].sim.computer_units or sessions[1].sim.player_units
+            if units:
+                units[0].x += 1.0
+            else:
+                sessions[1].sim.computer_base.coins += 1
+        if all(session.sim.tick >= ticks or session.sim.state != 'playing' for session in sessions):
+            break
+        if not progressed:
+            time.sleep(0.0005)
+    elapsed = time.perf_counter() - start
+    host, guest = sessions
+    # Догоняем отставший узел до одного шага и сверяем
+    checksums = [session.local_checksums.get(min(host.sim.tick, guest.sim.tick)) for session in sessions]
+    for peer in peers:
+        session = peer.session
+        sim = session.sim
+        seconds = max(sim.time, 1e-9)
+        print(f"{session.side:>8}: шаг {sim.tick}, юнитов {len(sim.player_units)}/{len(sim.computer_units)}, "
+              f"отправлено {peer.client.sent_bytes / seconds:.0f} Б/с, получено {peer.client.received_bytes / seconds:.0f} Б/с, "
+              f"расхождений {len(session.desyncs)}, восстановлений {session.resyncs}")
+    # Узлы шагают без ограничения скорости: меньше 60 шагов/с — задержки delay мало для такой сети
+    print(f"{elapsed:.1f} с, {min(host.sim.tick, guest.sim.tick) / elapsed:.0f} шагов/с (в игре 60); "
+          f"суммы на общем шаге {'совпали' if checksums[0] == checksums[1] else 'НЕ совпали'}")
+    for peer in peers:
+        peer.client.close()
+    relay.close()
+    return 0 if checksums[0] == checksums[1] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сетевая игра: ретранслятор и проверка lockstep на одной машине")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="ретранслятор для двух игроков")
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--delay', type=int, default=INPUT_DELAY, help="задержка команд, шагов")
+    serve.add_argument('--latency', type=float, default=0, help="искусственная задержка пересылки, мс")
+    loopback = commands.add_parser('loopback', help="ретранслятор и два узла без окна")
+    loopback.add_argument('--ticks', type=int, default=1800)
+    loopback.add_argument('--delay', type=int, default=INPUT_DELAY)
+    loopback.add_argument('--latency', type=float, default=0, help="задержка пересылки, мс")
+    loopback.add_argument('--desync-at', type=int, default=None, help="сдвинуть юнит у гостя на этом шаге")
+    loopback.add_argument('--coins', type=float, default=0, help="монет каждой стороне на старте (большие армии)")
+    loopback.add_argument('--rate', type=float, default=0.02, help="вероятность команды на шаге")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        async def serve():
+            relay = RelayServer(args.delay, args.latency / 1000)
+            port = await relay.start(args.host, args.port)
+            print(f"Ретранслятор на {args.host}:{port}, задержка команд {args.delay} шагов")
+            await relay.server.serve_forever()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return run_loopback(args.ticks, args.delay, args.latency / 1000, args.desync_at, args.coins, args.rate)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import gc
+import time
+from collections import deque
+
+# Покадровый профилировщик без Kivy: подключается к симуляции как обработчик фаз
+# (Simulation.add_phase_hook) и к сборщику мусора через gc.callbacks.
+# Для каждого кадра хранит длительность кадра, время update_game, время фаз
+# и паузы GC, чтобы по всплеску было видно, какая подсистема его вызвала.
+
+SPIKE_FACTOR = 2.0  # Кадр считается всплеском, если он длиннее среднего в столько раз
+
+
+class FrameRecord:
+    def __init__(self, frame_time, update_time, phases, gc_time, gc_count, steps):
+        self.frame_time = frame_time  # Интервал между кадрами
+        self.update_time = update_time  # Работа внутри update_game
+        self.phases = phases  # Фаза -> время за кадр (по всем шагам симуляции)
+        self.gc_time = gc_time
+        self.gc_count = gc_count
+        self.steps = steps  # Сколько шагов симуляции выполнено за кадр
+
+    def culprit(self):
+        # Самая дорогая часть кадра: фаза симуляции или сборка мусора
+        name, longest = 'gc', self.gc_time
+        for phase, elapsed in self.phases.items():
+            if elapsed > longest:
+                name, longest = phase, elapsed
+        return name, longest
+
+
+class FrameProfiler:
+    def __init__(self, history=120):
+        self.history = deque(maxlen=history)
+        self.sim = None
+        self.phase_times = {}
+        self.steps = 0
+        self.gc_time = 0
+        self.gc_count = 0
+        self.gc_total = 0  # Число сборок с момента подключения
+        self.gc_started = None
+        self.update_started = None
+
+    def attach(self, sim):
+        self.sim = sim
+        sim.add_phase_hook(self)
+        gc.callbacks.append(self.on_gc)
+
+    def detach(self):
+        if self.sim is not None:
+            self.sim.remove_phase_hook(self)
+            self.sim = None
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+        self.gc_started = None
+
+    # Интерфейс обработчика фаз симуляции
+    def on_phase_start(self, name):
+        pass
+
+    def on_phase_end(self, name, elapsed):
+        self.phase_times[name] = self.phase_times.get(name, 0) + elapsed
+
+    def on_step_end(self):
+        self.steps += 1
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.gc_started = time.perf_counter()
+        elif self.gc_started is not None:
+            self.gc_time += time.perf_counter() - self.gc_started
+            self.gc_count += 1
+            self.gc_total += 1
+            self.gc_started = None
+
+    def begin_frame(self):
+        self.update_started = time.perf_counter()
+
+    def end_frame(self, frame_time):
+        update_time = time.perf_counter() - self.update_started if self.update_started is not None else 0
+        record = FrameRecord(frame_time, update_time, self.phase_times, self.gc_time, self.gc_count, self.steps)
+        self.history.append(record)
+        self.phase_times = {}
+        self.steps = 0
+        self.gc_time = 0
+        self.gc_count = 0
+        self.update_started = None
+        return record
+
+    def mean_frame_time(self):
+        if not self.history:
+            return 0
+        return sum(record.frame_time for record in self.history) / len(self.history)
+
+    def worst(self):
+        if not self.history:
+            return None
+        return max(self.history, key=lambda record: record.frame_time)
+
+    def is_spike(self, record):
+        return len(self.history) > 10 and record.frame_time > SPIKE_FACTOR * self.mean_frame_time()
+
+    def phase_means(self):
+        # Среднее время фаз на кадр за окно истории
+        totals = {}
+        for record in self.history:
+            for phase, elapsed in record.phases.items():
+                totals[phase] = totals.get(phase, 0) + elapsed
+        count = max(1, len(self.history))
+        return {phase: total / count for phase, total in totals.items()}
+
+
+def format_record(record):
+    phases = ", ".join(f"{phase} {elapsed * 1000:.1f}" for phase, elapsed in
+                       sorted(record.phases.items(), key=lambda item: -item[1]))
+    return (f"кадр {record.frame_time * 1000:.1f} мс, update {record.update_time * 1000:.1f} мс, "
+            f"шагов {record.steps}, GC {record.gc_time * 1000:.1f} мс ({record.gc_count}); {phases}")
@@ -0,0 +1,281 @@
+import sys
+import json
+import zlib
+import time
+import bisect
+import argparse
+import snapshot
+from simulation import Simulation, FixedStepLoop, SIM_STEP
+
+# Запись и воспроизведение матчей. Симуляция детерминирована при известном зерне,
+# поэтому повтор — это зерно, размер поля и поток команд с номерами шагов.
+# Решения ИИ тоже пишутся: при воспроизведении они не исполняются, а сверяются,
+# что сразу показывает рассинхронизацию. Ключевые кадры (полное состояние)
+# раз в keyframe_interval шагов позволяют быстро перематывать. Кадры — двоичные
+# снимки (snapshot.encode_state) подряд в отдельном файле рядом с повтором; в самом
+# повторе только их шаги, контрольные суммы и смещения. При перемотке нужный кадр
+# читается через mmap, остальные не разбираются и в память не грузятся.
+
+REPLAY_VERSION = 4  # 4: юниты без флага поля направлений; 3: ключевые кадры в файле .keys
+KEYFRAME_INTERVAL = 1800  # Шагов между ключевыми кадрами (30 секунд)
+KEYFRAMES_SUFFIX = '.keys'
+
+
+class Replay:
+    def __init__(self, seed=None, size=None, step=SIM_STEP):
+        self.version = REPLAY_VERSION
+        self.seed = seed
+        self.size = size  # (ширина, высота, высота панели)
+        self.step = step
+        self.commands = []  # (шаг, команда)
+        self.ai_decisions = []  # (шаг, решение)
+        self.keyframes = []  # (шаг, контрольная сумма)
+        self.keyframe_blobs = []  # Снимки кадров записываемого повтора, по одному на кадр
+        self.keyframe_path = None  # Файл кадров загруженного повтора
+        self.keyframe_offsets = []  # Смещения кадров в этом файле
+        self.length = 0  # Число шагов
+        self.winner = None
+        self.ai_mode = 'heuristic'  # Simulation.ai_mode во время записи
+        self.initial_state = None  # Состояние начала записи, если матч продолжен из снимка, а не начат с зерна
+
+    def to_bytes(self, keyframe_offsets=()):
+        data = {
+            'version': self.version,
+            'seed': self.seed,
+            'size': self.size,
+            'step': self.step,
+            'commands': self.commands,
+            'ai_decisions': self.ai_decisions,
+            'keyframes': [(tick, checksum, offset) for (tick, checksum), offset in zip(self.keyframes, keyframe_offsets)],
+            'length': self.length,
+            'winner': self.winner,
+            'ai_mode': self.ai_mode,
+            'initial_state': self.initial_state,
+        }
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 9)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        data = json.loads(zlib.decompress(raw).decode('utf-8'))
+        if data['version'] != REPLAY_VERSION:
+            raise ValueError(f"Неподдерживаемая версия повтора: {data['version']}")
+        replay = cls(data['seed'], tuple(data['size']), data['step'])
+        replay.commands = [(tick, tuple(command)) for tick, command in data['commands']]
+        replay.ai_decisions = [(tick, tuple(decision)) for tick, decision in data['ai_decisions']]
+        replay.keyframes = [(tick, checksum) for tick, checksum, _ in data['keyframes']]
+        replay.keyframe_offsets = [offset for _, _, offset in data['keyframes']]
+        replay.length = data['length']
+        replay.winner = data['winner']
+        replay.ai_mode = data.get('ai_mode', 'heuristic')
+        if data.get('initial_state') is not None:
+            replay.initial_state = _restore_tuples(data['initial_state'])
+        return replay
+
+    def keyframe_state(self, index):
+        if self.keyframe_path is None:
+            return snapshot.decode_state(self.keyframe_blobs[index])
+        return snapshot.read_state(self.keyframe_path, use_mmap=True, offset=self.keyframe_offsets[index])
+
+    def keyframe_data(self):
+        # Снимки всех кадров подряд, как в файле кадров
+        if self.keyframe_path is None:
+            return b''.join(self.keyframe_blobs)
+        with open(self.keyframe_path, 'rb') as keyframes_file:
+            return keyframes_file.read()
+
+    def save(self, path):
+        data = self.keyframe_data()
+        if self.keyframe_path is None:
+            offsets = []
+            offset = 0
+            for blob in self.keyframe_blobs:
+                offsets.append(offset)
+                offset += len(blob)
+        else:
+            offsets = self.keyframe_offsets
+        # Сначала кадры: повтор без своего файла кадров не должен оказаться на диске
+        with open(path + KEYFRAMES_SUFFIX, 'wb') as keyframes_file:
+            keyframes_file.write(data)
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.to_bytes(offsets))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as replay_file:
+            replay = cls.from_bytes(replay_file.read())
+        replay.keyframe_path = path + KEYFRAMES_SUFFIX
+        return replay
+
+
+# JSON превращает кортежи в списки; setstate() генератора нужен кортеж
+def _restore_tuples(state):
+    version, internal, gauss = state['rng']
+    state['rng'] = (version, tuple(internal), gauss)
+    return state
+
+
+# Подключается к симуляции (sim.recorder) и пишет всё, что влияет на матч
+class ReplayRecorder:
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.replay = None
+
+    def attach(self, sim):
+        sim.recorder = self
+
+    def begin(self, sim):
+        self.replay = Replay(sim.seed, (sim.width, sim.height, sim.panel_height))
+        self.replay.ai_mode = sim.ai_mode
+
+    def resume(self, sim):
+        # Матч продолжен из снимка: запись начинается с его состояния
+        self.begin(sim)
+        self.replay.initial_state = sim.get_state()
+
+    def record(self, tick, command):
+        if self.replay is not None:
+            self.replay.commands.append((tick, command))
+
+    def record_ai(self, tick, decision):
+        if self.replay is not None:
+            self.replay.ai_decisions.append((tick, decision))
+
+    def on_step(self, sim):
+        replay = self.replay
+        if replay is None:
+            return
+        replay.length = sim.tick
+        replay.winner = sim.winner
+        if sim.tick % self.keyframe_interval == 0:
+            replay.keyframes.append((sim.tick, sim.checksum()))
+            replay.keyframe_blobs.append(snapshot.encode_state(sim.get_state()))
+
+
+# Воспроизводит повтор на симуляции: исполняет команды в свои шаги,
+# сверяет решения ИИ и контрольные суммы ключевых кадров
+class ReplayPlayer:
+    def __init__(self, replay, sim=None):
+        self.replay = replay
+        width, height, panel_height = replay.size
+        self.sim = sim if sim is not None else Simulation(width, height, panel_height)
+        self.command_ticks = [tick for tick, _ in replay.commands]
+        self.ai_ticks = [tick for tick, _ in replay.ai_decisions]
+        self.keyframe_ticks = [tick for tick, _ in replay.keyframes]
+        self.keyframe_checksums = dict(replay.keyframes)
+        self.desyncs = []  # (шаг, описание)
+        self.restart()
+
+    def restart(self):
+        sim = self.sim
+        sim.recorder = None
+        sim.reset()
+        sim.resize(*self.replay.size)
+        # Решения планировщика записаны командами; эвристика при повторе не должна вмешиваться
+        sim.ai_mode = self.replay.ai_mode
+        sim.recorder = self
+        if self.replay.initial_state is not None:
+            sim.set_state(self.replay.initial_state)
+        else:
+            sim.start(self.replay.seed)
+        self.next_command = 0
+        self.next_ai = 0
+
+    # Интерфейс sim.recorder: при воспроизведении ничего не пишем, только сверяем
+    def begin(self, sim):
+        pass
+
+    def record(self, tick, command):
+        pass
+
+    def record_ai(self, tick, decision):
+        expected = None
+        if self.next_ai < len(self.replay.ai_decisions):
+            expected = self.replay.ai_decisions[self.next_ai]
+        if expected != (tick, decision):
+            self.desyncs.append((tick, f"ИИ: ожидалось {expected}, получено {(tick, decision)}"))
+        self.next_ai += 1
+
+    def on_step(self, sim):
+        checksum = self.keyframe_checksums.get(sim.tick)
+        if checksum is not None and checksum != sim.checksum():
+            self.desyncs.append((sim.tick, "контрольная сумма ключевого кадра не совпала"))
+
+    def done(self):
+        return self.sim.tick >= self.replay.length or self.sim.state != 'playing'
+
+    def step(self, dt=None):
+        if self.done():
+            return
+        sim = self.sim
+        commands = self.replay.commands
+        while self.next_command < len(commands) and commands[self.next_command][0] <= sim.tick:
+            sim.execute(commands[self.next_command][1])
+            self.next_command += 1
+        sim.step(self.replay.step)
+
+    def seek(self, tick):
+        sim = self.sim
+        index = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        frame_tick = self.keyframe_ticks[index] if index >= 0 else None
+        if tick < sim.tick or (frame_tick is not None and frame_tick > sim.tick):
+            if frame_tick is None:
+                self.restart()
+            else:
+                # Восстанавливаем ближайший ключевой кадр вместо проигрывания с начала
+                sim.set_state(self.replay.keyframe_state(index))
+                self.next_command = bisect.bisect_left(self.command_ticks, frame_tick)
+                self.next_ai = bisect.bisect_right(self.ai_ticks, frame_tick)
+        while sim.tick < tick and not self.done():
+            self.step()
+
+    def run_uncapped(self):
+        # Без отрисовки и без ограничения скорости; возвращает длительность каждого шага
+        tick_times = []
+        clock = time.perf_counter
+        while not self.done():
+            start = clock()
+            self.step()
+            tick_times.append(clock() - start)
+        return tick_times
+
+
+def make_loop(player, speed):
+    # Цикл для воспроизведения в N раз быстрее: длительность кадра умножается на speed
+    loop = FixedStepLoop(player, step=player.replay.step, max_steps=max(5, int(5 * speed)))
+    return loop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного матча без отрисовки")
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, default=None, help="перемотать к шагу и вывести состояние")
+    parser.add_argument('--slowest', type=int, default=10, help="сколько самых медленных шагов показать")
+    args = parser.parse_args(argv)
+
+    replay = Replay.load(args.path)
+    player = ReplayPlayer(replay)
+    if args.seek is not None:
+        start = time.perf_counter()
+        player.seek(args.seek)
+        sim = player.sim
+        print(f"Шаг {sim.tick} за {(time.perf_counter() - start) * 1000:.1f} мс: "
+              f"юнитов {len(sim.player_units)}/{len(sim.computer_units)}, "
+              f"HP баз {sim.player_base.hp:.1f}/{sim.computer_base.hp:.1f}")
+        return 0
+
+    start = time.perf_counter()
+    tick_times = player.run_uncapped()
+    elapsed = time.perf_counter() - start
+    sim = player.sim
+    print(f"Шагов {len(tick_times)} из {replay.length} за {elapsed:.2f} с "
+          f"({len(tick_times) / max(elapsed, 1e-9):.0f} шагов/с), победитель {sim.winner}, записан {replay.winner}")
+    slowest = sorted(range(len(tick_times)), key=tick_times.__getitem__, reverse=True)[:args.slowest]
+    for index in sorted(slowest):
+        print(f"  шаг {index + 1}: {tick_times[index] * 1000:.2f} мс")
+    for tick, message in player.desyncs:
+        print(f"Рассинхронизация на шаге {tick}: {message}")
+    return 1 if player.desyncs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,782 @@
+import random
+import math
+import time
+import struct
+import zlib
+import archetypes
+from spatial import SpatialGrid, point_in_polygon
+from contacts import ContactCache
+from formations import FormationCache, assign_slots
+from events import CombatLog, DAMAGE, KILL, HIRE, BASE_HIT, ATTACK_ORDER, HIRE_FAILED
+
+# Шаг симуляции: логика всегда продвигается ровно на SIM_STEP секунд,
+# поэтому исход боя не зависит от частоты кадров устройства
+SIM_STEP = 1/60.
+
+# Перекрытие союзников, при котором юнит ещё может спать, пикселей
+REST_OVERLAP = 0.5
+# Сдвиг за шаг, которого на экране не видно: зажатые в толпе юниты толкаются,
+# но стоят на месте с точностью до ошибок округления, пикселей
+REST_MOVE = 0.01
+
+# Игровая логика без Kivy: базы, юниты, экономика, таймеры ИИ и столкновения.
+# Отрисовкой занимается RTSGame в main.py, который подписывается на события симуляции.
+
+# Определение типов юнитов
+class UnitType:
+    CAVALRY = 'cavalry'
+    PIKEMAN = 'pikeman'
+    SWORDSMAN = 'swordsman'
+
+# Класс базы
+class Base:
+    def __init__(self, x, y, color, name):
+        self.x = x
+        self.y = y
+        self.hp = 250
+        self.coins = 100
+        self.income = 1
+        self.color = color
+        self.radius = 50  # Радиус базы
+        self.inner_radius = 30  # Внутренний радиус
+        self.name = name  # "player" или "computer"
+
+    def get_inner_color(self):
+        return tuple(max(c - 0.3, 0) for c in self.color)
+
+    def reset(self):
+        self.hp = 250
+        self.coins = 100
+
+    def update(self, dt):
+        self.coins += self.income * dt
+
+    def take_damage(self, damage):
+        self.hp -= damage
+
+OWNER_COLORS = {"player": (1, 0, 0), "computer": (0, 0, 1)}
+
+# Класс юнита: только состояние конкретного юнита, характеристики типа — в общем архетипе
+class Unit:
+    __slots__ = ('uid', 'archetype', 'x', 'y', 'prev_x', 'prev_y', 'target_x', 'target_y', 'owner',
+                 'hp', 'arrived', 'asleep', 'grid_cell')
+
+    def __init__(self, archetype, x, y, owner, uid=0):
+        self.uid = uid  # Порядковый номер найма в матче
+        self.archetype = archetype  # archetypes.Archetype: hp, урон, скорость, размер, форма
+        self.x = x
+        self.y = y
+        self.prev_x = x  # Позиция на начало шага, для интерполяции отрисовки
+        self.prev_y = y
+        self.target_x = x
+        self.target_y = y
+        self.owner = owner  # "player" или "computer"
+        self.hp = archetype.hp
+        # Дошедший до цели юнит больше к ней не идёт, даже если его оттолкнули;
+        # спящий — дошёл и не толкался, его не двигают и не расталкивают, пока не разбудят
+        self.arrived = True
+        self.asleep = False
+        self.grid_cell = None  # Ячейка в пространственной сетке
+
+    def set_target(self, x, y):
+        # Новый приказ будит юнита
+        self.target_x = x
+        self.target_y = y
+        self.arrived = False
+        self.asleep = False
+
+    @property
+    def type(self):
+        return self.archetype.name
+
+    @property
+    def damage(self):
+        return self.archetype.damage
+
+    @property
+    def speed(self):
+        return self.archetype.speed
+
+    @property
+    def size(self):
+        return self.archetype.size
+
+    @property
+    def shape(self):
+        return self.archetype.shape
+
+    @property
+    def color(self):
+        return OWNER_COLORS[self.owner]
+
+    def move(self, dt, ally_grid, boundaries):
+        dx = self.target_x - self.x
+        dy = self.target_y - self.y
+        distance_to_target = math.hypot(dx, dy)
+
+        if distance_to_target > 5:
+            # Нормализуем направление
+            dx /= distance_to_target
+            dy /= distance_to_target
+            # Вычисляем потенциальное новое положение
+            archetype = self.archetype
+            new_x = self.x + dx * archetype.speed * dt
+            new_y = self.y + dy * archetype.speed * dt
+
+            # Проверяем столкновение с границами экрана
+            min_x, max_x, min_y, max_y = boundaries
+            half_size = archetype.half_size
+
+            # Ограничиваем координаты новыми границами
+            new_x = max(min_x + half_size, min(new_x, max_x - half_size))
+            new_y = max(min_y + half_size, min(new_y, max_y - half_size))
+
+            self.x = new_x
+            self.y = new_y
+            ally_grid.update(self)
+        else:
+            self.arrived = True
+
+    def separate(self, ally_grid, slack):
+        # Юниты двигаются и расталкиваются по очереди в порядке найма: нанятые раньше уже
+        # сдвинуты на этом шаге, а нанятые позже ещё стоят на позиции начала шага (prev_x, prev_y).
+        # slack — насколько далеко сосед мог уйти от позиции начала шага.
+        # Избежание наложения с союзными юнитами (только соседние ячейки сетки)
+        half_size = self.archetype.half_size
+        pushed = False  # Заметный толчок: решает, уснуть ли и будить ли соседа
+        moved = False  # Любой сдвиг: ячейку в сетке надо обновить
+        for other in ally_grid.query(self.x, self.y, half_size + ally_grid.max_size / 2 + slack):
+            if other is not self:
+                if other.uid > self.uid:
+                    other_x, other_y = other.prev_x, other.prev_y
+                else:
+                    other_x, other_y = other.x, other.y
+                dist = math.hypot(self.x - other_x, self.y - other_y)
+                min_dist = half_size + other.archetype.half_size
+                if dist < min_dist and dist != 0:
+                    overlap = min_dist - dist
+                    # Вычисление направления от другого юнита
+                    ox = (self.x - other_x) / dist
+                    oy = (self.y - other_y) / dist
+                    # Сдвиг текущего юнита
+                    self.x += ox * overlap / 2
+                    self.y += oy * overlap / 2
+                    moved = True
+                    # Расталкивание сходится постепенно; остаточное перекрытие в доли пикселя
+                    # не мешает уснуть и не будит соседа
+                    if overlap > REST_OVERLAP:
+                        pushed = True
+                        # Спящего соседа будим: теперь ему тоже надо расталкиваться
+                        other.asleep = False
+                    # Упёрся в уже дошедшего юнита с той же целью — тоже дошёл, иначе толпа
+                    # у точки приказа толкалась бы вечно
+                    if (not self.arrived and other.arrived and other.target_x == self.target_x
+                            and other.target_y == self.target_y):
+                        self.arrived = True
+        if moved:
+            ally_grid.update(self)
+        self.asleep = self.arrived and not pushed
+
+    def distance_to_base(self, base):
+        return math.hypot(self.x - base.x, self.y - base.y)
+
+# Движок по умолчанию: юниты — обычные объекты, соседи ищутся через пространственную сетку
+class GridEngine:
+    def __init__(self):
+        # Пространственные сетки юнитов по владельцам
+        self.grids = {"player": SpatialGrid(), "computer": SpatialGrid()}
+        # Пары врагов, которые могут касаться, живут между тиками
+        self.contacts = ContactCache()
+
+    def create_unit(self, archetype, x, y, owner, uid):
+        return Unit(archetype, x, y, owner, uid)
+
+    def add_unit(self, unit):
+        self.grids[unit.owner].insert(unit)
+        self.contacts.add(unit)
+
+    def remove_unit(self, unit):
+        self.grids[unit.owner].remove(unit)
+        self.contacts.remove(unit)
+
+    def clear(self):
+        self.grids["player"].clear()
+        self.grids["computer"].clear()
+        self.contacts.clear()
+
+    def store_previous(self, sim):
+        for units in (sim.player_units, sim.computer_units):
+            for unit in units:
+                unit.prev_x = unit.x
+                unit.prev_y = unit.y
+
+    def move_units(self, sim, dt, boundaries):
+        for owner in ("player", "computer"):
+            grid = self.grids[owner]
+            for unit in sim.units_of(owner):
+                if not unit.arrived:
+                    unit.move(dt, grid, boundaries)
+
+    def separate_units(self, sim, dt):
+        for owner in ("player", "computer"):
+            units = sim.units_of(owner)
+            if not units:
+                continue
+            # Быстрее самого быстрого архетипа сосед уйти не мог
+            slack = sim.archetypes.max_speed * dt
+            grid = self.grids[owner]
+            for unit in units:
+                if not unit.asleep:
+                    unit.separate(grid, slack)
+
+    def fight_units(self, sim, dt):
+        player_grid = self.grids["player"]
+        computer_grid = self.grids["computer"]
+        emit = sim.events.emit
+        # Столкновения между вражескими юнитами (игрок vs компьютер): пары берутся
+        # из постоянного кэша контактов, сетку опрашивают только сдвинувшиеся юниты
+        self.contacts.refresh(sim, self.grids)
+        dead = []
+        for p_unit, c_unit in self.contacts.engaged(sim):
+            # Погибший в этом тике юнит больше не дерётся, но из списков уйдёт в конце тика
+            if p_unit.hp <= 0 or c_unit.hp <= 0:
+                continue
+            p_type = p_unit.archetype
+            c_type = c_unit.archetype
+            # Наносим урон друг другу: урон в секунду с множителем «тип против типа»
+            damage_to_computer = p_type.damage_vs[c_type.index] * dt
+            damage_to_player = c_type.damage_vs[p_type.index] * dt
+            c_unit.hp -= damage_to_computer
+            p_unit.hp -= damage_to_player
+            emit(DAMAGE, sim.time, "player", p_type.name, c_type.name, damage_to_computer)
+            emit(DAMAGE, sim.time, "computer", c_type.name, p_type.name, damage_to_player)
+
+            # Отталкивание юнитов друг от друга; предыдущие пары могли уже растолкнуть эту
+            distance = math.hypot(p_unit.x - c_unit.x, p_unit.y - c_unit.y)
+            overlap = p_type.half_size + c_type.half_size - distance + 1
+            if overlap > 0:
+                if distance != 0:
+                    ox = (p_unit.x - c_unit.x) / distance
+                    oy = (p_unit.y - c_unit.y) / distance
+                else:
+                    ox, oy = 1, 0  # Если совпадают позиции, отталкиваем вправо
+                p_unit.x += ox * (overlap / 2)
+                p_unit.y += oy * (overlap / 2)
+                c_unit.x -= ox * (overlap / 2)
+                c_unit.y -= oy * (overlap / 2)
+                p_unit.asleep = c_unit.asleep = False
+                player_grid.update(p_unit)
+                computer_grid.update(c_unit)
+
+            # Проверка уничтожения: погибшие копятся и удаляются одним пакетом
+            if p_unit.hp <= 0:
+                dead.append(p_unit)
+                emit(KILL, sim.time, "computer", c_type.name, p_type.name, 1)
+            if c_unit.hp <= 0:
+                dead.append(c_unit)
+                emit(KILL, sim.time, "player", p_type.name, c_type.name, 1)
+        if dead:
+            sim.remove_units(dead)
+
+    def units_in_rect(self, sim, owner, min_x, min_y, max_x, max_y):
+        return [unit for unit in self.grids[owner].query_rect(min_x, min_y, max_x, max_y)
+                if min_x <= unit.x <= max_x and min_y <= unit.y <= max_y]
+
+    def attack_bases(self, sim, dt):
+        # Юниты игрока атакуют базу компьютера
+        self.attack_base(sim, self.grids["player"], sim.computer_base, dt)
+        # Юниты компьютера атакуют базу игрока
+        self.attack_base(sim, self.grids["computer"], sim.player_base, dt)
+
+    def attack_base(self, sim, grid, base, dt):
+        base_radius = base.radius + grid.max_size / 2
+        for unit in grid.query(base.x, base.y, base_radius):
+            distance = math.hypot(unit.x - base.x, unit.y - base.y)
+            archetype = unit.archetype
+            min_dist = archetype.half_size + base.radius
+            if distance <= min_dist:
+                # Нанесение урона базе: урон в секунду без множителей
+                damage = archetype.damage * dt
+                base.take_damage(damage)
+                sim.events.emit(BASE_HIT, sim.time, unit.owner, unit.type, base.name, damage)
+
+                # Отталкивание юнита от базы
+                if distance != 0:
+                    ox = (unit.x - base.x) / distance
+                    oy = (unit.y - base.y) / distance
+                else:
+                    ox, oy = 1, 0  # Если совпадают позиции, отталкиваем вправо
+
+                overlap = min_dist - distance + 1
+                unit.x += ox * overlap
+                unit.y += oy * overlap
+                unit.asleep = False
+                grid.update(unit)
+
+
+# Класс симуляции матча
+class Simulation:
+    # Фазы шага симуляции в порядке выполнения; каждой соответствует метод update_<фаза>
+    PHASES = ('economy', 'movement', 'separation', 'unit_combat', 'base_combat', 'ai')
+
+    def __init__(self, width=1000, height=600, panel_height=None, engine=None, events=None):
+        self.width = width
+        self.height = height
+        # Высота панели найма внизу экрана, юниты туда не заходят
+        self.panel_height = height * 0.1 if panel_height is None else panel_height
+        self.player_base = Base(100, height/2, (1, 0, 0), "player")  # Красный
+        self.computer_base = Base(width - 100, height/2, (0, 0, 1), "computer")  # Синий
+        self.player_units = []
+        self.computer_units = []
+        # Движок движения и столкновений (GridEngine или vector_engine.NumpyEngine)
+        self.engine = engine if engine is not None else GridEngine()
+        # Журнал боевых событий; по умолчанию выключен
+        self.events = events if events is not None else CombatLog()
+        self.hire_cost = 10
+        self.initial_attack_delay = 5  # Через сколько секунд ИИ отправляет стартовые войска
+        self.computer_hire_interval = 15  # Период найма эвристики ИИ, секунд
+        self.computer_attack_interval = 30  # Период решения о нападении, секунд
+        # Характеристики типов юнитов; правки баланса — через archetypes.with_overrides()
+        self.archetypes = archetypes.DEFAULT
+        self.listeners = []  # Наблюдатели: on_unit_added(unit), on_unit_removed(unit)
+        self.units_by_uid = {}
+        self.next_uid = 0
+        self.max_unit_size = 0  # Для поиска юнита под точкой касания
+        self.recorder = None  # replay.ReplayRecorder, если матч записывается
+        # Кто принимает решения компьютера: 'heuristic' — таймеры и подсчёт в update_ai,
+        # 'planner' — внешний планировщик (ai_planner.py) присылает команды ai_hire/ai_attack,
+        # 'remote' — за компьютер играет человек по сети (netplay.py), стартовой атаки нет
+        self.ai_mode = 'heuristic'
+        self.phases = [(name, getattr(self, 'update_' + name)) for name in self.PHASES]
+        self.phase_timings = None  # Словарь фаза -> суммарное время, если нужен замер
+        self.formations = FormationCache()  # Раскладки слотов строя по (строй, число юнитов)
+        # Обработчики вокруг фаз: on_phase_start(name), on_phase_end(name, elapsed) и on_step_end() после шага
+        self.phase_hooks = []
+        self.reset_timers()
+        self.state = 'idle'
+        self.winner = None
+        # Все случайные решения матча берутся из своего генератора с известным зерном
+        self.seed = None
+        self.rng = random.Random()
+
+    def reset_timers(self):
+        self.tick = 0  # Число выполненных шагов
+        self.time = 0
+        self.computer_hire_timer = 0
+        self.computer_attack_timer = 0
+        self.initial_attack_sent = False
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    # Внешние профилировщики подключаются сюда; без обработчиков фазы не замеряются
+    def add_phase_hook(self, hook):
+        self.phase_hooks.append(hook)
+
+    def remove_phase_hook(self, hook):
+        if hook in self.phase_hooks:
+            self.phase_hooks.remove(hook)
+
+    def resize(self, width, height, panel_height=None):
+        self.width = width
+        self.height = height
+        self.panel_height = height * 0.1 if panel_height is None else panel_height
+
+    def get_boundaries(self):
+        return (
+            0,  # min_x
+            self.width,  # max_x
+            self.panel_height,  # min_y
+            self.height  # max_y
+        )
+
+    def is_quiescent(self):
+        # Поле замерло: все юниты дошли до целей и на последнем шаге сдвинулись не больше
+        # REST_MOVE. Монеты и таймеры ИИ при этом идут, но на экране ничего не меняется
+        for units in (self.player_units, self.computer_units):
+            for unit in units:
+                if (not unit.arrived or abs(unit.x - unit.prev_x) > REST_MOVE
+                        or abs(unit.y - unit.prev_y) > REST_MOVE):
+                    return False
+        return True
+
+    def units_of(self, owner):
+        return self.player_units if owner == "player" else self.computer_units
+
+    def base_of(self, owner):
+        return self.player_base if owner == "player" else self.computer_base
+
+    def enemy_base_of(self, owner):
+        return self.computer_base if owner == "player" else self.player_base
+
+    def start(self, seed=None):
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.rng.seed(self.seed)
+        self.state = 'playing'
+        self.winner = None
+        self.reset_timers()
+        self.next_uid = 0
+        if self.recorder is not None:
+            self.recorder.begin(self)
+        # Создание начальных юнитов компьютера
+        self.create_computer_initial_units()
+
+    def reset(self):
+        self.clear_units()
+        self.player_base.reset()
+        self.computer_base.reset()
+        self.reset_timers()
+        self.state = 'idle'
+        self.winner = None
+
+    def spawn_unit(self, unit_type, owner):
+        base = self.base_of(owner)
+        # Определение случайного смещения вокруг базы для распределения юнитов
+        spread_radius = 30  # Радиус распределения
+        angle = self.rng.uniform(0, 2 * math.pi)
+        distance = self.rng.uniform(0, spread_radius)
+        offset_x = math.cos(angle) * distance
+        offset_y = math.sin(angle) * distance
+        spawn_x = base.x + offset_x
+        spawn_y = base.y + offset_y
+        unit = self.engine.create_unit(self.archetypes[unit_type], spawn_x, spawn_y, owner, self.next_uid)
+        self.next_uid += 1
+        self.add_unit(unit)
+        return unit
+
+    def add_unit(self, unit):
+        self.units_of(unit.owner).append(unit)
+        self.units_by_uid[unit.uid] = unit
+        if unit.size > self.max_unit_size:
+            self.max_unit_size = unit.size
+        self.engine.add_unit(unit)
+        for listener in self.listeners:
+            listener.on_unit_added(unit)
+
+    def remove_unit(self, unit):
+        units = self.units_of(unit.owner)
+        if unit in units:
+            units.remove(unit)
+            del self.units_by_uid[unit.uid]
+            self.engine.remove_unit(unit)
+            for listener in self.listeners:
+                listener.on_unit_removed(unit)
+
+    def remove_units(self, units):
+        # Пакетное удаление (погибшие за тик): списки владельцев перестраиваются
+        # один раз вместо list.remove на каждого юнита
+        gone = set(units)
+        for owner_units in (self.player_units, self.computer_units):
+            if any(unit in gone for unit in owner_units):
+                owner_units[:] = [unit for unit in owner_units if unit not in gone]
+        for unit in units:
+            del self.units_by_uid[unit.uid]
+            self.engine.remove_unit(unit)
+            for listener in self.listeners:
+                listener.on_unit_removed(unit)
+
+    def clear_units(self):
+        for unit in self.player_units + self.computer_units:
+            self.remove_unit(unit)
+        self.engine.clear()
+
+    def hire_unit(self, owner, unit_type):
+        base = self.base_of(owner)
+        if base.coins >= self.hire_cost:
+            base.coins -= self.hire_cost
+            unit = self.spawn_unit(unit_type, owner)
+            self.events.emit(HIRE, self.time, owner, unit_type, None, 1)
+            return unit
+        self.events.emit(HIRE_FAILED, self.time, owner, unit_type, None, 1)
+        return None
+
+    # Команды игроков. Всё, что меняет ход матча извне, проходит через execute(),
+    # чтобы матч можно было записать и воспроизвести.
+    def execute(self, command):
+        if self.recorder is not None:
+            self.recorder.record(self.tick, command)
+        kind = command[0]
+        if kind == 'hire':
+            _, owner, unit_type = command
+            return self.hire_unit(owner, unit_type)
+        if kind == 'move':
+            # Строй — необязательное шестое поле; старые повторы идут в одну точку, как раньше
+            _, owner, uids, target_x, target_y = command[:5]
+            formation = command[5] if len(command) > 5 else None
+            units = [self.units_by_uid[uid] for uid in uids if uid in self.units_by_uid]
+            self.order_move(units, target_x, target_y, formation)
+        elif kind == 'ai_hire':
+            _, owner, unit_type, count = command
+            self.ai_hire(owner, unit_type, count)
+        elif kind == 'ai_attack':
+            _, owner = command
+            self.ai_attack(owner)
+        elif kind == 'resize':
+            _, width, height, panel_height = command
+            self.resize(width, height, panel_height)
+        # 'select' из старых повторов ничего не меняет: выделение живёт только в интерфейсе
+
+    # Выбор юнитов в интерфейсе: запросы идут через пространственный индекс движка
+    def units_in_rect(self, owner, x1, y1, x2, y2):
+        return self.engine.units_in_rect(self, owner, min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def unit_at(self, owner, x, y):
+        # Юнит, квадрат которого содержит точку; при перекрытии — нанятый раньше
+        pad = self.max_unit_size / 2
+        found = None
+        for unit in self.engine.units_in_rect(self, owner, x - pad, y - pad, x + pad, y + pad):
+            half_size = unit.size / 2
+            if abs(unit.x - x) <= half_size and abs(unit.y - y) <= half_size:
+                if found is None or unit.uid < found.uid:
+                    found = unit
+        return found
+
+    def units_in_polygon(self, owner, points):
+        xs = points[0::2]
+        ys = points[1::2]
+        return [unit for unit in self.units_in_rect(owner, min(xs), min(ys), max(xs), max(ys))
+                if point_in_polygon(unit.x, unit.y, points)]
+
+    def order_move(self, units, target_x, target_y, formation=None):
+        boundaries = self.get_boundaries()
+        # Строем — каждому юниту свой слот рядом с точкой приказа, а не одна точка на всех.
+        # Одиночный юнит идёт точно в точку приказа
+        if formation is not None and len(units) > 1:
+            layout = self.formations.get(formation, len(units))
+            for unit, x, y in assign_slots(units, layout, target_x, target_y, boundaries):
+                unit.set_target(x, y)
+            return
+        # Ограничиваем целевые позиции границами поля
+        min_x, max_x, min_y, max_y = boundaries
+        for unit in units:
+            half_size = unit.size / 2
+            unit.set_target(max(min_x + half_size, min(target_x, max_x - half_size)),
+                            max(min_y + half_size, min(target_y, max_y - half_size)))
+
+    def create_computer_initial_units(self):
+        for unit_type in [UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN]:
+            for _ in range(2):
+                if self.computer_base.coins >= self.hire_cost:
+                    self.computer_base.coins -= self.hire_cost
+                    self.spawn_unit(unit_type, "computer")
+                    self.events.emit(HIRE, self.time, "computer", unit_type, None, 1)
+
+    def send_computer_initial_units(self):
+        for unit in self.computer_units:
+            unit.set_target(self.player_base.x, self.player_base.y)
+
+    def step(self, dt):
+        if self.state != 'playing':
+            return
+        self.engine.store_previous(self)
+        self.tick += 1
+        self.time += dt
+        timings = self.phase_timings
+        hooks = self.phase_hooks
+        for name, phase in self.phases:
+            if timings is None and not hooks:
+                phase(dt)
+                continue
+            for hook in hooks:
+                hook.on_phase_start(name)
+            start = time.perf_counter()
+            phase(dt)
+            elapsed = time.perf_counter() - start
+            if timings is not None:
+                timings[name] = timings.get(name, 0) + elapsed
+            for hook in hooks:
+                hook.on_phase_end(name, elapsed)
+        for hook in hooks:
+            hook.on_step_end()
+
+        # Проверка победы/поражения
+        if self.player_base.hp <= 0 or self.computer_base.hp <= 0:
+            self.state = 'game_over'
+            self.winner = "player" if self.player_base.hp > 0 else "computer"
+
+        # Выгрузка накопленных за тик событий в приёмник журнала
+        self.events.flush(self.time)
+        if self.recorder is not None:
+            self.recorder.on_step(self)
+
+    def update_economy(self, dt):
+        # Обновление баз
+        self.player_base.update(dt)
+        self.computer_base.update(dt)
+
+    def update_movement(self, dt):
+        self.engine.move_units(self, dt, self.get_boundaries())
+
+    def update_separation(self, dt):
+        self.engine.separate_units(self, dt)
+
+    def update_unit_combat(self, dt):
+        self.engine.fight_units(self, dt)
+
+    def update_base_combat(self, dt):
+        self.engine.attack_bases(self, dt)
+
+    def update_ai(self, dt):
+        # Стартовые войска компьютера выдвигаются через initial_attack_delay секунд
+        if not self.initial_attack_sent and self.time >= self.initial_attack_delay and self.ai_mode != 'remote':
+            self.initial_attack_sent = True
+            self.send_computer_initial_units()
+
+        # При внешнем планировщике решения приходят командами, таймеры не нужны
+        if self.ai_mode != 'heuristic':
+            return
+
+        # Обновление таймеров компьютера
+        self.computer_hire_timer += dt
+        self.computer_attack_timer += dt
+
+        # Нанимать юниты компьютера каждые computer_hire_interval секунд
+        if self.computer_hire_timer >= self.computer_hire_interval:
+            self.computer_hire_timer = 0
+            self.computer_hire_units()
+
+        # Решать нападать каждые computer_attack_interval секунд
+        if self.computer_attack_timer >= self.computer_attack_interval:
+            self.computer_attack_timer = 0
+            if self.rng.random() > 0.5:
+                self.computer_send_attack()
+
+    def move_units(self, dt):
+        self.update_movement(dt)
+        self.update_separation(dt)
+
+    def handle_collisions(self, dt):
+        self.update_unit_combat(dt)
+        self.update_base_combat(dt)
+
+    def computer_hire_units(self, owner="computer"):
+        # Подсчёт типов юнитов противника; owner="player" — зеркальный ИИ пакетного прогона
+        enemy = "player" if owner == "computer" else "computer"
+        counts = {UnitType.CAVALRY:0, UnitType.PIKEMAN:0, UnitType.SWORDSMAN:0}
+        for unit in self.units_of(enemy):
+            counts[unit.type] +=1
+        # Определяем наиболее многочисленный тип у противника
+        if counts[UnitType.CAVALRY] >= counts[UnitType.PIKEMAN] and counts[UnitType.CAVALRY] >= counts[UnitType.SWORDSMAN]:
+            counter_type = UnitType.PIKEMAN
+        elif counts[UnitType.PIKEMAN] >= counts[UnitType.CAVALRY] and counts[UnitType.PIKEMAN] >= counts[UnitType.SWORDSMAN]:
+            counter_type = UnitType.SWORDSMAN
+        else:
+            counter_type = UnitType.CAVALRY
+
+        if self.recorder is not None and owner == "computer":
+            self.recorder.record_ai(self.tick, ('ai_hire', counter_type))
+        # Нанимать 5 юнитов типа counter_type
+        self.ai_hire(owner, counter_type, 5)
+
+    def computer_send_attack(self):
+        if self.recorder is not None:
+            self.recorder.record_ai(self.tick, ('ai_attack',))
+        self.ai_attack("computer")
+
+    # Решения ИИ: общие для эвристики и для команд планировщика
+    def ai_hire(self, owner, unit_type, count):
+        base = self.base_of(owner)
+        for _ in range(count):
+            if base.coins >= self.hire_cost:
+                base.coins -= self.hire_cost
+                self.spawn_unit(unit_type, owner)
+                self.events.emit(HIRE, self.time, owner, unit_type, None, 1)
+
+    def ai_attack(self, owner):
+        # Приказ всем юнитам атаковать вражескую базу
+        units = self.units_of(owner)
+        enemy_base = self.enemy_base_of(owner)
+        for unit in units:
+            unit.set_target(enemy_base.x, enemy_base.y)
+        self.events.emit(ATTACK_ORDER, self.time, owner, None, enemy_base.name, len(units))
+
+    # Полное состояние матча в виде словаря (ключевые кадры повторов)
+    def get_state(self):
+        units = []
+        for unit in self.player_units + self.computer_units:
+            units.append((unit.uid, unit.type, unit.owner, unit.x, unit.y, unit.prev_x, unit.prev_y,
+                          unit.target_x, unit.target_y, unit.hp, bool(unit.arrived), bool(unit.asleep)))
+        return {
+            'tick': self.tick,
+            'time': self.time,
+            'state': self.state,
+            'winner': self.winner,
+            'seed': self.seed,
+            'rng': self.rng.getstate(),
+            'size': (self.width, self.height, self.panel_height),
+            'bases': [(base.hp, base.coins) for base in (self.player_base, self.computer_base)],
+            'timers': (self.computer_hire_timer, self.computer_attack_timer, self.initial_attack_sent),
+            'next_uid': self.next_uid,
+            'units': units,
+        }
+
+    def set_state(self, state):
+        self.clear_units()
+        self.tick = state['tick']
+        self.time = state['time']
+        self.state = state['state']
+        self.winner = state['winner']
+        self.seed = state['seed']
+        self.rng.setstate(state['rng'])
+        self.resize(*state['size'])
+        for base, (hp, coins) in zip((self.player_base, self.computer_base), state['bases']):
+            base.hp = hp
+            base.coins = coins
+        self.computer_hire_timer, self.computer_attack_timer, self.initial_attack_sent = state['timers']
+        self.next_uid = state['next_uid']
+        for fields in state['units']:
+            uid, unit_type, owner, x, y, prev_x, prev_y, target_x, target_y, hp = fields[:10]
+            unit = self.engine.create_unit(self.archetypes[unit_type], x, y, owner, uid)
+            unit.prev_x = prev_x
+            unit.prev_y = prev_y
+            unit.target_x = target_x
+            unit.target_y = target_y
+            unit.hp = hp
+            # В старых состояниях флагов покоя нет: юнит проснётся и сам решит, дошёл ли он
+            unit.arrived = fields[10] if len(fields) > 10 else False
+            unit.asleep = fields[11] if len(fields) > 11 else False
+            self.add_unit(unit)
+
+    # Контрольная сумма состояния для поиска рассинхронизации
+    def checksum(self):
+        crc = zlib.crc32(struct.pack('<I4d', self.tick, self.player_base.hp, self.player_base.coins,
+                                     self.computer_base.hp, self.computer_base.coins))
+        for units in (self.player_units, self.computer_units):
+            for unit in units:
+                crc = zlib.crc32(struct.pack('<I3d', unit.uid, unit.x, unit.y, unit.hp), crc)
+        return crc
+
+
+# Цикл с фиксированным шагом: кадры любой длительности копятся в аккумуляторе
+# и расходуются целыми шагами SIM_STEP. Возвращает долю следующего шага (alpha)
+# для интерполяции отрисовки между предыдущим и текущим состоянием.
+class FixedStepLoop:
+    MAX_STEPS = 5
+
+    def __init__(self, sim, step=SIM_STEP, max_steps=MAX_STEPS):
+        self.sim = sim
+        self.step = step
+        self.max_steps = max_steps  # Ограничение догоняющих шагов за один кадр
+        self.accumulator = 0
+        self.dropped_time = 0  # Сколько времени симуляции отброшено из-за ограничения
+
+    def reset(self):
+        self.accumulator = 0
+
+    def advance(self, frame_dt):
+        self.accumulator += frame_dt
+        steps = 0
+        while self.accumulator >= self.step and steps < self.max_steps:
+            self.sim.step(self.step)
+            self.accumulator -= self.step
+            steps += 1
+        if self.accumulator >= self.step:
+            # Устройство не успевает: лучше замедлить игру, чем уйти в спираль догонялок
+            dropped = self.accumulator - self.accumulator % self.step
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+        return self.accumulator / self.step
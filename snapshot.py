@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import struct
+import argparse
+from array import array
+
+# Двоичные снимки состояния матча (то же содержимое, что Simulation.get_state()).
+# Заголовок фиксированной структуры с версией, затем таблица типов юнитов и поля
+# юнитов столбцами (array: все x подряд, все y подряд и т.д.) — упаковка и разбор
+# тысяч юнитов сводятся к нескольким tobytes()/frombytes().
+
+MAGIC = b'RTSS'
+VERSION = 3
+# Версии 1 и 2 хранили в младшем бите флагов юнита флаг поля направлений; он пропускается
+READABLE_VERSIONS = (1, 2, 3)
+
+STATES = ('idle', 'playing', 'game_over')
+OWNERS = ("player", "computer")
+
+# Заголовок: магия, версия, флаги, шаг, время, состояние, победитель, зерно,
+# размер поля (3), базы (hp, монеты) x2, таймеры ИИ (2 + флаг), next_uid, число юнитов, число типов
+HEADER = struct.Struct('<4sHHIdBbQ3d4d2dBIII')
+FLAG_SEED = 1  # Зерно задано
+FLAG_GAUSS = 2  # В состоянии генератора есть сохранённое значение gauss
+
+# Состояние генератора Mersenne Twister: версия, 625 слов, gauss_next
+RNG_WORDS = 625
+RNG_HEADER = struct.Struct('<id')
+
+FLOAT_COLUMNS = ('x', 'y', 'prev_x', 'prev_y', 'target_x', 'target_y', 'hp')
+
+# Биты байта флагов юнита
+UNIT_ARRIVED = 2
+UNIT_ASLEEP = 4
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()  # Файл всегда little-endian
+    return column
+
+
+def _read_column(typecode, buffer, offset, count):
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(buffer[offset:offset + size])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column, offset + size
+
+
+def _unit_flags(unit):
+    flags = 0
+    for index, bit in ((10, UNIT_ARRIVED), (11, UNIT_ASLEEP)):
+        if len(unit) > index and unit[index]:
+            flags |= bit
+    return flags
+
+
+def encode_state(state):
+    units = state['units']
+    type_names = sorted({unit[1] for unit in units})
+    type_index = {name: index for index, name in enumerate(type_names)}
+    rng_version, rng_internal, gauss = state['rng']
+    flags = (FLAG_SEED if state['seed'] is not None else 0) | (FLAG_GAUSS if gauss is not None else 0)
+    winner = -1 if state['winner'] is None else OWNERS.index(state['winner'])
+    (player_hp, player_coins), (computer_hp, computer_coins) = state['bases']
+    hire_timer, attack_timer, initial_attack_sent = state['timers']
+    parts = [HEADER.pack(MAGIC, VERSION, flags, state['tick'], state['time'], STATES.index(state['state']), winner,
+                         state['seed'] or 0, *state['size'], player_hp, player_coins, computer_hp, computer_coins,
+                         hire_timer, attack_timer, initial_attack_sent, state['next_uid'], len(units),
+                         len(type_names))]
+    parts.append(RNG_HEADER.pack(rng_version, gauss or 0.0))
+    parts.append(_column('I', rng_internal).tobytes())
+    for name in type_names:
+        encoded = name.encode('utf-8')
+        parts.append(struct.pack('<B', len(encoded)) + encoded)
+    # Столбцы: uid, тип, владелец, флаги (дошёл, спит), затем координаты и hp
+    parts.append(_column('I', [unit[0] for unit in units]).tobytes())
+    parts.append(_column('B', [type_index[unit[1]] for unit in units]).tobytes())
+    parts.append(_column('B', [OWNERS.index(unit[2]) for unit in units]).tobytes())
+    parts.append(_column('B', [_unit_flags(unit) for unit in units]).tobytes())
+    for offset in range(len(FLOAT_COLUMNS)):
+        parts.append(_column('d', [unit[3 + offset] for unit in units]).tobytes())
+    return b''.join(parts)
+
+
+def decode_state(buffer, offset=0):
+    # buffer — bytes, bytearray, memoryview или mmap
+    (magic, version, flags, tick, sim_time, state_index, winner, seed, width, height, panel_height,
+     player_hp, player_coins, computer_hp, computer_coins, hire_timer, attack_timer, initial_attack_sent,
+     next_uid, unit_count, type_count) = HEADER.unpack_from(buffer, offset)
+    if magic != MAGIC:
+        raise ValueError("Это не снимок матча")
+    if version not in READABLE_VERSIONS:
+        raise ValueError(f"Неподдерживаемая версия снимка: {version}")
+    offset += HEADER.size
+    rng_version, gauss = RNG_HEADER.unpack_from(buffer, offset)
+    offset += RNG_HEADER.size
+    rng_internal, offset = _read_column('I', buffer, offset, RNG_WORDS)
+    type_names = []
+    for _ in range(type_count):
+        length = buffer[offset]
+        type_names.append(bytes(buffer[offset + 1:offset + 1 + length]).decode('utf-8'))
+        offset += 1 + length
+    uids, offset = _read_column('I', buffer, offset, unit_count)
+    types, offset = _read_column('B', buffer, offset, unit_count)
+    owners, offset = _read_column('B', buffer, offset, unit_count)
+    unit_flags, offset = _read_column('B', buffer, offset, unit_count)
+    columns = []
+    for _ in FLOAT_COLUMNS:
+        column, offset = _read_column('d', buffer, offset, unit_count)
+        columns.append(column)
+    xs, ys, prev_xs, prev_ys, target_xs, target_ys, hps = columns
+    units = [(uids[k], type_names[types[k]], OWNERS[owners[k]], xs[k], ys[k], prev_xs[k], prev_ys[k],
+              target_xs[k], target_ys[k], hps[k], bool(unit_flags[k] & UNIT_ARRIVED),
+              bool(unit_flags[k] & UNIT_ASLEEP)) for k in range(unit_count)]
+    return {
+        'tick': tick,
+        'time': sim_time,
+        'state': STATES[state_index],
+        'winner': None if winner < 0 else OWNERS[winner],
+        'seed': seed if flags & FLAG_SEED else None,
+        'rng': (rng_version, tuple(rng_internal), gauss if flags & FLAG_GAUSS else None),
+        'size': (width, height, panel_height),
+        'bases': [(player_hp, player_coins), (computer_hp, computer_coins)],
+        'timers': (hire_timer, attack_timer, bool(initial_attack_sent)),
+        'next_uid': next_uid,
+        'units': units,
+    }
+
+
+def save(sim, path):
+    # Запись во временный файл и переименование: убитое посреди записи приложение не портит прошлый снимок
+    data = encode_state(sim.get_state())
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+
+def read_state(path, use_mmap=False, offset=0):
+    # offset — начало снимка в файле из нескольких снимков подряд (ключевые кадры повтора);
+    # через mmap разбирается только он, остальной файл не читается
+    with open(path, 'rb') as snapshot_file:
+        if not use_mmap:
+            snapshot_file.seek(offset)
+            return decode_state(snapshot_file.read())
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_state(mapped, offset)
+
+
+def load(sim, path, use_mmap=False):
+    sim.set_state(read_state(path, use_mmap))
+
+
+# Бенчмарк: снимок матча с заданным числом юнитов в JSON (так хранились ключевые кадры повторов
+# до версии 3) и в двоичном виде
+def run_benchmark(unit_counts=(100, 1000, 5000), repeats=5):
+    from simulation import Simulation, UnitType
+    rng = random.Random(1)
+    print(f"{'юнитов':>8} {'JSON, КБ':>9} {'запись':>8} {'чтение':>8} {'снимок, КБ':>11} {'запись':>8} {'чтение':>8}")
+    for count in unit_counts:
+        sim = Simulation(2000, 1200)
+        sim.start(1)
+        for k in range(count):
+            owner = OWNERS[k % 2]
+            unit_type = rng.choice([UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN])
+            unit = sim.engine.create_unit(sim.archetypes[unit_type],
+                                          rng.uniform(0, 2000), rng.uniform(0, 1200), owner, sim.next_uid)
+            sim.next_uid += 1
+            sim.add_unit(unit)
+        state = sim.get_state()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            text = json.dumps(state)
+        json_write = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for _ in range(repeats):
+            json.loads(text)
+        json_read = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for _ in range(repeats):
+            data = encode_state(state)
+        binary_write = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for _ in range(repeats):
+            decoded = decode_state(data)
+        binary_read = (time.perf_counter() - start) / repeats
+        assert decoded['units'] == [tuple(unit) for unit in state['units']]
+        print(f"{count:>8} {len(text) / 1024:>9.0f} {json_write * 1000:>6.2f}мс {json_read * 1000:>6.2f}мс "
+              f"{len(data) / 1024:>11.0f} {binary_write * 1000:>6.2f}мс {binary_read * 1000:>6.2f}мс")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Бенчмарк двоичных снимков матча")
+    parser.add_argument('--units', type=int, action='append', help="число юнитов (можно несколько раз)")
+    args = parser.parse_args()
+    run_benchmark(tuple(args.units) if args.units else (100, 1000, 5000))
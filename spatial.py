@@ -0,0 +1,174 @@
+import math
+import time
+import random
+from operator import attrgetter
+
+_by_uid = attrgetter('uid')
+
+
+# Равномерная сетка для быстрого поиска соседних юнитов.
+# Каждый юнит лежит ровно в одной ячейке; при перемещении сетка
+# обновляется инкрементально через update().
+class SpatialGrid:
+    def __init__(self, cell_size=40):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.max_size = 0  # Максимальный размер юнита в сетке
+
+    def cell_of(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, unit):
+        cell = self.cell_of(unit.x, unit.y)
+        unit.grid_cell = cell
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            self.cells[cell] = [unit]
+        else:
+            bucket.append(unit)
+        if unit.size > self.max_size:
+            self.max_size = unit.size
+
+    def remove(self, unit):
+        cell = getattr(unit, 'grid_cell', None)
+        bucket = self.cells.get(cell)
+        if bucket is not None and unit in bucket:
+            bucket.remove(unit)
+            if not bucket:
+                del self.cells[cell]
+        unit.grid_cell = None
+
+    def update(self, unit):
+        # Юнит, уже удалённый из сетки (погиб в этом же тике), обратно не вставляем
+        if unit.grid_cell is None:
+            return
+        cell = self.cell_of(unit.x, unit.y)
+        if cell != unit.grid_cell:
+            self.remove(unit)
+            self.insert(unit)
+
+    def rebuild(self, units):
+        self.clear()
+        for unit in units:
+            self.insert(unit)
+
+    def clear(self):
+        self.cells = {}
+        self.max_size = 0
+
+    def query(self, x, y, radius):
+        # Все юниты из ячеек, пересекающих квадрат [x-r, x+r] x [y-r, y+r].
+        # Результат упорядочен по uid, т.е. в порядке найма, как в исходных списках,
+        # поэтому последовательные расталкивания дают тот же результат, что и полный перебор.
+        cs = self.cell_size
+        min_cx = int((x - radius) // cs)
+        max_cx = int((x + radius) // cs)
+        min_cy = int((y - radius) // cs)
+        max_cy = int((y + radius) // cs)
+        cells = self.cells
+        result = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    result.extend(bucket)
+        result.sort(key=_by_uid)
+        return result
+
+    def query_rect(self, min_x, min_y, max_x, max_y):
+        # Все юниты из ячеек, пересекающих прямоугольник; порядок не гарантирован
+        cs = self.cell_size
+        cells = self.cells
+        result = []
+        for cx in range(int(min_x // cs), int(max_x // cs) + 1):
+            for cy in range(int(min_y // cs), int(max_y // cs) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    result.extend(bucket)
+        return result
+
+
+# Проверка точки внутри многоугольника (чётность пересечений луча);
+# points — плоский список координат [x0, y0, x1, y1, ...], как у Line в Kivy
+def point_in_polygon(x, y, points):
+    inside = False
+    count = len(points) // 2
+    j = count - 1
+    for i in range(count):
+        xi, yi = points[2 * i], points[2 * i + 1]
+        xj, yj = points[2 * j], points[2 * j + 1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+# Бенчмарк: стоимость одного тика (расталкивание союзников + поиск контактов с врагами)
+# полным перебором и через сетку в зависимости от количества юнитов.
+class _BenchUnit:
+    def __init__(self, uid, x, y, owner):
+        self.uid = uid
+        self.x = x
+        self.y = y
+        self.size = 20
+        self.owner = owner
+        self.grid_cell = None
+
+
+def _brute_force_tick(player_units, computer_units):
+    all_units = player_units + computer_units
+    contacts = 0
+    for unit in all_units:
+        for other in all_units:
+            if other is not unit and other.owner == unit.owner:
+                math.hypot(unit.x - other.x, unit.y - other.y)
+    for p_unit in player_units:
+        for c_unit in computer_units:
+            if math.hypot(p_unit.x - c_unit.x, p_unit.y - c_unit.y) <= (p_unit.size + c_unit.size) / 2:
+                contacts += 1
+    return contacts
+
+
+def _grid_tick(player_units, computer_units, grids):
+    contacts = 0
+    for unit in player_units + computer_units:
+        grid = grids[unit.owner]
+        for other in grid.query(unit.x, unit.y, (unit.size + grid.max_size) / 2):
+            if other is not unit:
+                math.hypot(unit.x - other.x, unit.y - other.y)
+    enemy_grid = grids["computer"]
+    for p_unit in player_units:
+        for c_unit in enemy_grid.query(p_unit.x, p_unit.y, (p_unit.size + enemy_grid.max_size) / 2):
+            if math.hypot(p_unit.x - c_unit.x, p_unit.y - c_unit.y) <= (p_unit.size + c_unit.size) / 2:
+                contacts += 1
+    return contacts
+
+
+def run_benchmark(counts=(50, 100, 200, 400, 800, 1600), ticks=5, width=1000, height=600):
+    rng = random.Random(1)
+    print(f"{'юнитов':>8} {'перебор, мс/тик':>16} {'сетка, мс/тик':>14} {'ускорение':>10}")
+    for count in counts:
+        units = [_BenchUnit(i, rng.uniform(0, width), rng.uniform(0, height),
+                            "player" if i % 2 == 0 else "computer") for i in range(count)]
+        player_units = [u for u in units if u.owner == "player"]
+        computer_units = [u for u in units if u.owner == "computer"]
+        grids = {"player": SpatialGrid(), "computer": SpatialGrid()}
+        grids["player"].rebuild(player_units)
+        grids["computer"].rebuild(computer_units)
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            expected = _brute_force_tick(player_units, computer_units)
+        brute_ms = (time.perf_counter() - start) * 1000 / ticks
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            found = _grid_tick(player_units, computer_units, grids)
+        grid_ms = (time.perf_counter() - start) * 1000 / ticks
+
+        assert found == expected, "Сетка нашла другое количество контактов"
+        print(f"{count:>8} {brute_ms:>16.2f} {grid_ms:>14.2f} {brute_ms / grid_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    run_benchmark()
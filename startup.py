@@ -0,0 +1,77 @@
+import os
+import time
+
+# Профилирование холодного старта: печатает время каждого этапа от импорта main.py
+# до первого показанного кадра меню, а после нажатия «Играть» — до первого кадра матча.
+# Модуль импортируется первым и сам ничего не тянет.
+# Время импорта отдельных модулей показывает python -X importtime main.py.
+#
+# Включается переменной RTS_STARTUP_PROFILE=1 или файлом startup_profile.json рядом
+# с main.py. Переменную окружения приложению на Android не передать, а файл попадает
+# в сборку (json есть в source.include_exts): touch startup_profile.json перед
+# buildozer android debug, отчёт — в adb logcat. Содержимое файла не читается.
+
+PROFILE_FLAG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_profile.json')
+ENABLED = os.environ.get('RTS_STARTUP_PROFILE') == '1' or os.path.exists(PROFILE_FLAG_PATH)
+
+
+def process_age():
+    # Сколько секунд прошло с запуска процесса (Linux и Android): интерпретатор и загрузчик
+    # приложения до main.py. None, если узнать нельзя
+    try:
+        with open('/proc/self/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupProfiler:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.before = process_age() if enabled else None  # До первой строки main.py
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.stages = []
+
+    def begin(self):
+        # Новый отсчёт, например от нажатия «Играть»
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+        self.before = None
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def report(self, title):
+        if not self.enabled:
+            return
+        print(f"Старт: {title}")
+        if self.before is not None:
+            print(f"  {'запуск процесса до main.py':<32} {self.before * 1000:8.1f} мс")
+        for name, elapsed in self.stages:
+            print(f"  {name:<32} {elapsed * 1000:8.1f} мс")
+        total = self.last - self.start + (self.before or 0)
+        print(f"  {'итого':<32} {total * 1000:8.1f} мс")
+
+    def report_on_first_frame(self, title):
+        # Отчёт после того, как кадр действительно показан (буферы окна переключены)
+        if not self.enabled:
+            return
+        from kivy.core.window import Window
+
+        def on_flip(*args):
+            Window.unbind(on_flip=on_flip)
+            self.mark("первый кадр")
+            self.report(title)
+
+        Window.bind(on_flip=on_flip)
+
+
+profiler = StartupProfiler()
@@ -0,0 +1,49 @@
+import pytest
+from camera import Camera, MAX_ZOOM
+
+PANEL = 60
+MINIMAP = 200
+
+
+def make_camera(zoom=1.0):
+    camera = Camera(3000, 1800, 1000, 600, zoom)
+    camera.set_insets(bottom=PANEL, right=MINIMAP)
+    return camera
+
+
+def test_world_corners_can_leave_the_covered_strips():
+    camera = make_camera()
+    # Вниз и вправо до упора: нижний правый угол мира — над панелью и левее мини-карты
+    camera.pan(-10000, 10000)
+    sx, sy = camera.world_to_screen(3000, 0)
+    assert sx == pytest.approx(1000 - MINIMAP)
+    assert sy == pytest.approx(PANEL)
+    # Вверх и влево до упора: верхний левый угол мира в углу экрана
+    camera.pan(10000, -10000)
+    assert camera.world_to_screen(0, 1800) == pytest.approx((0, 600))
+
+
+def test_center_on_uses_the_open_part_of_the_screen():
+    camera = make_camera()
+    camera.center_on(1500, 900)
+    assert camera.world_to_screen(1500, 900) == pytest.approx(((1000 - MINIMAP) / 2, PANEL + (600 - PANEL) / 2))
+
+
+def test_zoom_keeps_the_point_under_the_finger():
+    camera = make_camera()
+    camera.center_on(1500, 900)
+    before = camera.screen_to_world(300, 400)
+    camera.zoom_at(1.5, 300, 400)
+    assert camera.screen_to_world(300, 400) == pytest.approx(before)
+    camera.zoom_at(100, 300, 400)
+    assert camera.zoom == MAX_ZOOM
+
+
+def test_fully_zoomed_out_world_fits_above_the_panel():
+    camera = make_camera()
+    camera.zoom_at(0.01, 500, 300)
+    assert camera.zoom == pytest.approx(min((1000 - MINIMAP) / 3000, (600 - PANEL) / 1800))
+    left, bottom = camera.world_to_screen(0, 0)
+    right, top = camera.world_to_screen(3000, 1800)
+    assert left >= -1e-9 and bottom >= PANEL - 1e-9
+    assert right <= 1000 - MINIMAP + 1e-9 and top <= 600 + 1e-9
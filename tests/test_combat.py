@@ -0,0 +1,47 @@
+import pytest
+from simulation import Simulation, UnitType
+
+
+def make_sim():
+    sim = Simulation(1600, 900)
+    sim.ai_mode = 'remote'
+    sim.start(1)
+    sim.clear_units()
+    return sim
+
+
+def add(sim, unit_type, x, y, owner):
+    unit = sim.engine.create_unit(sim.archetypes[unit_type], x, y, owner, sim.next_uid)
+    sim.next_uid += 1
+    sim.add_unit(unit)
+    return unit
+
+
+@pytest.mark.parametrize('dt', (1 / 120., 1 / 60., 1 / 30.))
+def test_damage_is_per_second(dt):
+    sim = make_sim()
+    pikeman = add(sim, UnitType.PIKEMAN, 500, 400, "player")
+    cavalry = add(sim, UnitType.CAVALRY, 505, 400, "computer")
+    pikeman_hp, cavalry_hp = pikeman.hp, cavalry.hp
+    sim.engine.fight_units(sim, dt)
+    # Урон за тик — урон в секунду «тип против типа», умноженный на длину шага
+    assert (cavalry_hp - cavalry.hp) / dt == pytest.approx(pikeman.archetype.damage_vs[cavalry.archetype.index])
+    assert (pikeman_hp - pikeman.hp) / dt == pytest.approx(cavalry.archetype.damage_vs[pikeman.archetype.index])
+
+
+def test_the_dead_leave_in_one_batch_after_the_fight():
+    sim = make_sim()
+    swordsman = add(sim, UnitType.SWORDSMAN, 500, 400, "computer")
+    # Три раненых юнита игрока вокруг одного мечника: каждый бьёт и погибает в этом же тике
+    wounded = [add(sim, UnitType.CAVALRY, 500 + dx, 400 + dy, "player") for dx, dy in ((-6, 0), (6, 0), (0, 6))]
+    for unit in wounded:
+        unit.hp = 1e-6
+    swordsman_hp = swordsman.hp
+    sim.engine.fight_units(sim, 1 / 60.)
+    assert sim.player_units == []
+    assert not any(sim.engine.grids["player"].cells.values())
+    assert all(unit.uid not in sim.units_by_uid for unit in wounded)
+    # Погибшие успели ударить все трое
+    damage = wounded[0].archetype.damage_vs[swordsman.archetype.index] / 60.
+    assert swordsman_hp - swordsman.hp == pytest.approx(3 * damage)
+    assert sim.engine.contacts.engaged(sim) == []
@@ -0,0 +1,61 @@
+import random
+from density import DensityGrid, SATURATION
+from simulation import Simulation, UnitType
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def brute_force_counts(grid, units):
+    counts = [0] * (grid.cols * grid.rows)
+    for unit in units:
+        counts[grid.index(unit.x, unit.y)] += 1
+    return counts
+
+
+def test_incremental_update_matches_a_full_count():
+    sim = Simulation(3000, 1800)
+    rng = random.Random(6)
+    for uid in range(600):
+        owner = "player" if uid % 2 == 0 else "computer"
+        unit = sim.engine.create_unit(sim.archetypes[rng.choice(TYPES)],
+                                      rng.uniform(0, 3000), rng.uniform(0, 1800), owner, uid)
+        sim.add_unit(unit)
+    grid = DensityGrid(3000, 1800)
+    for unit in sim.player_units + sim.computer_units:
+        grid.add(unit)
+    parts = 3
+    for _ in range(5):
+        # Сдвиги в пределах мира и за его край: крайние клетки принимают вылетевших
+        for unit in sim.player_units + sim.computer_units:
+            unit.x += rng.uniform(-60, 60)
+            unit.y += rng.uniform(-60, 60)
+        for part in range(parts):
+            grid.update((sim.player_units, sim.computer_units), part, parts)
+        for owner in ("player", "computer"):
+            assert list(grid.counts[owner]) == brute_force_counts(grid, sim.units_of(owner))
+    for unit in sim.player_units[:100]:
+        grid.remove(unit)
+    assert list(grid.counts["player"]) == brute_force_counts(grid, sim.player_units[100:])
+
+
+def test_flush_repaints_only_changed_cells():
+    sim = Simulation(1000, 500)
+    grid = DensityGrid(1000, 500)
+    archetype = sim.archetypes[UnitType.PIKEMAN]
+    units = [sim.engine.create_unit(archetype, 110, 60, "player", uid) for uid in range(SATURATION + 2)]
+    units.append(sim.engine.create_unit(archetype, 610, 260, "computer", len(units)))
+    for unit in units:
+        grid.add(unit)
+    version = grid.version
+    assert grid.flush()
+    assert grid.version == version + 1
+    k = grid.index(110, 60) * 4
+    assert tuple(grid.pixels[k:k + 4]) == (255, 0, 0, 255)
+    k = grid.index(610, 260) * 4
+    assert tuple(grid.pixels[k:k + 4]) == (0, 0, 255 // SATURATION, 255 // SATURATION)
+    # Без изменений перерисовывать нечего, спящих юнитов update не трогает
+    assert not grid.flush()
+    units[-1].asleep = True
+    units[-1].x = 110
+    grid.update((units[:-1], units[-1:]))
+    assert not grid.flush()
@@ -0,0 +1,36 @@
+import pytest
+from simulation import Simulation, FixedStepLoop, SIM_STEP
+
+
+def run_frames(frame_times, seed=4):
+    sim = Simulation(1600, 900)
+    sim.start(seed)
+    loop = FixedStepLoop(sim)
+    for frame_dt in frame_times:
+        loop.advance(frame_dt)
+    return sim, loop
+
+
+def test_frame_rate_does_not_change_the_match():
+    # Те же 10.5 с игры кадрами 144, 60 и неровными 20–40 Гц; последние полшага —
+    # запас на ошибки округления суммы кадров
+    uneven = [1 / 20., 1 / 40., 1 / 40.] * 105
+    runs = [run_frames(frames + [SIM_STEP / 2]) for frames in ([1 / 144.] * 1512, [1 / 60.] * 630, uneven)]
+    ticks = {sim.tick for sim, _ in runs}
+    checksums = {sim.checksum() for sim, _ in runs}
+    assert ticks == {630}
+    assert len(checksums) == 1
+
+
+def test_slow_frame_is_capped_and_the_rest_dropped():
+    sim, loop = run_frames([1.0])
+    assert sim.tick == FixedStepLoop.MAX_STEPS
+    # Время кадра делится без остатка: шаги, отброшенное и недобранное до следующего шага
+    assert sim.tick * SIM_STEP + loop.dropped_time + loop.accumulator == pytest.approx(1.0)
+    assert 0 <= loop.accumulator < SIM_STEP
+
+
+def test_alpha_is_the_share_of_the_next_step():
+    sim, loop = run_frames([SIM_STEP * 2.25])
+    assert sim.tick == 2
+    assert loop.advance(0) == pytest.approx(0.25)
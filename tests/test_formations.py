@@ -0,0 +1,71 @@
+import random
+import pytest
+from simulation import Simulation, UnitType
+from formations import FORMATIONS, LINE_RANK, FormationCache, build_layout, assign_slots
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def make_units(count, seed=1):
+    sim = Simulation(3000, 1800)
+    rng = random.Random(seed)
+    units = []
+    for uid in range(count):
+        unit = sim.engine.create_unit(sim.archetypes[rng.choice(TYPES)],
+                                      rng.uniform(500, 900), rng.uniform(500, 900), "player", uid)
+        sim.add_unit(unit)
+        units.append(unit)
+    return sim, units
+
+
+@pytest.mark.parametrize('formation', FORMATIONS)
+def test_layout_has_one_slot_per_unit(formation):
+    for count in range(1, 80):
+        layout = build_layout(formation, count)
+        assert sum(len(laterals) for _, laterals in layout) == count
+        if formation == 'line':
+            assert max(len(laterals) for _, laterals in layout) <= LINE_RANK
+        if formation == 'wedge':
+            assert [len(laterals) for _, laterals in layout[:-1]] == [1 + 2 * k for k in range(len(layout) - 1)]
+
+
+@pytest.mark.parametrize('formation', FORMATIONS)
+def test_every_unit_gets_its_own_slot(formation):
+    sim, units = make_units(37)
+    assigned = assign_slots(units, build_layout(formation, len(units)), 2000, 1000, sim.get_boundaries())
+    assert sorted(unit.uid for unit, _, _ in assigned) == [unit.uid for unit in units]
+    slots = {(round(x, 6), round(y, 6)) for _, x, y in assigned}
+    assert len(slots) == len(units)
+
+
+def test_slots_are_clamped_to_the_world():
+    sim, units = make_units(60)
+    min_x, max_x, min_y, max_y = sim.get_boundaries()
+    for target_x, target_y in ((0, 0), (3000, 1800), (3000, 0), (10, 900)):
+        for formation in FORMATIONS:
+            layout = build_layout(formation, len(units))
+            for unit, x, y in assign_slots(units, layout, target_x, target_y, sim.get_boundaries()):
+                half_size = unit.size / 2
+                assert min_x + half_size <= x <= max_x - half_size
+                assert min_y + half_size <= y <= max_y - half_size
+
+
+def test_cache_reuses_layouts_and_evicts_the_least_recent():
+    cache = FormationCache(capacity=2)
+    box = cache.get('box', 10)
+    assert cache.get('box', 10) is box
+    cache.get('line', 10)
+    cache.get('box', 10)  # Каре снова свежее линии
+    cache.get('wedge', 10)  # Вытесняет линию
+    assert cache.builds == 3
+    assert cache.get('box', 10) is box
+    cache.get('line', 10)
+    assert cache.builds == 4
+
+
+def test_single_unit_and_no_formation_go_to_the_point():
+    sim, units = make_units(5)
+    sim.order_move(units[:1], 1200, 700, 'box')
+    assert (units[0].target_x, units[0].target_y) == (1200, 700)
+    sim.order_move(units, 1300, 800)
+    assert all((unit.target_x, unit.target_y) == (1300, 800) for unit in units)
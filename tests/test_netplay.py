@@ -0,0 +1,17 @@
+from simulation import Simulation, UnitType
+from netplay import LockstepSession
+
+
+def test_remote_commands_for_the_other_side_are_dropped():
+    sent = []
+    session = LockstepSession(Simulation(), "player", sent.append, delay=2)
+    session.start(1)
+    # Гость шлёт на шаг 2 свой найм и поддельный найм от имени хоста
+    session.receive(['input', 0, 2, [['hire', 'computer', UnitType.PIKEMAN],
+                                     ['hire', 'player', UnitType.CAVALRY]], 0, None])
+    assert session.inputs["computer"][2] == [('hire', 'computer', UnitType.PIKEMAN)]
+    assert session.rejected == 1
+    player_units = len(session.sim.player_units)
+    for _ in range(3):
+        session.step()
+    assert len(session.sim.player_units) == player_units
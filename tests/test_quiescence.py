@@ -0,0 +1,40 @@
+import random
+from simulation import Simulation, UnitType, SIM_STEP
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def crowd_sent_to_point(seed, count=100):
+    # Толпа, нанятая у базы игрока, идёт в одну точку; ИИ компьютера не мешает
+    sim = Simulation(3000, 1800)
+    sim.start(seed)
+    sim.initial_attack_delay = sim.computer_hire_interval = sim.computer_attack_interval = 1e9
+    sim.player_base.coins = 1e9
+    rng = random.Random(seed)
+    for _ in range(count):
+        sim.spawn_unit(rng.choice(TYPES), "player")
+    sim.order_move(list(sim.player_units), rng.uniform(0, 3000), rng.uniform(0, 1700))
+    return sim
+
+
+def ticks_until_quiescent(sim, limit):
+    for tick in range(limit):
+        sim.step(SIM_STEP)
+        if sim.is_quiescent():
+            return tick
+    return None
+
+
+def test_settled_crowd_goes_idle():
+    # Зажатые в толпе юниты дрожат на ошибках округления и не засыпают — поле всё равно замерло
+    for seed in (0, 3, 5):
+        sim = crowd_sent_to_point(seed)
+        assert ticks_until_quiescent(sim, 3000) is not None, seed
+        assert all(unit.arrived for unit in sim.player_units)
+
+
+def test_moving_crowd_is_not_quiescent():
+    sim = crowd_sent_to_point(3)
+    for _ in range(10):
+        sim.step(SIM_STEP)
+        assert not sim.is_quiescent()
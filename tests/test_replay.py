@@ -0,0 +1,47 @@
+import random
+from simulation import Simulation, UnitType, SIM_STEP
+from replay import Replay, ReplayRecorder, ReplayPlayer
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def record_match(seed, ticks=3600):
+    # Игрок нанимает и водит армию к базе компьютера, компьютер играет эвристикой
+    sim = Simulation(1600, 900)
+    recorder = ReplayRecorder(keyframe_interval=300)
+    recorder.attach(sim)
+    sim.start(seed)
+    rng = random.Random(seed)
+    checksums = {}
+    while sim.state == 'playing' and sim.tick < ticks:
+        if sim.tick % 45 == 0:
+            sim.execute(('hire', "player", rng.choice(TYPES)))
+        if sim.tick % 90 == 60:
+            uids = [unit.uid for unit in sim.player_units if rng.random() < 0.7]
+            sim.execute(('move', "player", uids, rng.uniform(800, 1600), rng.uniform(0, 900), rng.choice((None, 'box'))))
+        sim.step(SIM_STEP)
+        checksums[sim.tick] = sim.checksum()
+    return sim, recorder.replay, checksums
+
+
+def test_replay_reproduces_the_match():
+    for seed in (1, 8):
+        sim, replay, checksums = record_match(seed)
+        assert replay.commands and replay.ai_decisions and replay.keyframes
+        player = ReplayPlayer(Replay.from_bytes(replay.to_bytes()))
+        for tick in range(1, sim.tick + 1):
+            player.step()
+            assert player.sim.checksum() == checksums[tick], (seed, tick)
+        assert player.done()
+        assert player.desyncs == []
+        assert (player.sim.winner, player.sim.tick) == (sim.winner, replay.length)
+
+
+def test_recorder_attached_mid_match_waits_for_the_next_one():
+    sim = Simulation(1600, 900)
+    sim.start(3)
+    recorder = ReplayRecorder()
+    recorder.attach(sim)
+    for _ in range(10):
+        sim.step(SIM_STEP)
+    assert recorder.replay is None
@@ -0,0 +1,74 @@
+import random
+import snapshot
+from simulation import Simulation, UnitType, SIM_STEP
+from replay import Replay, ReplayRecorder, ReplayPlayer
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def start_match(seed=5):
+    sim = Simulation(1600, 900)
+    sim.start(seed)
+    sim.player_base.coins = sim.computer_base.coins = 1e6
+    # Базы не падают: матч идёт всё время проверки
+    sim.player_base.hp = sim.computer_base.hp = 1e9
+    return sim
+
+
+def play(sim, ticks, rng):
+    # Игрок нанимает и раз в секунду шлёт всех к базе компьютера; компьютер — своей эвристикой
+    for _ in range(ticks):
+        if sim.tick % 20 == 0:
+            sim.execute(('hire', "player", rng.choice(TYPES)))
+        if sim.tick % 60 == 30:
+            uids = sorted(unit.uid for unit in sim.player_units)
+            sim.execute(('move', "player", uids, sim.computer_base.x, sim.computer_base.y))
+        sim.step(SIM_STEP)
+
+
+def test_checksum_survives_encode_decode_and_continue():
+    sim = start_match()
+    play(sim, 900, random.Random(1))
+    assert sim.player_units and sim.computer_units
+    restored = Simulation(1600, 900)
+    restored.set_state(snapshot.decode_state(snapshot.encode_state(sim.get_state())))
+    assert restored.checksum() == sim.checksum()
+    # Продолжение с одинаковыми командами: суммы совпадают после каждой секунды
+    original_rng, restored_rng = random.Random(2), random.Random(2)
+    for _ in range(10):
+        play(sim, 60, original_rng)
+        play(restored, 60, restored_rng)
+        assert restored.checksum() == sim.checksum()
+    assert sim.tick == 1500
+
+
+def test_replay_keyframes_are_read_from_the_sidecar(tmp_path):
+    sim = start_match()
+    recorder = ReplayRecorder(keyframe_interval=300)
+    recorder.attach(sim)
+    recorder.begin(sim)
+    checksums = {}
+    rng = random.Random(3)
+    for _ in range(1200):
+        play(sim, 1, rng)
+        checksums[sim.tick] = sim.checksum()
+    path = str(tmp_path / 'match.rpl')
+    recorder.replay.save(path)
+
+    replay = Replay.load(path)
+    assert [tick for tick, _ in replay.keyframes] == [300, 600, 900, 1200]
+    # Кадры в повторе не хранятся: только смещения снимков в файле .keys
+    assert replay.keyframe_blobs == []
+    state = replay.keyframe_state(2)
+    assert state['tick'] == 900
+    assert snapshot.read_state(path + '.keys', offset=replay.keyframe_offsets[2])['units'] == state['units']
+
+    player = ReplayPlayer(replay)
+    player.seek(1000)
+    assert player.sim.tick == 1000
+    assert player.sim.checksum() == checksums[1000]
+    player.seek(650)
+    assert player.sim.checksum() == checksums[650]
+    player.run_uncapped()
+    assert player.sim.checksum() == checksums[1200]
+    assert player.desyncs == []
@@ -0,0 +1,79 @@
+import math
+import random
+from simulation import Simulation, UnitType
+
+TYPES = (UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN)
+
+
+def place_crowd(sim, count, seed, area=300):
+    # Плотная толпа обеих сторон в одном квадрате: касаний много, часть юнитов в одной точке
+    rng = random.Random(seed)
+    for uid in range(count):
+        owner = "player" if uid % 2 == 0 else "computer"
+        x = rng.uniform(100, 100 + area)
+        y = rng.uniform(100, 100 + area)
+        unit = sim.engine.create_unit(sim.archetypes[rng.choice(TYPES)], x, y, owner, uid)
+        sim.add_unit(unit)
+    sim.next_uid = count
+    return rng
+
+
+def brute_force_allies(sim, unit):
+    return [other for other in sim.units_of(unit.owner) if other is not unit and
+            math.hypot(unit.x - other.x, unit.y - other.y) < unit.archetype.half_size + other.archetype.half_size]
+
+
+def brute_force_contacts(sim):
+    # Полный перебор O(n²) в том же порядке, что и у кэша: юниты игрока, затем uid врага
+    return [(p_unit, c_unit) for p_unit in sim.player_units for c_unit in sim.computer_units
+            if math.hypot(p_unit.x - c_unit.x, p_unit.y - c_unit.y)
+            <= p_unit.archetype.half_size + c_unit.archetype.half_size]
+
+
+def test_grid_query_returns_every_touching_ally_in_hire_order():
+    sim = Simulation()
+    place_crowd(sim, 400, seed=1)
+    for unit in sim.player_units + sim.computer_units:
+        grid = sim.engine.grids[unit.owner]
+        found = grid.query(unit.x, unit.y, unit.archetype.half_size + grid.max_size / 2)
+        assert [other.uid for other in found] == sorted(other.uid for other in found)
+        assert set(brute_force_allies(sim, unit)) <= set(found)
+
+
+def test_contact_pairs_match_brute_force_while_units_move():
+    sim = Simulation()
+    rng = place_crowd(sim, 400, seed=2)
+    engine = sim.engine
+    for _ in range(30):
+        engine.contacts.refresh(sim, engine.grids)
+        assert engine.contacts.engaged(sim) == brute_force_contacts(sim)
+        # Сдвиги меньше и больше запаса кэша: часть юнитов опрашивает сетку заново
+        for unit in sim.player_units + sim.computer_units:
+            step = rng.choice((0.5, 1.5, 6))
+            unit.x += rng.uniform(-step, step)
+            unit.y += rng.uniform(-step, step)
+            engine.grids[unit.owner].update(unit)
+
+
+def test_units_in_rect_matches_brute_force():
+    sim = Simulation()
+    place_crowd(sim, 400, seed=3)
+    for owner in ("player", "computer"):
+        found = sim.units_in_rect(owner, 150, 120, 260, 330)
+        expected = [unit for unit in sim.units_of(owner) if 150 <= unit.x <= 260 and 120 <= unit.y <= 330]
+        assert sorted(unit.uid for unit in found) == [unit.uid for unit in expected]
+
+
+def test_small_push_across_a_cell_border_moves_the_unit_in_the_grid():
+    # Перекрытие меньше REST_OVERLAP: юнит сдвигается на доли пикселя в соседнюю ячейку
+    sim = Simulation()
+    grid = sim.engine.grids["player"]
+    archetype = sim.archetypes[UnitType.PIKEMAN]
+    left = sim.engine.create_unit(archetype, grid.cell_size + 0.1, 200, "player", 0)
+    right = sim.engine.create_unit(archetype, left.x + archetype.size - 0.4, 200, "player", 1)
+    sim.add_unit(left)
+    sim.add_unit(right)
+    left.separate(grid, 0)
+    assert left.x < grid.cell_size
+    assert left.grid_cell == grid.cell_of(left.x, left.y)
+    assert left in grid.query(left.x, left.y, 1)
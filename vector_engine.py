@@ -0,0 +1,405 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него работает GridEngine
+    np = None
+
+from simulation import Unit, Simulation, UnitType
+from events import DAMAGE, KILL, BASE_HIT
+
+# Движок на NumPy: все юниты одного владельца хранятся в непрерывных массивах
+# (структура массивов), движение, границы, расталкивание и обмен уроном
+# считаются пакетно. Объекты Unit остаются, но их поля читают и пишут массивы.
+#
+# В отличие от GridEngine, расталкивание и урон применяются одновременно для всех
+# пар (а не по очереди в порядке найма), поэтому результат совпадает с исходным
+# кодом с точностью до порядка обработки пар.
+
+ARRAY_FIELDS = ('uid', 'x', 'y', 'prev_x', 'prev_y', 'target_x', 'target_y', 'arrived', 'asleep', 'hp',
+                'damage', 'speed', 'size', 'kind')
+# Характеристики типа копируются в массивы при создании юнита, чтобы считать пакетно
+ARCHETYPE_FIELDS = ('damage', 'speed', 'size')
+
+
+def available():
+    return np is not None
+
+
+# Массивы хранят всё как float64; convert возвращает полю его настоящий тип
+# (uid — int, флаги — bool), иначе struct.pack в снимках и контрольной сумме падает
+def _array_property(name, convert=float):
+    def getter(self):
+        store = self.store
+        if store is None:
+            return convert(self.detached[name])
+        return convert(store.arrays[name][self.slot])
+
+    def setter(self, value):
+        store = self.store
+        if store is None:
+            self.detached[name] = value
+        else:
+            store.arrays[name][self.slot] = value
+
+    return property(getter, setter)
+
+
+# Юнит, числовые поля которого лежат в массивах UnitStore.
+# Пока юнит не добавлен в хранилище (или уже удалён из него), значения живут в detached.
+class ArrayUnit(Unit):
+    def __init__(self, archetype, x, y, owner, uid=0):
+        self.store = None
+        self.slot = -1
+        self.detached = {name: getattr(archetype, name) for name in ARCHETYPE_FIELDS}
+        self.detached['kind'] = archetype.index  # Номер архетипа в матрице урона
+        super(ArrayUnit, self).__init__(archetype, x, y, owner, uid)
+
+    uid = _array_property('uid', int)
+    x = _array_property('x')
+    y = _array_property('y')
+    prev_x = _array_property('prev_x')
+    prev_y = _array_property('prev_y')
+    target_x = _array_property('target_x')
+    target_y = _array_property('target_y')
+    arrived = _array_property('arrived', bool)
+    asleep = _array_property('asleep', bool)  # Пакетному движку пропуск спящих не нужен, флаг всегда сброшен
+    hp = _array_property('hp')
+    damage = _array_property('damage')
+    speed = _array_property('speed')
+    size = _array_property('size')
+
+
+# Массивы юнитов одного владельца; удаление — перестановкой последнего элемента на место удалённого
+class UnitStore:
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.units = []
+        self.arrays = {name: np.zeros(capacity) for name in ARRAY_FIELDS}
+
+    def view(self, name):
+        return self.arrays[name][:self.count]
+
+    def grow(self):
+        for name, array in self.arrays.items():
+            bigger = np.zeros(len(array) * 2)
+            bigger[:self.count] = array[:self.count]
+            self.arrays[name] = bigger
+
+    def append(self, unit):
+        if self.count == len(self.arrays['x']):
+            self.grow()
+        slot = self.count
+        for name in ARRAY_FIELDS:
+            self.arrays[name][slot] = unit.detached[name]
+        unit.store = self
+        unit.slot = slot
+        self.units.append(unit)
+        self.count += 1
+
+    def remove(self, unit):
+        slot = unit.slot
+        last = self.count - 1
+        unit.detached = {name: float(self.arrays[name][slot]) for name in ARRAY_FIELDS}
+        if slot != last:
+            for array in self.arrays.values():
+                array[slot] = array[last]
+            moved = self.units[last]
+            self.units[slot] = moved
+            moved.slot = slot
+        self.units.pop()
+        self.count -= 1
+        unit.store = None
+        unit.slot = -1
+
+    def clear(self):
+        for unit in list(self.units):
+            self.remove(unit)
+
+
+# Сдвиги на 9 соседних ячеек (включая свою)
+_NEIGHBOUR_X = np.repeat(np.arange(-1, 2), 3)[:, None] if np is not None else None
+_NEIGHBOUR_Y = np.tile(np.arange(-1, 2), 3)[:, None] if np is not None else None
+
+
+# Пары кандидатов через сортировку по ячейкам сетки: для каждой точки A и каждой
+# из 9 соседних ячеек находится диапазон точек B в этой ячейке, затем диапазоны
+# разворачиваются в плоские массивы индексов. Стоимость O(n log n + число пар);
+# все 9 соседей обрабатываются одним набором вызовов NumPy
+def _candidate_pairs(ax, ay, bx, by, cell_size, same):
+    if len(ax) == 0 or len(bx) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    stride = np.int64(1 << 21)
+    b_cx = np.floor(bx / cell_size).astype(np.int64)
+    b_cy = np.floor(by / cell_size).astype(np.int64)
+    b_keys = b_cx * stride + b_cy
+    order = np.argsort(b_keys, kind='stable')
+    sorted_keys = b_keys[order]
+    a_cx = np.floor(ax / cell_size).astype(np.int64)
+    a_cy = np.floor(ay / cell_size).astype(np.int64)
+    a_index = np.tile(np.arange(len(ax)), 9)
+
+    keys = ((a_cx + _NEIGHBOUR_X) * stride + (a_cy + _NEIGHBOUR_Y)).ravel()
+    start = np.searchsorted(sorted_keys, keys, side='left')
+    counts = np.searchsorted(sorted_keys, keys, side='right') - start
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    i = np.repeat(a_index, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = order[np.repeat(start, counts) + offsets]
+    if same:
+        keep = i < j
+        i = i[keep]
+        j = j[keep]
+    return i, j
+
+
+class NumpyEngine:
+    def __init__(self, cell_size=40):
+        if np is None:
+            raise ImportError("Для NumpyEngine нужен пакет numpy")
+        self.cell_size = cell_size
+        self.stores = {"player": UnitStore(), "computer": UnitStore()}
+        self.damage_source = None
+        self.damage_matrix = None
+
+    def create_unit(self, archetype, x, y, owner, uid):
+        return ArrayUnit(archetype, x, y, owner, uid)
+
+    def add_unit(self, unit):
+        self.stores[unit.owner].append(unit)
+
+    def remove_unit(self, unit):
+        if unit.store is not None:
+            unit.store.remove(unit)
+
+    def clear(self):
+        for store in self.stores.values():
+            store.clear()
+
+    def store_previous(self, sim):
+        for store in self.stores.values():
+            store.view('prev_x')[:] = store.view('x')
+            store.view('prev_y')[:] = store.view('y')
+
+    def move_units(self, sim, dt, boundaries):
+        min_x, max_x, min_y, max_y = boundaries
+        for store in self.stores.values():
+            if store.count == 0:
+                continue
+            x = store.view('x')
+            y = store.view('y')
+            speed = store.view('speed')
+            half_size = store.view('size') / 2
+
+            # Движение к цели
+            target_x = store.view('target_x')
+            target_y = store.view('target_y')
+            dx = target_x - x
+            dy = target_y - y
+            distance = np.hypot(dx, dy)
+            arrived = store.view('arrived')
+            moving = (distance > 5) & (arrived == 0)
+            arrived[distance <= 5] = 1
+            safe = np.where(moving, distance, 1.0)
+            step = speed * dt / safe
+            new_x = np.clip(x + dx * step, min_x + half_size, max_x - half_size)
+            new_y = np.clip(y + dy * step, min_y + half_size, max_y - half_size)
+            x[moving] = new_x[moving]
+            y[moving] = new_y[moving]
+
+    def separate_units(self, sim, dt):
+        # Позиции на начало шага — это позиции до движения
+        for store in self.stores.values():
+            if store.count:
+                self.separate(store, store.view('prev_x'), store.view('prev_y'))
+
+    def separate(self, store, old_x, old_y):
+        # В исходном коде юниты двигаются и расталкиваются по очереди в порядке найма:
+        # более ранний юнит отталкивается от ещё не сдвинутого позднего (старая позиция),
+        # а поздний — от уже сдвинутого раннего. Здесь то же правило применяется пакетно.
+        x = store.view('x')
+        y = store.view('y')
+        size = store.view('size')
+        uid = store.view('uid')
+        arrived = store.view('arrived')
+        target_x = store.view('target_x')
+        target_y = store.view('target_y')
+        i, j = _candidate_pairs(x, y, x, y, self.cell_size, same=True)
+        if len(i) == 0:
+            return
+        swap = uid[i] > uid[j]
+        i, j = np.where(swap, j, i), np.where(swap, i, j)  # i — нанят раньше j
+        min_dist = (size[i] + size[j]) / 2
+        # Сначала ранние юниты отталкиваются от старых позиций поздних,
+        # затем поздние — от уже сдвинутых ранних
+        for unit, other, other_x, other_y in ((i, j, old_x, old_y), (j, i, x, y)):
+            dx = x[unit] - other_x[other]
+            dy = y[unit] - other_y[other]
+            dist = np.hypot(dx, dy)
+            hit = (dist < min_dist) & (dist != 0)
+            # Упёрся в дошедшего юнита с той же целью — тоже дошёл
+            chain = hit & (arrived[other] > 0) & (target_x[unit] == target_x[other]) & (target_y[unit] == target_y[other])
+            arrived[unit[chain]] = 1
+            # Сдвиг на половину перекрытия от другого юнита
+            push = np.where(hit, (min_dist - dist) / 2 / np.where(hit, dist, 1.0), 0.0)
+            x += np.bincount(unit, dx * push, store.count)
+            y += np.bincount(unit, dy * push, store.count)
+
+    def fight_units(self, sim, dt):
+        # Удаление погибших юнитов одним пакетом в конце тика
+        dead = self.fight(sim, self.stores["player"], self.stores["computer"], dt)
+        if dead:
+            sim.remove_units(dead)
+
+    def units_in_rect(self, sim, owner, min_x, min_y, max_x, max_y):
+        store = self.stores[owner]
+        x = store.view('x')
+        y = store.view('y')
+        hits = np.nonzero((x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))[0]
+        return [store.units[slot] for slot in hits]
+
+    def attack_bases(self, sim, dt):
+        self.attack_base(sim, self.stores["player"], sim.computer_base, dt)
+        self.attack_base(sim, self.stores["computer"], sim.player_base, dt)
+
+    def damage_table(self, table):
+        # Матрица урона архетипов (строка — атакующий) строится один раз на таблицу архетипов
+        if self.damage_source is not table:
+            self.damage_source = table
+            self.damage_matrix = np.array([archetype.damage_vs for archetype in table])
+        return self.damage_matrix
+
+    def fight(self, sim, player, computer, dt):
+        # Как и в GridEngine, уроном обмениваются все касающиеся пары врагов, а не только
+        # ближайшие; пары упорядочены по uid юнита игрока и uid врага, как в кэше контактов.
+        # Возвращает погибших в этом тике
+        px, py = player.view('x'), player.view('y')
+        cx, cy = computer.view('x'), computer.view('y')
+        i, j = _candidate_pairs(px, py, cx, cy, self.cell_size, same=False)
+        if len(i) == 0:
+            return []
+        dx = px[i] - cx[j]
+        dy = py[i] - cy[j]
+        dist = np.hypot(dx, dy)
+        min_dist = (player.view('size')[i] + computer.view('size')[j]) / 2
+        hit = np.nonzero(dist <= min_dist)[0]
+        if len(hit) == 0:
+            return []
+        order = hit[np.lexsort((computer.view('uid')[j[hit]], player.view('uid')[i[hit]]))]
+        i, j, dx, dy, dist, min_dist = i[order], j[order], dx[order], dy[order], dist[order], min_dist[order]
+
+        # Наносим урон друг другу: урон в секунду с множителем «тип против типа»
+        damage_table = self.damage_table(sim.archetypes)
+        kinds = len(damage_table)
+        player_kind = player.view('kind')[i].astype(np.int64)
+        computer_kind = computer.view('kind')[j].astype(np.int64)
+        damage_to_computer = damage_table[player_kind, computer_kind] * dt
+        damage_to_player = damage_table[computer_kind, player_kind] * dt
+        computer.view('hp')[:] -= np.bincount(j, damage_to_computer, computer.count)
+        player.view('hp')[:] -= np.bincount(i, damage_to_player, player.count)
+        # Урон за тик пишется в журнал одной суммой на сочетание «тип против типа»
+        if sim.events.enabled:
+            names = [archetype.name for archetype in sim.archetypes.by_index]
+            for owner, attacker, target, damage in (("player", player_kind, computer_kind, damage_to_computer),
+                                                    ("computer", computer_kind, player_kind, damage_to_player)):
+                totals = np.bincount(attacker * kinds + target, damage, kinds * kinds)
+                for combo in np.nonzero(totals)[0]:
+                    sim.events.emit(DAMAGE, sim.time, owner, names[combo // kinds], names[combo % kinds],
+                                    float(totals[combo]))
+
+        # Отталкивание юнитов друг от друга; при совпадении позиций — вправо.
+        # В последовательном проходе первая пара уже расталкивает юнит, и следующие
+        # двигают его мало, поэтому сдвиги от нескольких врагов усредняются, а не складываются
+        zero = dist == 0
+        safe = np.where(zero, 1.0, dist)
+        ox = np.where(zero, 1.0, dx / safe)
+        oy = np.where(zero, 0.0, dy / safe)
+        half = (min_dist - dist + 1) / 2
+        player_contacts = np.maximum(np.bincount(i, minlength=player.count), 1)
+        computer_contacts = np.maximum(np.bincount(j, minlength=computer.count), 1)
+        px += np.bincount(i, ox * half, player.count) / player_contacts
+        py += np.bincount(i, oy * half, player.count) / player_contacts
+        cx -= np.bincount(j, ox * half, computer.count) / computer_contacts
+        cy -= np.bincount(j, oy * half, computer.count) / computer_contacts
+
+        # Погибший засчитывается первому в порядке пар врагу, с которым он дрался
+        dead = []
+        for store, killer, victims, killers, killer_kind in (
+                (player, "computer", i, j, computer_kind), (computer, "player", j, i, player_kind)):
+            slots, first = np.unique(victims, return_index=True)
+            for slot, pair in zip(slots, first):
+                if store.view('hp')[slot] <= 0:
+                    unit = store.units[slot]
+                    dead.append(unit)
+                    sim.events.emit(KILL, sim.time, killer, sim.archetypes.by_index[killer_kind[pair]].name,
+                                    unit.type, 1)
+        return dead
+
+    def attack_base(self, sim, store, base, dt):
+        if store.count == 0:
+            return
+        x = store.view('x')
+        y = store.view('y')
+        dx = x - base.x
+        dy = y - base.y
+        distance = np.hypot(dx, dy)
+        min_dist = store.view('size') / 2 + base.radius
+        hit = distance <= min_dist
+        if not hit.any():
+            return
+        damage = store.view('damage')[hit] * dt
+        base.take_damage(float(damage.sum()))
+        # В журнал — сумма урона по каждому типу нападающих
+        if sim.events.enabled:
+            owner = store.units[0].owner
+            totals = np.bincount(store.view('kind')[hit].astype(np.int64), damage, len(sim.archetypes.by_index))
+            for kind in np.nonzero(totals)[0]:
+                sim.events.emit(BASE_HIT, sim.time, owner, sim.archetypes.by_index[kind].name, base.name,
+                                float(totals[kind]))
+
+        # Отталкивание юнитов от базы
+        distance = distance[hit]
+        zero = distance == 0
+        safe = np.where(zero, 1.0, distance)
+        ox = np.where(zero, 1.0, dx[hit] / safe)
+        oy = np.where(zero, 0.0, dy[hit] / safe)
+        overlap = min_dist[hit] - distance + 1
+        x[hit] += ox * overlap
+        y[hit] += oy * overlap
+
+
+# Сравнение движков на одном и том же сценарии: исход боя и время тика
+def _run_match(engine, seed, units_per_side, ticks):
+    sim = Simulation(engine=engine)
+    sim.player_base.coins = sim.computer_base.coins = (units_per_side + 6) * sim.hire_cost
+    sim.start(seed)
+    unit_types = [UnitType.CAVALRY, UnitType.PIKEMAN, UnitType.SWORDSMAN]
+    for k in range(units_per_side):
+        sim.hire_unit("player", unit_types[k % 3])
+        sim.hire_unit("computer", unit_types[k % 3])
+    sim.order_move(sim.player_units, sim.computer_base.x, sim.computer_base.y)
+    sim.computer_send_attack()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim.step(1/60.)
+        if sim.state != 'playing':
+            break
+    elapsed = time.perf_counter() - start
+    return sim, elapsed / ticks * 1000
+
+
+def compare(seed=1, units_per_side=300, ticks=600):
+    from simulation import GridEngine
+    grid_sim, grid_ms = _run_match(GridEngine(), seed, units_per_side, ticks)
+    numpy_sim, numpy_ms = _run_match(NumpyEngine(), seed, units_per_side, ticks)
+    for name, sim, ms in (("grid", grid_sim, grid_ms), ("numpy", numpy_sim, numpy_ms)):
+        print(f"{name:>6}: {ms:7.2f} мс/тик, юнитов {len(sim.player_units)}/{len(sim.computer_units)}, "
+              f"HP баз {sim.player_base.hp:.1f}/{sim.computer_base.hp:.1f}, победитель {sim.winner}")
+
+
+if __name__ == '__main__':
+    compare()